@@ -1,6 +1,7 @@
-import urllib.parse
+import os
+import threading
 
-from flask import Flask, session as flask_session
+from flask import Flask, g, has_request_context, session as flask_session
 from flask_cors import CORS
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
@@ -9,11 +10,60 @@ from app.config import Config
 
 mongo_client = None
 db = None
+secondary_db = None
+
+# MongoClient không an toàn khi dùng qua fork (gunicorn preload_app):
+# mỗi process tự tạo client của mình ở lần get_db() đầu tiên sau fork.
+_mongo_settings = {}
+_mongo_pid = None
+_mongo_lock = threading.Lock()
+
+
+def _connect():
+    global mongo_client, db, secondary_db, _mongo_pid
+
+    mongo_client = MongoClient(
+        _mongo_settings['uri'],
+        serverSelectionTimeoutMS=5000,
+        connectTimeoutMS=5000,
+        event_listeners=_mongo_settings['event_listeners']
+    )
+    db = mongo_client[_mongo_settings['db']]
+    secondary_db = (
+        db.with_options(read_preference=_mongo_settings['secondary_read_preference'])
+        if _mongo_settings.get('secondary_read_preference') else db
+    )
+    _mongo_pid = os.getpid()
+
+
+def get_primary_db():
+    """Database luôn đọc từ primary, bỏ qua định tuyến đọc secondary.
+
+    Dùng cho các hàm đọc rồi ghi lại dữ liệu dẫn xuất (rollup, chốt tháng): đọc từ secondary có thể
+    thấy session cũ và ghi bản cũ đó đè lên primary.
+    """
+    if _mongo_pid != os.getpid() and _mongo_settings:
+        with _mongo_lock:
+            if _mongo_pid != os.getpid():
+                _connect()
+    return db
 
 
 def get_db():
-    global db
-    return db
+    primary = get_primary_db()
+    # Request chỉ đọc (trang công khai, API GET, chat) có thể đọc từ secondary
+    if has_request_context() and g.get('mongo_secondary_reads'):
+        return secondary_db
+    return primary
+
+
+def close_db():
+    """Đóng client của process hiện tại (gọi ở master trước khi fork worker)"""
+    global mongo_client, db, secondary_db, _mongo_pid
+
+    if mongo_client is not None and _mongo_pid == os.getpid():
+        mongo_client.close()
+    mongo_client = db = secondary_db = _mongo_pid = None
 
 
 def create_app():
@@ -22,21 +72,42 @@ def create_app():
 
     CORS(app)
 
-    # Initialize MongoDB
-    global mongo_client, db
+    # Per-request Mongo instrumentation (tắt mặc định)
+    from app.services.instrumentation import init_instrumentation
+    event_listeners = init_instrumentation(app)
 
-    mongodb_uri = app.config.get('MONGODB_URI', 'mongodb://localhost:27017')
-    mongodb_db = app.config.get('MONGODB_DB', 'badminton_tracker')
+    # Prometheus metrics (/metrics)
+    from app.services.metrics import init_metrics
+    init_metrics(app)
 
-    try:
-        mongo_client = MongoClient(
-            mongodb_uri,
-            serverSelectionTimeoutMS=5000,
-            connectTimeoutMS=5000
+    # Thống kê pool Mongo cho /readyz và /metrics
+    from app.services.health import POOL_STATS
+    event_listeners.append(POOL_STATS)
+
+    # Sampling profiler cho request chậm (tắt mặc định)
+    from app.services.profiler import init_profiler
+    init_profiler(app)
+
+    # Đọc từ secondary cho request chỉ đọc (tắt mặc định)
+    from app.services.read_routing import init_read_routing, secondary_read_preference
+    init_read_routing(app)
+
+    # Initialize MongoDB
+    _mongo_settings.update(
+        uri=app.config.get('MONGODB_URI', 'mongodb://localhost:27017'),
+        db=app.config.get('MONGODB_DB', 'badminton_tracker'),
+        event_listeners=event_listeners,
+        secondary_read_preference=(
+            secondary_read_preference(app.config['MONGO_MAX_STALENESS_SECONDS'])
+            if app.config.get('MONGO_SECONDARY_READS') else None
         )
+    )
+
+    try:
+        close_db()
+        get_db()
         mongo_client.admin.command('ping')
-        db = mongo_client[mongodb_db]
-        print(f"[App] ✅ MongoDB connected: {mongodb_db}")
+        print(f"[App] ✅ MongoDB connected: {_mongo_settings['db']}")
     except ConnectionFailure as e:
         print(f"[App] ❌ MongoDB connection failed: {e}")
         raise
@@ -45,10 +116,14 @@ def create_app():
         raise
 
     # Ensure default data exists
+    app.extensions['startup'] = {'completed': False}
     with app.app_context():
         from app.models.user import User
         from app.models.settings import Settings
         from app.models.player import Player
+        from app.models.rollup import MonthlyRollup
+        from app.models.participation import Participation
+        from app.models.payment import Payment
 
         Settings.ensure_defaults_exist()
 
@@ -57,18 +132,47 @@ def create_app():
         if migrated_count > 0:
             print(f"[App] ✅ Migrated {migrated_count} players with short_codes")
 
+        # Build monthly rollups lần đầu
+        rollup_count = MonthlyRollup.ensure_built()
+        if rollup_count > 0:
+            print(f"[App] ✅ Built {rollup_count} monthly rollups")
+
+        # Participations (công nợ / sao kê / webhook đọc từ đây) lần đầu sau khi nâng cấp
+        participations_count = Participation.ensure_built()
+        if participations_count > 0:
+            print(f"[App] ✅ Built {participations_count} participations")
+
+        # Ledger payments: entry opening cho dữ liệu có từ trước khi có ledger
+        payments_count = Payment.ensure_backfilled()
+        if payments_count > 0:
+            print(f"[App] ✅ Backfilled {payments_count} payment entries")
+
+        app.extensions['startup'] = {
+            'completed': True,
+            'short_codes_migrated': migrated_count,
+            'rollups_built': rollup_count,
+            'participations_built': participations_count,
+            'payments_backfilled': payments_count
+        }
+
     # Register blueprints
     from app.routes.api import api_bp
     from app.routes.admin import admin_bp
     from app.routes.user import user_bp
     from app.routes.chat import chat_bp
     from app.routes.webhook import webhook_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.qr import qr_bp
+    from app.routes.health import health_bp
 
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(user_bp, url_prefix='/')
     app.register_blueprint(chat_bp, url_prefix='/chat')
     app.register_blueprint(webhook_bp, url_prefix='/webhook')
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(qr_bp)
+    app.register_blueprint(health_bp)
 
     # Context processor để inject biến vào tất cả templates
     @app.context_processor
@@ -104,17 +208,10 @@ def create_app():
             return ""
         return value.strftime("%d/%m/%Y %H:%M")
 
-    @app.template_filter('vietqr_url')
-    def vietqr_url(amount, description=""):
-        """Generate VietQR URL for payment QR code"""
-        bank_id = app.config.get('VIETQR_BANK_ID', 'TPB')
-        account_number = app.config.get('VIETQR_ACCOUNT_NUMBER', '03365790401')
-        account_name = app.config.get('VIETQR_ACCOUNT_NAME', 'Nguyen Nha Hung Tuan')
-        template = app.config.get('VIETQR_TEMPLATE', 'compact2')
-
-        encoded_desc = urllib.parse.quote(str(description))
-        encoded_name = urllib.parse.quote(account_name)
-
-        return f"https://img.vietqr.io/image/{bank_id}-{account_number}-{template}.png?amount={int(amount)}&addInfo={encoded_desc}&accountName={encoded_name}"
+    @app.template_filter('vietqr_link')
+    def vietqr_link(amount, description=""):
+        """URL QR đã ký cho nút 'Quét QR' (ảnh chỉ render khi được mở)"""
+        from app.routes.qr import qr_link_url
+        return qr_link_url(amount, description)
 
     return app
\ No newline at end of file
@@ -10,11 +10,31 @@ class Config:
     # MongoDB
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
     MONGODB_DB = os.getenv('MONGODB_DB', 'badminton_tracker')
+    # Đọc từ secondary cho trang công khai / API GET / chat (cần replica set).
+    # maxStalenessSeconds tối thiểu là 90 theo quy định của MongoDB.
+    MONGO_SECONDARY_READS = os.getenv('MONGO_SECONDARY_READS', '0') == '1'
+    MONGO_MAX_STALENESS_SECONDS = int(os.getenv('MONGO_MAX_STALENESS_SECONDS', 90))
+    # app/scripts/archive_sessions.py: session đã thanh toán xong cũ hơn N tháng → sessions_archive
+    ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', 6))
 
     # OpenAI
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o')
     OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://copilot-api.hungtuan.me')
+    OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 15))
+    OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 3))
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 0))
+    # Số lượt gọi OpenAI đồng thời tối đa mỗi worker (= kích thước connection pool)
+    OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', 4))
+    OPENAI_QUEUE_TIMEOUT = float(os.getenv('OPENAI_QUEUE_TIMEOUT', 1))
+    # Circuit breaker: sau N lỗi liên tiếp thì bỏ qua OpenAI trong RESET_SECONDS giây
+    OPENAI_BREAKER_FAILURES = int(os.getenv('OPENAI_BREAKER_FAILURES', 3))
+    OPENAI_BREAKER_RESET_SECONDS = float(os.getenv('OPENAI_BREAKER_RESET_SECONDS', 60))
+    # Cache câu trả lời AI (LRU + TTL, mỗi worker một cache; AI_CACHE_SIZE=0 để tắt)
+    AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', 256))
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 3600))
+    # Câu hỏi có confidence (bộ intent cục bộ) >= ngưỡng này không cần gọi OpenAI để parse
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv('INTENT_CONFIDENCE_THRESHOLD', 0.75))
 
     # App settings
     DEFAULT_COURT_PRICE_PER_HOUR = int(os.getenv('DEFAULT_COURT_PRICE_PER_HOUR', 139000))
@@ -26,6 +46,31 @@ class Config:
     VIETQR_ACCOUNT_NAME = os.getenv('VIETQR_ACCOUNT_NAME', 'Nguyen Nha Hung Tuan')
     VIETQR_BANK_NAME = os.getenv('VIETQR_BANK_NAME', 'TPBank')
     VIETQR_TEMPLATE = os.getenv('VIETQR_TEMPLATE', 'compact2')
+    # Mã BIN NAPAS của ngân hàng (để trống → tra theo VIETQR_BANK_ID)
+    VIETQR_BANK_BIN = os.getenv('VIETQR_BANK_BIN', '')
+    # Ảnh QR render cục bộ (cần segno), cache trên đĩa theo hash nội dung
+    QR_CACHE_DIR = os.getenv('QR_CACHE_DIR', '/tmp/badminton-tracker-qr')
+    QR_SCALE = int(os.getenv('QR_SCALE', 8))
+    # Số ảnh tối đa trong cache (xoá ảnh cũ nhất khi vượt quá)
+    QR_CACHE_MAX_FILES = int(os.getenv('QR_CACHE_MAX_FILES', 2000))
 
     # Sepay Webhook Configuration
     SEPAY_API_KEY = os.getenv('SEPAY_API_KEY', '')
+
+    # Performance instrumentation (Server-Timing header / structured log per request)
+    PERF_SERVER_TIMING = os.getenv('PERF_SERVER_TIMING', '0') == '1'
+    PERF_LOG = os.getenv('PERF_LOG', '0') == '1'
+    PERF_LOG_MIN_MS = float(os.getenv('PERF_LOG_MIN_MS', 0))
+
+    # /readyz: cache kết quả ping Mongo (giây) để health check không tạo tải lên database
+    HEALTH_PING_TTL = float(os.getenv('HEALTH_PING_TTL', 10))
+
+    # Prometheus metrics (/metrics, cần prometheus_client)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    # Sampling profiler: ghi collapsed stacks của request được chọn / request chậm vào PROFILE_DIR
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 0))
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/badminton-profiles')
@@ -2,5 +2,6 @@ from app.models.player import Player
 from app.models.session import Session
 from app.models.user import User
 from app.models.settings import Settings
+from app.models.rollup import MonthlyRollup
 
-__all__ = ['Player', 'Session', 'User', 'Settings']
\ No newline at end of file
+__all__ = ['Player', 'Session', 'User', 'Settings', 'MonthlyRollup']
\ No newline at end of file
@@ -0,0 +1,167 @@
+from datetime import datetime
+from dateutil.relativedelta import relativedelta
+from pymongo.errors import DuplicateKeyError
+from app import get_db
+
+
+class MonthClosedError(Exception):
+    """Sửa session thuộc tháng đã chốt (cần mở lại tháng trước)"""
+
+    def __init__(self, month_key):
+        self.month_key = month_key
+        super().__init__(f"Tháng {month_key} đã chốt, cần mở lại trước khi sửa")
+
+
+class ClosedMonth:
+    """Snapshot cố định của một tháng đã chốt sổ (_id = 'YYYY-MM').
+
+    Cùng format với MonthlyRollup (sessions_count, total_cost, total_court, total_shuttlecock, players),
+    thêm closed_at / closed_by. Không bao giờ sửa: mở lại tháng = xoá snapshot.
+    Các session của tháng được đánh dấu closed_month = 'YYYY-MM' để các hàm tính công nợ bỏ qua.
+
+    Trong lúc chốt, document chỉ có closing = True (chặn mọi thao tác sửa qua ensure_open,
+    nhưng chưa được dùng làm snapshot bởi get / find_covered).
+    """
+    collection_name = 'closed_months'
+
+    @classmethod
+    def get_collection(cls):
+        return get_db()[cls.collection_name]
+
+    @staticmethod
+    def month_key(year, month):
+        return f"{year:04d}-{month:02d}"
+
+    @staticmethod
+    def month_range(year, month):
+        start_date = datetime(year, month, 1)
+        return start_date, start_date + relativedelta(months=1)
+
+    @classmethod
+    def get(cls, year, month):
+        return cls.get_collection().find_one({'_id': cls.month_key(year, month), 'closing': {'$ne': True}})
+
+    @classmethod
+    def ensure_open(cls, *dates):
+        """Raise MonthClosedError nếu một trong các ngày thuộc tháng đã chốt"""
+        keys = {cls.month_key(d.year, d.month) for d in dates if d}
+        if not keys:
+            return
+        closed = cls.get_collection().find_one({'_id': {'$in': sorted(keys)}}, {'_id': 1})
+        if closed:
+            raise MonthClosedError(closed['_id'])
+
+    @classmethod
+    def find_covered(cls, start_date=None, end_date=None):
+        """Các snapshot có cả tháng nằm trong [start_date, end_date) (không giới hạn nếu None)"""
+        query = {'closing': {'$ne': True}}
+        if start_date:
+            query['start_date'] = {'$gte': start_date}
+        if end_date:
+            query['end_date'] = {'$lte': end_date}
+        return list(cls.get_collection().find(query))
+
+    @classmethod
+    def verify(cls, year, month, now=None):
+        """Danh sách lý do chưa chốt được tháng (rỗng = đã đối soát xong), đọc từ primary"""
+        from app.models.session import Session
+
+        now = now or datetime.now()
+        start_date, end_date = cls.month_range(year, month)
+        if end_date > now:
+            return ['Tháng chưa kết thúc']
+
+        problems = []
+        for session in Session.find_by_date_range(start_date, end_date, include_archive=True, primary=True):
+            date_str = session['date'].strftime('%d/%m/%Y')
+            if session.get('status') != 'completed':
+                problems.append(f"Buổi {date_str} chưa hoàn thành ({session.get('status')})")
+                continue
+            for p in session.get('participants', []):
+                if p.get('amount_paid', 0) < p.get('amount_due', 0):
+                    problems.append(f"Buổi {date_str}: {p.get('player_name')} còn thiếu "
+                                    f"{p.get('amount_due', 0) - p.get('amount_paid', 0)}")
+                elif p.get('amount_to_receive', 0) > 0:
+                    problems.append(f"Buổi {date_str}: chưa trả lại {p.get('amount_to_receive')} "
+                                    f"cho {p.get('player_name')}")
+        return problems
+
+    @classmethod
+    def close(cls, year, month, closed_by=None, now=None):
+        """Chốt tháng: ghi đánh dấu đang chốt (chặn sửa), kiểm tra đối soát, đánh dấu sessions,
+        kiểm tra lại (thao tác sửa đã qua ensure_open trước khi có đánh dấu) rồi lưu snapshot.
+        Trả về (snapshot, problems) — snapshot là None nếu chưa chốt được.
+        """
+        from app.models.rollup import MonthlyRollup
+        from app.models.session import Session
+        from app.models.settings import Settings, SESSIONS_VERSION_KEY
+
+        key = cls.month_key(year, month)
+        start_date, end_date = cls.month_range(year, month)
+        try:
+            cls.get_collection().insert_one({
+                '_id': key,
+                'year': year,
+                'month': month,
+                'start_date': start_date,
+                'end_date': end_date,
+                'closing': True,
+                'closed_by': closed_by
+            })
+        except DuplicateKeyError:
+            return None, [f'Tháng {key} đã chốt']
+
+        problems = cls.verify(year, month, now)
+        if not problems:
+            for collection in Session._collections(include_archive=True):
+                collection.update_many(
+                    {'date': {'$gte': start_date, '$lt': end_date}},
+                    {'$set': {'closed_month': key}}
+                )
+            problems = cls.verify(year, month, now)
+        if problems:
+            cls.reopen(year, month)
+            return None, problems
+
+        rollup = MonthlyRollup.recompute(year, month)
+        snapshot = {
+            '_id': key,
+            'year': year,
+            'month': month,
+            'start_date': start_date,
+            'end_date': end_date,
+            'sessions_count': rollup['sessions_count'],
+            'total_cost': rollup['total_cost'],
+            'total_court': rollup['total_court'],
+            'total_shuttlecock': rollup['total_shuttlecock'],
+            'players': rollup['players'],
+            'closed_at': datetime.now(),
+            'closed_by': closed_by
+        }
+        cls.get_collection().replace_one({'_id': key}, snapshot)
+        Settings.increment(SESSIONS_VERSION_KEY)
+        return snapshot, []
+
+    @classmethod
+    def reopen(cls, year, month):
+        """Mở lại tháng đã chốt: xoá snapshot, bỏ đánh dấu sessions. Trả về False nếu tháng chưa chốt"""
+        from app.models.session import Session
+        from app.models.settings import Settings, SESSIONS_VERSION_KEY
+
+        key = cls.month_key(year, month)
+        result = cls.get_collection().delete_one({'_id': key})
+        if result.deleted_count == 0:
+            return False
+
+        for collection in Session._collections(include_archive=True):
+            collection.update_many({'closed_month': key}, {'$unset': {'closed_month': ''}})
+        Settings.increment(SESSIONS_VERSION_KEY)
+        return True
+
+    @staticmethod
+    def get_balances(snapshots):
+        """Gộp players của các snapshot thành balances theo tên (format của Session.get_player_net_balances)"""
+        from app.models.rollup import MonthlyRollup
+
+        players = [p for snapshot in snapshots for p in snapshot.get('players', {}).values()]
+        return MonthlyRollup.get_balances({'players': dict(enumerate(players))})
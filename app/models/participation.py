@@ -0,0 +1,150 @@
+from datetime import datetime
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from app import get_db
+from app.models.payment import Payment
+from app.models.settings import Settings
+from app.services.name_matcher import fold
+
+# Setting đánh dấu collection đã được dựng đầy đủ từ sessions (rebuild_all chạy xong)
+PARTICIPATIONS_BUILT_KEY = 'participations_built_at'
+
+
+class Participation:
+    """Một document cho mỗi (session, người chơi), đồng bộ từ participants của sessions.
+
+    _id = '<session_id>:<player_key>'. Mang theo date / status của session để các truy vấn theo người chơi
+    (công nợ, sao kê, webhook) chỉ cần quét index (player_id, is_paid, date) thay vì $unwind sessions.
+    is_paid = amount_paid >= amount_due (tính lại khi đồng bộ, không copy cờ trong session).
+    player_name_folded = tên bỏ dấu (name_matcher.fold) để khớp tên giống webhook trước đây.
+    archived = session đã chuyển sang sessions_archive.
+    """
+    collection_name = 'participations'
+
+    @classmethod
+    def get_collection(cls):
+        return get_db()[cls.collection_name]
+
+    @staticmethod
+    def doc_id(session_id, player_key):
+        return f"{session_id}:{player_key}"
+
+    @classmethod
+    def from_participant(cls, session, participant, archived=False):
+        amount_due = participant.get('amount_due', 0)
+        amount_paid = participant.get('amount_paid', 0)
+        player_key = Payment.player_key(participant)
+        return {
+            '_id': cls.doc_id(session['_id'], player_key),
+            'session_id': session['_id'],
+            'player_key': player_key,
+            'player_id': participant.get('player_id'),
+            'player_name': participant.get('player_name', ''),
+            'player_name_lower': participant.get('player_name', '').lower(),
+            'player_name_folded': fold(participant.get('player_name', '')),
+            'date': session.get('date'),
+            'status': session.get('status'),
+            'court_name': (session.get('court') or {}).get('name'),
+            'archived': archived,
+            'amount_due': amount_due,
+            'amount_paid': amount_paid,
+            'amount_pre_paid': participant.get('amount_pre_paid', 0),
+            'amount_to_receive': participant.get('amount_to_receive', 0),
+            'amount_returned': participant.get('amount_returned', 0),
+            'is_paid': amount_paid >= amount_due,
+            'paid_at': participant.get('paid_at'),
+            'note': participant.get('note', '')
+        }
+
+    @classmethod
+    def from_session(cls, session, archived=False):
+        return [cls.from_participant(session, p, archived) for p in session.get('participants', [])]
+
+    @classmethod
+    def sync(cls, session, archived=False):
+        """Ghi lại participations của một session (document session đầy đủ), xoá người không còn trong buổi"""
+        docs = cls.from_session(session, archived)
+        if docs:
+            cls.get_collection().bulk_write([ReplaceOne({'_id': d['_id']}, d, upsert=True) for d in docs],
+                                            ordered=False)
+        cls.get_collection().delete_many({
+            'session_id': session['_id'],
+            '_id': {'$nin': [d['_id'] for d in docs]}
+        })
+
+    @classmethod
+    def sync_participant(cls, session, participant):
+        """Ghi lại participation của một người sau khi sửa thanh toán"""
+        doc = cls.from_participant(session, participant)
+        cls.get_collection().replace_one({'_id': doc['_id']}, doc, upsert=True)
+
+    @classmethod
+    def sync_paid(cls, session, participant):
+        """Như sync_participant nhưng không ghi đè bản có amount_paid lớn hơn
+        (webhook đồng thời cộng dồn tiền, bản ghi xong sau có thể là bản cũ hơn)"""
+        doc = cls.from_participant(session, participant)
+        result = cls.get_collection().replace_one(
+            {'_id': doc['_id'], 'amount_paid': {'$lte': doc['amount_paid']}}, doc)
+        if result.matched_count:
+            return
+        try:
+            cls.get_collection().insert_one(doc)
+        except DuplicateKeyError:
+            pass
+
+    @classmethod
+    def delete_session(cls, session_id):
+        cls.get_collection().delete_many({'session_id': session_id})
+
+    @classmethod
+    def mark_archived(cls, session_ids):
+        cls.get_collection().update_many({'session_id': {'$in': list(session_ids)}}, {'$set': {'archived': True}})
+
+    @classmethod
+    def find_unpaid(cls, player_id=None, player_name=None):
+        """Các buổi (completed) người chơi còn nợ, cũ nhất trước — quét index (player_id, is_paid, date).
+
+        Không có kết quả theo player_id (hoặc không truyền) → tìm theo tên bỏ dấu, không phân biệt hoa thường
+        (participant cũ không có player_id)
+        """
+        query = {'is_paid': False, 'archived': False, 'status': 'completed', 'amount_to_receive': 0}
+        if player_id:
+            unpaid = list(cls.get_collection().find({**query, 'player_id': player_id}).sort('date', 1))
+            if unpaid or not player_name:
+                return unpaid
+        if not player_name:
+            return []
+        return list(cls.get_collection().find({**query, 'player_name_folded': fold(player_name)}).sort('date', 1))
+
+    @classmethod
+    def rebuild_all(cls, batch_size=500):
+        """Dựng lại toàn bộ collection từ sessions + sessions_archive (upsert rồi xoá document thừa,
+        không làm trống collection trong lúc chạy). Trả về số document"""
+        from app.models.session import Session
+
+        written = set()
+        batch = []
+        sources = ((False, Session.get_collection()), (True, Session.get_archive_collection()))
+        for archived, collection in sources:
+            for session in collection.find().batch_size(batch_size):
+                for doc in cls.from_session(session, archived):
+                    written.add(doc['_id'])
+                    batch.append(ReplaceOne({'_id': doc['_id']}, doc, upsert=True))
+                if len(batch) >= batch_size:
+                    cls.get_collection().bulk_write(batch, ordered=False)
+                    batch = []
+        if batch:
+            cls.get_collection().bulk_write(batch, ordered=False)
+        cls.get_collection().delete_many({'_id': {'$nin': list(written)}})
+        Settings.set(PARTICIPATIONS_BUILT_KEY, datetime.now(), 'Thời điểm dựng xong participations')
+        return len(written)
+
+    @classmethod
+    def ensure_built(cls):
+        """Dựng collection lần đầu (hoặc khi lần dựng trước chưa chạy xong).
+
+        Mọi truy vấn công nợ theo người chơi chỉ đọc participations, nên phải chạy trước khi nhận request
+        """
+        if Settings.get(PARTICIPATIONS_BUILT_KEY):
+            return 0
+        return cls.rebuild_all()
@@ -0,0 +1,217 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from app import get_db
+
+
+# Field cache trong participant của session ứng với từng loại entry
+CACHED_FIELDS = {
+    'payment': 'amount_paid',       # tiền người chơi đã trả cho buổi
+    'refund': 'amount_returned'     # tiền đã trả lại cho người ứng trước
+}
+
+# Các field participant cần để ghi ledger khi sửa/xoá session
+PAYMENT_PROJECTION = {
+    'participants.player_id': 1,
+    'participants.player_name': 1,
+    'participants.amount_paid': 1,
+    'participants.amount_returned': 1
+}
+
+# Setting đánh dấu ledger đã có entry opening cho toàn bộ dữ liệu cũ
+PAYMENTS_BACKFILLED_KEY = 'payments_backfilled_at'
+
+
+class Payment:
+    """Sổ cái thanh toán append-only: mỗi lần tiền vào/ra của một người trong một buổi là một entry.
+
+    {'session_id', 'session_date', 'player_key', 'player_id', 'player_name',
+     'kind': 'payment'|'refund', 'amount' (có thể âm khi sửa/xoá), 'source', 'reference', 'created_at'}
+
+    Ledger là sổ đối soát: công nợ / thống kê vẫn đọc amount_paid / amount_returned trong session,
+    còn ledger dùng để kiểm tra các field đó (find_mismatches, backfill_payments --verify).
+    Entry không bao giờ bị sửa hay xoá: sửa sai = thêm entry bù trừ.
+    Entry opening có _id cố định ('opening:<session_id>:<player_key>:<kind>') và được ghi bằng upsert,
+    nên hai request đồng thời (hoặc backfill chạy lại) không ghi trùng.
+    """
+    collection_name = 'payments'
+
+    @classmethod
+    def get_collection(cls):
+        return get_db()[cls.collection_name]
+
+    @staticmethod
+    def player_key(participant):
+        """Khóa người chơi của ledger (player_id, hoặc tên viết thường với dữ liệu cũ)"""
+        if participant.get('player_id'):
+            return str(participant['player_id'])
+        return participant.get('player_name', '').lower()
+
+    @classmethod
+    def changes(cls, old_session, new_session):
+        """Chênh lệch cache giữa hai phiên bản session (None khi tạo/xoá).
+
+        Trả về list (participant, kind, giá trị cũ, delta), chỉ gồm các giá trị thay đổi
+        """
+        old = {cls.player_key(p): p for p in (old_session or {}).get('participants', [])}
+        new = {cls.player_key(p): p for p in (new_session or {}).get('participants', [])}
+
+        result = []
+        for key in [*new, *(k for k in old if k not in new)]:
+            for kind, field in CACHED_FIELDS.items():
+                before = old.get(key, {}).get(field) or 0
+                after = new.get(key, {}).get(field) or 0
+                if after != before:
+                    result.append((new.get(key) or old[key], kind, before, after - before))
+        return result
+
+    @classmethod
+    def entry(cls, session, participant, kind, amount, source, reference=None, created_by=None):
+        return {
+            'session_id': session['_id'],
+            'session_date': session.get('date'),
+            'player_key': cls.player_key(participant),
+            'player_id': participant.get('player_id'),
+            'player_name': participant.get('player_name', ''),
+            'kind': kind,
+            'amount': amount,
+            'source': source,
+            'reference': reference,
+            'created_by': created_by,
+            'created_at': datetime.now()
+        }
+
+    @classmethod
+    def opening_entry(cls, session, participant, kind, amount):
+        entry = cls.entry(session, participant, kind, amount, 'opening')
+        entry['_id'] = f"opening:{session['_id']}:{entry['player_key']}:{kind}"
+        return entry
+
+    @classmethod
+    def insert_entries(cls, entries, ordered=True):
+        """Ghi entry: opening bằng upsert theo _id cố định, còn lại insert"""
+        openings = [e for e in entries if e['source'] == 'opening']
+        if openings:
+            cls.get_collection().bulk_write(
+                [UpdateOne({'_id': e['_id']}, {'$setOnInsert': e}, upsert=True) for e in openings],
+                ordered=False
+            )
+        others = [e for e in entries if e['source'] != 'opening']
+        if others:
+            cls.get_collection().insert_many(others, ordered=ordered)
+
+    @classmethod
+    def opening_entries(cls, session, participant):
+        """Entry mở đầu (= cache hiện tại) cho cặp (session, người chơi) có từ trước khi có ledger.
+        Rỗng nếu cặp này đã có entry hoặc chưa có tiền nào.
+        """
+        amounts = {kind: participant.get(field) or 0 for kind, field in CACHED_FIELDS.items()}
+        if not any(amounts.values()):
+            return []
+        if cls.get_collection().count_documents(
+                {'session_id': session['_id'], 'player_key': cls.player_key(participant)}, limit=1):
+            return []
+        return [cls.opening_entry(session, participant, kind, amount)
+                for kind, amount in amounts.items() if amount]
+
+    @classmethod
+    def record_changes(cls, old_session, new_session, source, reference=None, created_by=None):
+        """Ghi entry cho phần amount_paid / amount_returned thay đổi giữa hai phiên bản session.
+        Trả về số entry đã ghi
+        """
+        session = new_session or old_session
+        old_participants = {cls.player_key(p): p for p in (old_session or {}).get('participants', [])}
+
+        entries = []
+        opened = set()
+        for participant, kind, before, delta in cls.changes(old_session, new_session):
+            key = cls.player_key(participant)
+            if old_session and key in old_participants and key not in opened:
+                entries.extend(cls.opening_entries(session, old_participants[key]))
+                opened.add(key)
+            entries.append(cls.entry(session, participant, kind, delta, source, reference, created_by))
+
+        if entries:
+            cls.insert_entries(entries)
+        return len(entries)
+
+    @classmethod
+    def append(cls, session, participant, amount, kind='payment', source='webhook', reference=None,
+               created_by=None):
+        """Thêm một entry (kèm opening nếu cặp này chưa có trong ledger); không đọc/sửa session"""
+        entries = cls.opening_entries(session, participant)
+        entries.append(cls.entry(session, participant, kind, amount, source, reference, created_by))
+        cls.insert_entries(entries)
+
+    @classmethod
+    def get_all_totals(cls):
+        """Tổng ledger theo (session_id, player_key): {(session_id, player_key): {'payment': ..., 'refund': ...}}"""
+        result = {}
+        for row in cls.get_collection().aggregate([
+            {'$group': {
+                '_id': {'session_id': '$session_id', 'player_key': '$player_key', 'kind': '$kind'},
+                'amount': {'$sum': '$amount'}
+            }}
+        ], allowDiskUse=True):
+            key = (row['_id']['session_id'], row['_id']['player_key'])
+            totals = result.setdefault(key, {kind: 0 for kind in CACHED_FIELDS})
+            totals[row['_id']['kind']] = row['amount']
+        return result
+
+    @classmethod
+    def backfill(cls, sessions, batch_size=500, dry_run=False):
+        """Ghi entry opening cho các cặp (session, người chơi) chưa có trong ledger. Trả về số entry"""
+        existing = set(cls.get_all_totals())
+        count = 0
+        batch = []
+        for session in sessions:
+            for participant in session.get('participants', []):
+                if (session['_id'], cls.player_key(participant)) in existing:
+                    continue
+                for kind, field in CACHED_FIELDS.items():
+                    if participant.get(field):
+                        batch.append(cls.opening_entry(session, participant, kind, participant[field]))
+            if len(batch) >= batch_size:
+                count += len(batch)
+                if not dry_run:
+                    cls.insert_entries(batch)
+                batch = []
+        count += len(batch)
+        if batch and not dry_run:
+            cls.insert_entries(batch)
+        return count
+
+    @classmethod
+    def ensure_backfilled(cls):
+        """Backfill ledger lần đầu sau khi nâng cấp (entry opening cho toàn bộ sessions + archive).
+        Trả về số entry đã ghi (0 nếu đã backfill trước đó)
+        """
+        from app.models.session import Session
+        from app.models.settings import Settings
+
+        if Settings.get(PAYMENTS_BACKFILLED_KEY):
+            return 0
+        count = cls.backfill(Session.iter_by_date_range(projection={'date': 1, **PAYMENT_PROJECTION},
+                                                        include_archive=True))
+        Settings.set(PAYMENTS_BACKFILLED_KEY, datetime.now(), 'Thời điểm backfill xong ledger payments')
+        return count
+
+    @classmethod
+    def find_mismatches(cls, sessions):
+        """Các giá trị cache khác tổng ledger: list dict (session_id, date, player_name, kind, cached, ledger)"""
+        totals = cls.get_all_totals()
+        mismatches = []
+        for session in sessions:
+            for participant in session.get('participants', []):
+                ledger = totals.get((session['_id'], cls.player_key(participant)), {})
+                for kind, field in CACHED_FIELDS.items():
+                    cached = participant.get(field) or 0
+                    if cached != ledger.get(kind, 0):
+                        mismatches.append({
+                            'session_id': session['_id'],
+                            'date': session.get('date'),
+                            'player_name': participant.get('player_name', ''),
+                            'kind': kind,
+                            'cached': cached,
+                            'ledger': ledger.get(kind, 0)
+                        })
+        return mismatches
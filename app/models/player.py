@@ -1,6 +1,7 @@
 from datetime import datetime
 from bson import ObjectId
 from app import get_db
+from app.models.settings import Settings, PLAYERS_VERSION_KEY
 
 
 class Player:
@@ -8,7 +9,7 @@ class Player:
 
     def __init__(self, name, phone=None, email=None, is_active=True,
                  is_default_court_payer=False, is_default_shuttlecock_payer=False,
-                 is_admin=False, short_code=None, _id=None, created_at=None, updated_at=None):
+                 is_admin=False, short_code=None, aliases=None, _id=None, created_at=None, updated_at=None):
         self._id = _id or ObjectId()
         self.name = name
         self.phone = phone
@@ -18,6 +19,7 @@ class Player:
         self.is_default_shuttlecock_payer = is_default_shuttlecock_payer
         self.is_admin = is_admin
         self.short_code = short_code
+        self.aliases = aliases or []
         self.created_at = created_at or datetime.now()
         self.updated_at = updated_at or datetime.now()
 
@@ -32,6 +34,7 @@ class Player:
             'is_default_shuttlecock_payer': self.is_default_shuttlecock_payer,
             'is_admin': self.is_admin,
             'short_code': self.short_code,
+            'aliases': self.aliases,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
@@ -50,18 +53,31 @@ class Player:
             is_default_shuttlecock_payer=data.get('is_default_shuttlecock_payer', False),
             is_admin=data.get('is_admin', False),
             short_code=data.get('short_code'),
+            aliases=data.get('aliases'),
             created_at=data.get('created_at'),
             updated_at=data.get('updated_at')
         )
 
+    @staticmethod
+    def parse_aliases(text):
+        """'Manh, Mạnh Béo' → ['Manh', 'Mạnh Béo'] (tên gọi khác để nhận diện trong chat / nội dung chuyển khoản)"""
+        if not text:
+            return []
+        aliases = []
+        for alias in text.split(','):
+            alias = ' '.join(alias.split())
+            if alias and alias.lower() not in (a.lower() for a in aliases):
+                aliases.append(alias)
+        return aliases
+
     @classmethod
     def get_collection(cls):
         return get_db()[cls.collection_name]
 
     @classmethod
-    def find_all(cls, active_only=True):
+    def find_all(cls, active_only=True, projection=None):
         query = {'is_active': True} if active_only else {}
-        return list(cls.get_collection().find(query).sort('name', 1))
+        return list(cls.get_collection().find(query, projection).sort('name', 1))
 
     @classmethod
     def find_by_id(cls, player_id):
@@ -69,6 +85,24 @@ class Player:
             player_id = ObjectId(player_id)
         return cls.get_collection().find_one({'_id': player_id})
 
+    @classmethod
+    def find_by_ids(cls, player_ids):
+        """Lấy nhiều người chơi trong 1 query, trả về dict {str(_id): doc}.
+        Id không hợp lệ hoặc không tồn tại sẽ không có trong kết quả.
+        """
+        object_ids = []
+        for player_id in player_ids:
+            if isinstance(player_id, ObjectId):
+                object_ids.append(player_id)
+            elif player_id and ObjectId.is_valid(player_id):
+                object_ids.append(ObjectId(player_id))
+
+        if not object_ids:
+            return {}
+
+        players = cls.get_collection().find({'_id': {'$in': object_ids}})
+        return {str(p['_id']): p for p in players}
+
     @classmethod
     def find_by_name(cls, name):
         return cls.get_collection().find_one({
@@ -110,9 +144,11 @@ class Player:
             is_default_court_payer=data.get('is_default_court_payer', False),
             is_default_shuttlecock_payer=data.get('is_default_shuttlecock_payer', False),
             is_admin=data.get('is_admin', False),
-            short_code=short_code
+            short_code=short_code,
+            aliases=data.get('aliases')
         )
         cls.get_collection().insert_one(player.to_dict())
+        Settings.increment(PLAYERS_VERSION_KEY)
         return player
 
     @classmethod
@@ -124,6 +160,7 @@ class Player:
             {'_id': player_id},
             {'$set': data}
         )
+        Settings.increment(PLAYERS_VERSION_KEY)
 
     @classmethod
     def delete(cls, player_id):
@@ -133,6 +170,7 @@ class Player:
             {'_id': player_id},
             {'$set': {'is_active': False, 'updated_at': datetime.now()}}
         )
+        Settings.increment(PLAYERS_VERSION_KEY)
 
     @classmethod
     def migrate_short_codes(cls):
@@ -153,6 +191,8 @@ class Player:
             )
             count += 1
 
+        if count:
+            Settings.increment(PLAYERS_VERSION_KEY)
         return count
 
     def save(self):
@@ -162,4 +202,5 @@ class Player:
             {'$set': self.to_dict()},
             upsert=True
         )
+        Settings.increment(PLAYERS_VERSION_KEY)
         return self
\ No newline at end of file
@@ -0,0 +1,332 @@
+from datetime import datetime
+from app import get_db
+from app.models.settings import Settings
+
+
+# Các field session cần để tính rollup tháng
+ROLLUP_PROJECTION = {
+    'date': 1,
+    'status': 1,
+    'total_cost': 1,
+    'court.total_court_price': 1,
+    'shuttlecock.total_shuttlecock_price': 1,
+    'participants.player_id': 1,
+    'participants.player_name': 1,
+    'participants.amount_due': 1,
+    'participants.amount_paid': 1,
+    'participants.amount_to_receive': 1
+}
+
+# Format key của map players; tăng khi đổi để ensure_built dựng lại rollup cũ
+ROLLUP_FORMAT_VERSION = 2
+ROLLUP_FORMAT_KEY = 'monthly_rollups_format'
+
+
+class MonthlyRollup:
+    """Tổng hợp theo tháng (_id = 'YYYY-MM'), cập nhật incremental (apply_change) mỗi khi session thay đổi.
+
+    players lưu tổng theo từng người chơi (chỉ tính session completed), key là player_id
+    (participant_key): {'name', 'total_owed', 'total_to_receive', 'sessions_count'}
+
+    Rollup tính trên cả sessions và sessions_archive. archived (nếu có) là tóm tắt cố định
+    của các session đã lưu trữ trong tháng, xem freeze().
+    """
+    collection_name = 'monthly_rollups'
+
+    @classmethod
+    def get_collection(cls):
+        return get_db()[cls.collection_name]
+
+    @staticmethod
+    def month_key(year, month):
+        return f"{year:04d}-{month:02d}"
+
+    @staticmethod
+    def participant_key(participant):
+        """Key của người chơi trong map players (dùng trong đường dẫn $inc 'players.<key>.<field>').
+
+        Dữ liệu cũ không có player_id: 'name:' + tên viết thường, escape '%', '.' và '$'
+        để tên như 'A. Tuấn' hay '$x' không tách / phá đường dẫn field
+        """
+        player_id = participant.get('player_id')
+        if player_id:
+            return str(player_id)
+        name = participant.get('player_name', '').lower()
+        return 'name:' + name.replace('%', '%25').replace('.', '%2E').replace('$', '%24')
+
+    @staticmethod
+    def empty_totals():
+        return {
+            'sessions_count': 0,
+            'total_cost': 0,
+            'total_court': 0,
+            'total_shuttlecock': 0,
+            'players': {}
+        }
+
+    @classmethod
+    def contribution(cls, session):
+        """Phần đóng góp của một session vào rollup tháng của nó"""
+        totals = {
+            'sessions_count': 1,
+            'total_cost': session.get('total_cost', 0),
+            'total_court': session.get('court', {}).get('total_court_price', 0),
+            'total_shuttlecock': session.get('shuttlecock', {}).get('total_shuttlecock_price', 0),
+            'players': {}
+        }
+
+        if session.get('status') != 'completed':
+            return totals
+
+        for p in session.get('participants', []):
+            key = cls.participant_key(p)
+            if key not in totals['players']:
+                totals['players'][key] = {
+                    'name': p.get('player_name', ''),
+                    'total_owed': 0,
+                    'total_to_receive': 0,
+                    'sessions_count': 0
+                }
+            player = totals['players'][key]
+
+            amount_to_receive = p.get('amount_to_receive', 0)
+            if amount_to_receive > 0:
+                player['total_to_receive'] += amount_to_receive
+            else:
+                owed = p.get('amount_due', 0) - p.get('amount_paid', 0)
+                if owed > 0:
+                    player['total_owed'] += owed
+            player['sessions_count'] += 1
+
+        return totals
+
+    @staticmethod
+    def merge(target, totals, sign=1):
+        """Cộng (sign=1) hoặc trừ (sign=-1) totals vào target"""
+        for field in ('sessions_count', 'total_cost', 'total_court', 'total_shuttlecock'):
+            target[field] += sign * totals[field]
+
+        for key, player in totals['players'].items():
+            if key not in target['players']:
+                target['players'][key] = {
+                    'name': player['name'],
+                    'total_owed': 0,
+                    'total_to_receive': 0,
+                    'sessions_count': 0
+                }
+            entry = target['players'][key]
+            entry['name'] = player['name']
+            entry['total_owed'] += sign * player['total_owed']
+            entry['total_to_receive'] += sign * player['total_to_receive']
+            entry['sessions_count'] += sign * player['sessions_count']
+        return target
+
+    @classmethod
+    def build(cls, year, month, sessions):
+        """Tạo rollup document từ danh sách session của tháng"""
+        doc = {
+            '_id': cls.month_key(year, month),
+            'year': year,
+            'month': month,
+            **cls.empty_totals(),
+            'updated_at': datetime.now()
+        }
+
+        for session in sessions:
+            cls.merge(doc, cls.contribution(session))
+
+        return doc
+
+    @classmethod
+    def diff(cls, old_session, new_session):
+        """Delta (new - old) giữa hai phiên bản session, chỉ giữ các người chơi có thay đổi"""
+        delta = cls.empty_totals()
+        if new_session:
+            cls.merge(delta, cls.contribution(new_session))
+        if old_session:
+            cls.merge(delta, cls.contribution(old_session), sign=-1)
+
+        delta['players'] = {
+            key: player for key, player in delta['players'].items()
+            if player['total_owed'] or player['total_to_receive'] or player['sessions_count']
+        }
+        return delta
+
+    @classmethod
+    def apply_delta(cls, year, month, delta):
+        """Áp delta vào rollup của tháng bằng $inc, tính lại cả tháng nếu chưa có rollup"""
+        inc = {
+            field: delta[field]
+            for field in ('sessions_count', 'total_cost', 'total_court', 'total_shuttlecock')
+            if delta[field]
+        }
+        set_fields = {'updated_at': datetime.now()}
+        for key, player in delta['players'].items():
+            set_fields[f'players.{key}.name'] = player['name']
+            for field in ('total_owed', 'total_to_receive', 'sessions_count'):
+                if player[field]:
+                    inc[f'players.{key}.{field}'] = player[field]
+
+        update = {'$set': set_fields}
+        if inc:
+            update['$inc'] = inc
+
+        result = cls.get_collection().update_one({'_id': cls.month_key(year, month)}, update)
+        if result.matched_count == 0:
+            cls.recompute(year, month)
+
+    @classmethod
+    def apply_change(cls, old_session, new_session):
+        """Cập nhật rollup theo thay đổi của một session (old/new là None khi tạo/xoá).
+
+        Chỉ tốn O(participants): tính delta giữa hai phiên bản rồi $inc vào rollup.
+        Trả về delta theo tháng: {(year, month): delta}
+        """
+        old_month = (old_session['date'].year, old_session['date'].month) if old_session else None
+        new_month = (new_session['date'].year, new_session['date'].month) if new_session else None
+
+        if old_month == new_month:
+            deltas = {new_month: cls.diff(old_session, new_session)}
+        else:
+            deltas = {}
+            if old_month:
+                deltas[old_month] = cls.diff(old_session, None)
+            if new_month:
+                deltas[new_month] = cls.diff(None, new_session)
+
+        for (year, month), delta in deltas.items():
+            cls.apply_delta(year, month, delta)
+
+        return deltas
+
+    @classmethod
+    def recompute(cls, year, month):
+        """Tính lại rollup của một tháng từ collection sessions (đọc từ primary)"""
+        from dateutil.relativedelta import relativedelta
+        from app.models.session import Session
+
+        start_date = datetime(year, month, 1)
+        end_date = start_date + relativedelta(months=1)
+        sessions = Session.find_by_date_range(start_date, end_date, projection=ROLLUP_PROJECTION,
+                                              include_archive=True, primary=True)
+
+        doc = cls.build(year, month, sessions)
+        archived = cls.archived_summary(year, month)
+        if archived['sessions_count']:
+            doc['archived'] = archived
+        cls.get_collection().replace_one({'_id': doc['_id']}, doc, upsert=True)
+        return doc
+
+    @classmethod
+    def archived_summary(cls, year, month):
+        """Tóm tắt các session của tháng đã nằm trong sessions_archive (đều đã thanh toán xong)"""
+        from dateutil.relativedelta import relativedelta
+        from app.models.session import Session
+
+        start_date = datetime(year, month, 1)
+        end_date = start_date + relativedelta(months=1)
+
+        summary = {
+            'sessions_count': 0,
+            'total_cost': 0,
+            'total_due': 0,
+            'total_paid': 0,
+            'players': {},
+            'archived_at': datetime.now()
+        }
+        for session in Session.get_archive_collection(primary=True).find(
+            {'date': {'$gte': start_date, '$lt': end_date}}, ROLLUP_PROJECTION
+        ):
+            summary['sessions_count'] += 1
+            summary['total_cost'] += session.get('total_cost', 0)
+            for p in session.get('participants', []):
+                key = cls.participant_key(p)
+                player = summary['players'].setdefault(
+                    key, {'name': p.get('player_name', ''), 'sessions_count': 0, 'total_due': 0, 'total_paid': 0}
+                )
+                player['sessions_count'] += 1
+                player['total_due'] += p.get('amount_due', 0)
+                player['total_paid'] += p.get('amount_paid', 0)
+                summary['total_due'] += p.get('amount_due', 0)
+                summary['total_paid'] += p.get('amount_paid', 0)
+        return summary
+
+    @classmethod
+    def freeze(cls, year, month):
+        """Ghi lại tóm tắt phần đã lưu trữ của tháng vào rollup (gọi sau khi archive).
+        Tính lại từ sessions_archive nên chạy lại nhiều lần vẫn đúng.
+        """
+        result = cls.get_collection().update_one(
+            {'_id': cls.month_key(year, month)},
+            {'$set': {'archived': cls.archived_summary(year, month), 'updated_at': datetime.now()}}
+        )
+        if result.matched_count == 0:
+            cls.recompute(year, month)
+
+    @classmethod
+    def get(cls, year, month):
+        """Đọc rollup của tháng, tự tính nếu chưa có"""
+        doc = cls.get_collection().find_one({'_id': cls.month_key(year, month)})
+        if doc is None:
+            doc = cls.recompute(year, month)
+        return doc
+
+    @classmethod
+    def find_recent(cls, limit=12):
+        """Các tháng gần nhất có session"""
+        return list(cls.get_collection().find(
+            {'sessions_count': {'$gt': 0}},
+            {'players': 0}
+        ).sort('_id', -1).limit(limit))
+
+    @classmethod
+    def get_balances(cls, doc):
+        """Chuyển map players thành balances theo tên (cùng format với Session.get_player_net_balances)"""
+        balances = {}
+        for player in doc.get('players', {}).values():
+            name = player.get('name', '')
+            if name not in balances:
+                balances[name] = {
+                    '_id': name,
+                    'total_owed': 0,
+                    'total_to_receive': 0,
+                    'sessions_count': 0
+                }
+            balances[name]['total_owed'] += player.get('total_owed', 0)
+            balances[name]['total_to_receive'] += player.get('total_to_receive', 0)
+            balances[name]['sessions_count'] += player.get('sessions_count', 0)
+
+        for name in balances:
+            balances[name]['net_balance'] = balances[name]['total_to_receive'] - balances[name]['total_owed']
+
+        return balances
+
+    @classmethod
+    def rebuild_all(cls):
+        """Tính lại rollup cho tất cả các tháng có session"""
+        from app.models.session import Session
+
+        pipeline = [
+            {'$group': {
+                '_id': {
+                    'year': {'$year': '$date'},
+                    'month': {'$month': '$date'}
+                }
+            }}
+        ]
+        months = set()
+        for collection in Session._collections(include_archive=True, primary=True):
+            months.update((r['_id']['year'], r['_id']['month']) for r in collection.aggregate(pipeline))
+
+        for year, month in sorted(months):
+            cls.recompute(year, month)
+        Settings.set(ROLLUP_FORMAT_KEY, ROLLUP_FORMAT_VERSION, 'Format key players của monthly_rollups')
+        return len(months)
+
+    @classmethod
+    def ensure_built(cls):
+        """Build rollup lần đầu nếu collection còn trống hoặc được tạo bằng format key cũ"""
+        if (cls.get_collection().estimated_document_count() > 0
+                and Settings.get(ROLLUP_FORMAT_KEY) == ROLLUP_FORMAT_VERSION):
+            return 0
+        return cls.rebuild_all()
@@ -1,10 +1,59 @@
+import heapq
 from datetime import datetime
 from bson import ObjectId
-from app import get_db
+from pymongo import ReplaceOne, ReturnDocument
+from app import get_db, get_primary_db
+
+
+# Chỉ lấy các field cần cho tính toán công nợ (bỏ court/shuttlecock/note...)
+BALANCE_PROJECTION = {
+    'date': 1,
+    'status': 1,
+    'participants.player_name': 1,
+    'participants.amount_due': 1,
+    'participants.amount_paid': 1,
+    'participants.amount_to_receive': 1
+}
+
+# Như BALANCE_PROJECTION, thêm các field hiển thị ở trang chi tiết công nợ
+DETAIL_PROJECTION = {
+    **BALANCE_PROJECTION,
+    'participants.player_id': 1,
+    'participants.amount_pre_paid': 1,
+    'participants.is_paid': 1,
+    'participants.note': 1
+}
+
+# Chỉ lấy các field cần cho tổng chi phí theo tháng
+SUMMARY_PROJECTION = {
+    'date': 1,
+    'total_cost': 1,
+    'court.total_court_price': 1,
+    'shuttlecock.total_shuttlecock_price': 1
+}
+
+# Session chưa thuộc tháng đã chốt (ClosedMonth đánh dấu closed_month khi chốt)
+OPEN_QUERY = {'closed_month': {'$exists': False}}
+
+
+def encode_statement_cursor(entry):
+    """Cursor phân trang sao kê: '<ngày ISO>_<session id>' của dòng cuối trang"""
+    return f"{entry['date'].isoformat()}_{entry['_id']}"
+
+
+def decode_statement_cursor(cursor):
+    """Ngược lại của encode_statement_cursor. ValueError nếu cursor sai định dạng"""
+    date_str, _, session_id = cursor.rpartition('_')
+    if not ObjectId.is_valid(session_id):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return datetime.fromisoformat(date_str), ObjectId(session_id)
 
 
 class Session:
     collection_name = 'sessions'
+    # Session cũ đã thanh toán xong được chuyển sang đây (archive_settled).
+    # Các hàm đọc chỉ tìm trong archive khi được gọi với include_archive=True.
+    archive_collection_name = 'sessions_archive'
 
     def __init__(self, date, court, shuttlecock, participants,
                  start_time=None, end_time=None, status='pending',
@@ -42,68 +91,253 @@ class Session:
         }
 
     @classmethod
-    def get_collection(cls):
-        return get_db()[cls.collection_name]
+    def get_collection(cls, primary=False):
+        """primary=True: luôn đọc từ primary (xem get_primary_db)"""
+        return (get_primary_db() if primary else get_db())[cls.collection_name]
 
     @classmethod
-    def find_all(cls, limit=50):
-        return list(cls.get_collection().find().sort('date', -1).limit(limit))
+    def get_archive_collection(cls, primary=False):
+        return (get_primary_db() if primary else get_db())[cls.archive_collection_name]
 
     @classmethod
-    def find_by_id(cls, session_id):
+    def _collections(cls, include_archive=False, primary=False):
+        if include_archive:
+            return [cls.get_collection(primary), cls.get_archive_collection(primary)]
+        return [cls.get_collection(primary)]
+
+    @classmethod
+    def _find(cls, query, projection=None, include_archive=False, primary=False):
+        """find trên collection chính (và archive nếu include_archive), mới nhất trước"""
+        sessions = []
+        for collection in cls._collections(include_archive, primary):
+            sessions.extend(collection.find(query, projection).sort('date', -1))
+        if include_archive:
+            sessions.sort(key=lambda s: s['date'], reverse=True)
+        return sessions
+
+    @classmethod
+    def find_all(cls, limit=50, projection=None):
+        return list(cls.get_collection().find({}, projection).sort('date', -1).limit(limit))
+
+    @classmethod
+    def find_open(cls, limit=500, projection=None):
+        """Các session chưa thuộc tháng đã chốt trong `limit` buổi mới nhất (dùng cho các phép quét công nợ).
+
+        Cửa sổ tính trên mọi session (kể cả tháng đã chốt) như trước khi có chốt sổ,
+        để tháng đã chốt không kéo cửa sổ lùi thêm về quá khứ
+        """
+        query = dict(OPEN_QUERY)
+        cutoff = cls._recent_cutoff(limit)
+        if cutoff:
+            query['date'] = {'$gte': cutoff}
+        return list(cls.get_collection().find(query, projection).sort('date', -1))
+
+    @classmethod
+    def _recent_cutoff(cls, limit):
+        """Ngày của session thứ `limit` tính từ mới nhất (None nếu chưa đủ `limit` buổi)"""
+        oldest = list(cls.get_collection().find({}, {'date': 1}).sort('date', -1).skip(limit - 1).limit(1))
+        return oldest[0]['date'] if oldest else None
+
+    @classmethod
+    def find_by_id(cls, session_id, include_archive=False):
         if isinstance(session_id, str):
             session_id = ObjectId(session_id)
-        return cls.get_collection().find_one({'_id': session_id})
+        for collection in cls._collections(include_archive):
+            session = collection.find_one({'_id': session_id})
+            if session:
+                return session
+        return None
 
     @classmethod
-    def find_by_date_range(cls, start_date, end_date):
-        return list(cls.get_collection().find({
-            'date': {'$gte': start_date, '$lt': end_date}
-        }).sort('date', -1))
+    def find_by_date_range(cls, start_date, end_date, projection=None, include_archive=False, primary=False):
+        return cls._find({'date': {'$gte': start_date, '$lt': end_date}}, projection, include_archive, primary)
 
     @classmethod
-    def find_by_player(cls, player_name, start_date=None, end_date=None):
+    def iter_by_date_range(cls, start_date=None, end_date=None, projection=None, batch_size=500,
+                           include_archive=False):
+        """Trả về cursor (không load hết vào memory), sắp xếp theo ngày tăng dần"""
+        query = {}
+        if start_date or end_date:
+            query['date'] = {}
+            if start_date:
+                query['date']['$gte'] = start_date
+            if end_date:
+                query['date']['$lt'] = end_date
+        cursors = [
+            collection.find(query, projection).sort('date', 1).batch_size(batch_size)
+            for collection in cls._collections(include_archive)
+        ]
+        if len(cursors) == 1:
+            return cursors[0]
+        # Trộn hai cursor đã sắp xếp, vẫn stream từng document
+        return heapq.merge(*cursors, key=lambda s: s['date'])
+
+    @classmethod
+    def find_by_player(cls, player_name, start_date=None, end_date=None, include_archive=False):
         query = {'participants.player_name': {'$regex': f'^{player_name}$', '$options': 'i'}}
         if start_date and end_date:
             query['date'] = {'$gte': start_date, '$lt': end_date}
-        return list(cls.get_collection().find(query).sort('date', -1))
+        return cls._find(query, include_archive=include_archive)
 
     # ==========================================
     # Debt calculations
     # ==========================================
 
     @classmethod
-    def get_player_debt(cls, player_name, start_date=None, end_date=None):
+    def get_player_debt(cls, player_name, start_date=None, end_date=None, include_archive=False):
         """Tính tiền chưa thanh toán của một người"""
-        if start_date and end_date:
-            sessions = cls.find_by_date_range(start_date, end_date)
-        else:
-            sessions = cls.find_all(limit=500)
+        return cls.get_debts_for_players([player_name], start_date, end_date, include_archive)[player_name]
 
-        total_due = 0
-        total_paid = 0
-        total_to_receive = 0
-        sessions_count = 0
+    @classmethod
+    def get_debts_for_players(cls, names_or_ids, start_date=None, end_date=None, include_archive=False):
+        """Tính tiền chưa thanh toán của nhiều người trong một lần aggregate trên participations.
 
-        for session in sessions:
-            for p in session.get('participants', []):
-                if p.get('player_name', '').lower() == player_name.lower():
-                    total_due += p.get('amount_due', 0)
-                    total_paid += p.get('amount_paid', 0)
-                    total_to_receive += p.get('amount_to_receive', 0)
-                    sessions_count += 1
+        names_or_ids: tên (không phân biệt hoa thường) hoặc player_id (ObjectId / chuỗi hex).
+        Trả về dict {tên/id như truyền vào: kết quả như get_player_debt hoặc None}.
+        Không có khoảng ngày → chỉ tính 500 buổi gần nhất (giống các hàm all-time khác),
+        trừ khi include_archive (lấy toàn bộ lịch sử, kể cả sessions_archive).
+        """
+        from app.models.participation import Participation
+
+        # Mỗi tên (chữ thường) / ObjectId → các key đã truyền vào
+        names, ids = {}, {}
+        for key in names_or_ids:
+            if isinstance(key, ObjectId) or ObjectId.is_valid(key):
+                ids.setdefault(ObjectId(key), []).append(key)
+            else:
+                names.setdefault(key.lower(), []).append(key)
+
+        if not names and not ids:
+            return {}
+
+        conditions = []
+        if names:
+            conditions.append({'player_name_lower': {'$in': list(names)}})
+        if ids:
+            conditions.append({'player_id': {'$in': list(ids)}})
+        match = conditions[0] if len(conditions) == 1 else {'$or': conditions}
 
-        if sessions_count == 0:
-            return None
+        if start_date and end_date:
+            match['date'] = {'$gte': start_date, '$lt': end_date}
+        elif not include_archive:
+            cutoff = cls._recent_cutoff(500)
+            if cutoff:
+                match['date'] = {'$gte': cutoff}
+        if not include_archive:
+            match['archived'] = False
 
-        return {
-            '_id': player_name,
-            'total_due': total_due,
-            'total_paid': total_paid,
-            'total_owed': max(0, total_due - total_paid - total_to_receive),
-            'total_to_receive': total_to_receive,
-            'sessions_count': sessions_count
-        }
+        pipeline = [
+            {'$match': match},
+            {'$group': {
+                '_id': {'id': '$player_id', 'name': '$player_name_lower'},
+                'player_name': {'$first': '$player_name'},
+                'total_due': {'$sum': '$amount_due'},
+                'total_paid': {'$sum': '$amount_paid'},
+                'total_to_receive': {'$sum': '$amount_to_receive'},
+                'sessions_count': {'$sum': 1}
+            }}
+        ]
+
+        totals = {}
+        for row in Participation.get_collection().aggregate(pipeline):
+            by_name = names.get(row['_id']['name'], [])
+            by_id = ids.get(row['_id']['id'], [])
+            for key in set(by_name + by_id):
+                total = totals.setdefault(key, {
+                    '_id': key if key in by_name else row['player_name'],
+                    'total_due': 0,
+                    'total_paid': 0,
+                    'total_to_receive': 0,
+                    'sessions_count': 0
+                })
+                for field in ('total_due', 'total_paid', 'total_to_receive', 'sessions_count'):
+                    total[field] += row[field]
+
+        result = {}
+        for key in names_or_ids:
+            total = totals.get(key)
+            if total and 'total_owed' not in total:
+                total['total_owed'] = max(0, total['total_due'] - total['total_paid'] - total['total_to_receive'])
+            result[key] = total
+        return result
+
+    @classmethod
+    def get_player_statement(cls, player_id, start_date=None, end_date=None, limit=50, cursor=None,
+                             include_archive=False, player_name=None):
+        """Sao kê của một người chơi: các buổi đã tham gia (mới nhất trước) kèm số dư lũy kế.
+
+        balance = tổng (phải trả - đã trả - được nhận lại) từ buổi đầu tiên trong khoảng đến buổi đó
+        (> 0: còn nợ, < 0: được nhận lại). Chỉ dùng $group + find trên participations
+        (index player_id, date), chạy được trên mọi phiên bản MongoDB:
+        - summary: $group trên cả khoảng
+        - số dư của dòng đầu trang: balance của summary (trang đầu) hoặc $group các buổi trước cursor
+        - trang hiện tại: find().sort(date).limit(), số dư các dòng sau tính lùi từ dòng đầu
+
+        cursor: next_cursor của trang trước. include_archive: gồm cả các buổi trong sessions_archive.
+        player_name: gồm cả các buổi cũ mà participant chỉ có tên (không có player_id), khớp không phân biệt
+        hoa thường như find_unpaid. Trả về {'entries', 'summary', 'next_cursor'}.
+        """
+        from app.models.participation import Participation
+
+        if isinstance(player_id, str):
+            player_id = ObjectId(player_id)
+
+        match = {'player_id': player_id}
+        if player_name:
+            match = {'$or': [match, {'player_id': None, 'player_name_lower': player_name.lower()}]}
+        if not include_archive:
+            match['archived'] = False
+        if start_date or end_date:
+            match['date'] = {}
+            if start_date:
+                match['date']['$gte'] = start_date
+            if end_date:
+                match['date']['$lt'] = end_date
+
+        def totals(query):
+            rows = list(Participation.get_collection().aggregate([
+                {'$match': query},
+                {'$group': {
+                    '_id': None,
+                    'total_due': {'$sum': '$amount_due'},
+                    'total_paid': {'$sum': '$amount_paid'},
+                    'total_to_receive': {'$sum': '$amount_to_receive'},
+                    'sessions_count': {'$sum': 1}
+                }}
+            ]))
+            result = rows[0] if rows else {'total_due': 0, 'total_paid': 0, 'total_to_receive': 0,
+                                            'sessions_count': 0}
+            result.pop('_id', None)
+            result['balance'] = result['total_due'] - result['total_paid'] - result['total_to_receive']
+            return result
+
+        summary = totals(match)
+        summary['total_owed'] = max(0, summary['balance'])
+
+        page_query = match
+        balance = summary['balance']
+        if cursor:
+            cursor_date, cursor_id = decode_statement_cursor(cursor)
+            page_query = {'$and': [match, {'$or': [
+                {'date': {'$lt': cursor_date}},
+                {'date': cursor_date, 'session_id': {'$lt': cursor_id}}
+            ]}]}
+            balance = totals(page_query)['balance']
+
+        docs = list(Participation.get_collection().find(page_query, {
+            'session_id': 1, 'date': 1, 'status': 1, 'court_name': 1, 'amount_due': 1,
+            'amount_paid': 1, 'amount_to_receive': 1, 'is_paid': 1, 'paid_at': 1
+        }).sort([('date', -1), ('session_id', -1)]).limit(limit + 1))
+
+        entries = []
+        for doc in docs[:limit]:
+            doc['_id'] = doc.pop('session_id')
+            doc['balance'] = balance
+            balance -= doc['amount_due'] - doc['amount_paid'] - doc['amount_to_receive']
+            entries.append(doc)
+        next_cursor = encode_statement_cursor(entries[-1]) if len(docs) > limit else None
+
+        return {'entries': entries, 'summary': summary, 'next_cursor': next_cursor}
 
     @classmethod
     def get_player_net_balances(cls, start_date=None, end_date=None):
@@ -112,12 +346,25 @@ class Session:
         Nếu > 0: được nhận lại tiền
         Nếu < 0: còn chưa thanh toán
         """
-        if start_date and end_date:
-            sessions = cls.find_by_date_range(start_date, end_date)
-        else:
-            sessions = cls.find_all(limit=500)
-
-        balances = {}
+        from app.models.closed_month import ClosedMonth
+
+        if not (start_date and end_date):
+            # Toàn thời gian = 500 buổi gần nhất (tính cả buổi thuộc tháng đã chốt)
+            start_date, end_date = cls._recent_cutoff(500), None
+
+        # Tháng đã chốt nằm trọn trong khoảng: lấy từ snapshot thay vì quét lại sessions
+        # (tháng đã chốt chỉ nằm một phần trong khoảng vẫn quét từ sessions)
+        closed = ClosedMonth.find_covered(start_date, end_date)
+        query = {'closed_month': {'$nin': [c['_id'] for c in closed]}}
+        if start_date or end_date:
+            query['date'] = {}
+            if start_date:
+                query['date']['$gte'] = start_date
+            if end_date:
+                query['date']['$lt'] = end_date
+        sessions = cls._find(query, BALANCE_PROJECTION)
+
+        balances = ClosedMonth.get_balances(closed)
 
         for session in sessions:
             if session.get('status') != 'completed':
@@ -159,7 +406,17 @@ class Session:
     def get_all_debts(cls, start_date=None, end_date=None):
         """Lấy danh sách tất cả Người còn chưa thanh toán (sau khi bù trừ với tiền được nhận lại)"""
         balances = cls.get_player_net_balances(start_date, end_date)
+        return cls.debts_from_balances(balances)
 
+    @classmethod
+    def get_all_to_receive(cls, start_date=None, end_date=None):
+        """Lấy danh sách tất cả người được nhận lại tiền (sau khi bù trừ với tiền chưa thanh toán)"""
+        balances = cls.get_player_net_balances(start_date, end_date)
+        return cls.to_receive_from_balances(balances)
+
+    @staticmethod
+    def debts_from_balances(balances):
+        """Lọc những người có net_balance < 0 từ kết quả get_player_net_balances"""
         debts = {}
 
         for player_name, balance in balances.items():
@@ -176,11 +433,9 @@ class Session:
         result.sort(key=lambda x: x['total_owed'], reverse=True)
         return result
 
-    @classmethod
-    def get_all_to_receive(cls, start_date=None, end_date=None):
-        """Lấy danh sách tất cả người được nhận lại tiền (sau khi bù trừ với tiền chưa thanh toán)"""
-        balances = cls.get_player_net_balances(start_date, end_date)
-
+    @staticmethod
+    def to_receive_from_balances(balances):
+        """Lọc những người có net_balance > 0 từ kết quả get_player_net_balances"""
         to_receive = {}
 
         for player_name, balance in balances.items():
@@ -234,7 +489,7 @@ class Session:
     @classmethod
     def get_all_debts_with_details(cls):
         """Lấy chi tiết tiền chưa thanh toán từng người với danh sách sessions"""
-        sessions = cls.find_all(limit=500)
+        sessions = cls.find_open(limit=500, projection=BALANCE_PROJECTION)
 
         debt_details = {}
 
@@ -281,7 +536,7 @@ class Session:
     @classmethod
     def get_all_to_receive_with_details(cls):
         """Lấy chi tiết tiền cần trả lại từng người"""
-        sessions = cls.find_all(limit=500)
+        sessions = cls.find_open(limit=500, projection=DETAIL_PROJECTION)
 
         receive_details = {}
 
@@ -325,7 +580,7 @@ class Session:
         start_date = datetime(year, month, 1)
         end_date = start_date + relativedelta(months=1)
 
-        sessions = cls.find_by_date_range(start_date, end_date)
+        sessions = cls.find_by_date_range(start_date, end_date, projection=BALANCE_PROJECTION)
 
         debt_details = {}
 
@@ -374,27 +629,15 @@ class Session:
     @classmethod
     def get_available_months(cls):
         """Lấy danh sách các tháng có session"""
-        pipeline = [
-            {'$group': {
-                '_id': {
-                    'year': {'$year': '$date'},
-                    'month': {'$month': '$date'}
-                },
-                'count': {'$sum': 1}
-            }},
-            {'$sort': {'_id.year': -1, '_id. month': -1}},
-            {'$limit': 12}
-        ]
-
-        result = list(cls.get_collection().aggregate(pipeline))
+        from app.models.rollup import MonthlyRollup
 
         months = []
-        for r in result:
+        for r in MonthlyRollup.find_recent(limit=12):
             months.append({
-                'year': r['_id']['year'],
-                'month': r['_id']['month'],
-                'count': r['count'],
-                'label': f"Tháng {r['_id']['month']}/{r['_id']['year']}"
+                'year': r['year'],
+                'month': r['month'],
+                'count': r['sessions_count'],
+                'label': f"Tháng {r['month']}/{r['year']}"
             })
 
         return months
@@ -402,7 +645,7 @@ class Session:
     @classmethod
     def get_months_with_debts(cls):
         """Lấy danh sách các tháng có tiền chưa thanh toán"""
-        sessions = cls.find_all(limit=500)
+        sessions = cls.find_open(limit=500, projection=BALANCE_PROJECTION)
 
         months = {}
 
@@ -459,32 +702,32 @@ class Session:
 
     @classmethod
     def get_monthly_summary(cls, year, month):
-        from dateutil.relativedelta import relativedelta
-        start_date = datetime(year, month, 1)
-        end_date = start_date + relativedelta(months=1)
+        from app.models.rollup import MonthlyRollup
 
-        sessions = cls.find_by_date_range(start_date, end_date)
-        debts = cls.get_all_debts(start_date, end_date)
-        to_receive = cls.get_all_to_receive(start_date, end_date)
+        from app.models.closed_month import ClosedMonth
+
+        # Tháng đã chốt: dùng snapshot cố định
+        closed = ClosedMonth.get(year, month)
+        rollup = closed or MonthlyRollup.get(year, month)
+        balances = MonthlyRollup.get_balances(rollup)
+        debts = cls.debts_from_balances(balances)
+        to_receive = cls.to_receive_from_balances(balances)
 
-        total_cost = sum(s.get('total_cost', 0) for s in sessions)
-        total_court = sum(s.get('court', {}).get('total_court_price', 0) for s in sessions)
-        total_shuttlecock = sum(s.get('shuttlecock', {}).get('total_shuttlecock_price', 0) for s in sessions)
         total_owed = sum(d['total_owed'] for d in debts)
         total_to_receive = sum(r['total_to_receive'] for r in to_receive)
 
         return {
             'year': year,
             'month': month,
-            'sessions_count': len(sessions),
-            'total_cost': total_cost,
-            'total_court': total_court,
-            'total_shuttlecock': total_shuttlecock,
+            'sessions_count': rollup.get('sessions_count', 0),
+            'total_cost': rollup.get('total_cost', 0),
+            'total_court': rollup.get('total_court', 0),
+            'total_shuttlecock': rollup.get('total_shuttlecock', 0),
             'total_owed': total_owed,
             'total_to_receive': total_to_receive,
             'debts': debts,
             'to_receive': to_receive,
-            'sessions': sessions
+            'closed': closed is not None
         }
 
     # ==========================================
@@ -493,6 +736,9 @@ class Session:
 
     @classmethod
     def create(cls, data):
+        from app.models.closed_month import ClosedMonth
+
+        ClosedMonth.ensure_open(data['date'])
         session = cls(
             date=data['date'],
             start_time=data.get('start_time'),
@@ -504,90 +750,225 @@ class Session:
             note=data.get('note'),
             created_by=data.get('created_by')
         )
-        cls.get_collection().insert_one(session.to_dict())
+        from app.models.participation import Participation
+        from app.models.payment import Payment
+
+        doc = session.to_dict()
+        cls.get_collection().insert_one(doc)
+        Participation.sync(doc)
+        Payment.record_changes(None, doc, 'session', created_by=data.get('created_by'))
+        cls._apply_change(None, doc)
         return session
 
     @classmethod
     def update(cls, session_id, data):
+        """Cập nhật session và áp delta (so với bản cũ) vào các bảng tổng hợp.
+
+        Trả về delta theo người chơi: {player_key: {'name', 'total_owed', 'total_to_receive', 'sessions_count'}}
+        """
+        from app.models.closed_month import ClosedMonth
+        from app.models.participation import Participation
+        from app.models.payment import Payment, PAYMENT_PROJECTION
+        from app.models.rollup import ROLLUP_PROJECTION
+
         if isinstance(session_id, str):
             session_id = ObjectId(session_id)
+        old = cls.get_collection().find_one({'_id': session_id}, {**ROLLUP_PROJECTION, **PAYMENT_PROJECTION})
+        ClosedMonth.ensure_open(old and old.get('date'), data.get('date'))
         data['updated_at'] = datetime.now()
         cls.get_collection().update_one(
             {'_id': session_id},
             {'$set': data}
         )
+        if not old:
+            return {}
+        Participation.sync(cls.get_collection().find_one({'_id': session_id}))
+        Payment.record_changes(old, {**old, **data}, 'session')
+        return cls._apply_change(old, {**old, **data})
 
     @classmethod
     def delete(cls, session_id):
+        from app.models.closed_month import ClosedMonth
+        from app.models.participation import Participation
+        from app.models.payment import Payment, PAYMENT_PROJECTION
+        from app.models.rollup import ROLLUP_PROJECTION
+
         if isinstance(session_id, str):
             session_id = ObjectId(session_id)
+        old = cls.get_collection().find_one({'_id': session_id}, {**ROLLUP_PROJECTION, **PAYMENT_PROJECTION})
+        ClosedMonth.ensure_open(old and old.get('date'))
         cls.get_collection().delete_one({'_id': session_id})
+        if old:
+            Participation.delete_session(session_id)
+            # Entry bù trừ để tổng ledger của buổi bị xoá về 0
+            Payment.record_changes(old, None, 'session')
+            cls._apply_change(old, None)
 
     @classmethod
-    def update_participant_payment(cls, session_id, player_name, amount_paid):
+    def _apply_change(cls, old_session, new_session):
+        """Áp thay đổi của một session vào monthly rollups theo kiểu incremental
+        và tăng sessions data version.
+
+        Trả về tổng delta theo người chơi (cộng dồn qua các tháng bị ảnh hưởng)
+        """
+        from app.models.rollup import MonthlyRollup
+        from app.models.settings import Settings, SESSIONS_VERSION_KEY
+
+        Settings.increment(SESSIONS_VERSION_KEY)
+        month_deltas = MonthlyRollup.apply_change(old_session, new_session)
+
+        player_deltas = MonthlyRollup.empty_totals()
+        for delta in month_deltas.values():
+            MonthlyRollup.merge(player_deltas, delta)
+        return player_deltas['players']
+
+    @staticmethod
+    def _snapshot(session):
+        """Bản sao participants trước khi sửa tại chỗ (để tính delta)"""
+        return {**session, 'participants': [dict(p) for p in session.get('participants', [])]}
+
+    @classmethod
+    def _set_participant(cls, session, participant, updated_at):
+        """Ghi lại một participant (positional update, không ghi đè participants của người khác)
+        và participation tương ứng"""
+        from app.models.participation import Participation
+
+        cls.get_collection().update_one(
+            {'_id': session['_id'], 'participants.player_name': participant['player_name']},
+            {'$set': {
+                'participants.$': participant,
+                'updated_at': updated_at
+            }}
+        )
+        Participation.sync_participant(session, participant)
+
+    @staticmethod
+    def _set_paid(participant, amount_paid):
+        participant['amount_paid'] = amount_paid
+        participant['is_paid'] = amount_paid >= participant.get('amount_due', 0)
+        if participant['is_paid']:
+            participant['paid_at'] = datetime.now()
+        else:
+            participant['paid_at'] = None
+
+    @classmethod
+    def update_participant_payment(cls, session_id, player_name, amount_paid, source='admin', reference=None):
+        """Đặt số tiền đã trả của người chơi; phần chênh lệch được ghi thành một entry payments"""
+        from app.models.closed_month import ClosedMonth
+        from app.models.payment import Payment
+
         if isinstance(session_id, str):
             session_id = ObjectId(session_id)
 
         session = cls.find_by_id(session_id)
         if not session:
             return False
+        ClosedMonth.ensure_open(session.get('date'))
 
-        updated = False
+        old_session = cls._snapshot(session)
+        updated = None
         for p in session['participants']:
             if p.get('player_name', '').lower() == player_name.lower():
-                p['amount_paid'] = amount_paid
-                p['is_paid'] = amount_paid >= p.get('amount_due', 0)
-                if p['is_paid']:
-                    p['paid_at'] = datetime.now()
-                else:
-                    p['paid_at'] = None
-                updated = True
+                cls._set_paid(p, amount_paid)
+                updated = p
                 break
 
         if updated:
-            cls.get_collection().update_one(
-                {'_id': session_id},
-                {'$set': {
-                    'participants': session['participants'],
-                    'updated_at': datetime.now()
-                }}
-            )
-        return updated
+            Payment.record_changes(old_session, session, source, reference)
+            cls._set_participant(session, updated, datetime.now())
+            cls._apply_change(old_session, session)
+        return updated is not None
+
+    @classmethod
+    def add_participant_payment(cls, session_id, player_name, amount, source='webhook', reference=None):
+        """Ghi thêm một khoản thanh toán: $inc amount_paid trong session rồi append entry vào ledger
+        (chỉ khi cộng thành công).
+
+        Khác update_participant_payment (đặt giá trị tuyệt đối), hai webhook cùng trả cho một buổi
+        không ghi đè lẫn nhau: mỗi webhook chỉ append entry và cộng phần tiền của mình,
+        delta rollup cũng tính từ đúng phần tiền vừa cộng.
+        """
+        from app.models.closed_month import ClosedMonth
+        from app.models.participation import Participation
+        from app.models.payment import Payment
+
+        if isinstance(session_id, str):
+            session_id = ObjectId(session_id)
+
+        session = cls.find_by_id(session_id)
+        if not session:
+            return False
+        ClosedMonth.ensure_open(session.get('date'))
+
+        index, participant = next(((i, p) for i, p in enumerate(session['participants'])
+                                   if p.get('player_name', '').lower() == player_name.lower()), (None, None))
+        if not participant:
+            return False
+
+        # Cộng theo vị trí (kèm điều kiện vị trí đó vẫn là người chơi này) và đọc lại giá trị sau khi cộng
+        updated = cls.get_collection().find_one_and_update(
+            {'_id': session_id, f'participants.{index}.player_name': participant['player_name']},
+            {'$inc': {f'participants.{index}.amount_paid': amount}, '$set': {'updated_at': datetime.now()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not updated:
+            # Participant vừa bị sửa / xoá: không cộng được thì cũng không ghi ledger
+            return False
+        # Opening (nếu cần) lấy từ bản đọc trước khi cộng
+        Payment.append(session, participant, amount, source=source, reference=reference)
+        session = updated
+
+        after = session['participants'][index]
+        paid = after['amount_paid']
+        cls._set_paid(after, paid)
+        # Chỉ ghi cờ khi amount_paid chưa bị webhook khác cộng tiếp (webhook sau sẽ ghi cờ của nó)
+        cls.get_collection().update_one(
+            {'_id': session_id,
+             'participants': {'$elemMatch': {'player_name': after['player_name'], 'amount_paid': paid}}},
+            {'$set': {'participants.$.is_paid': after['is_paid'], 'participants.$.paid_at': after['paid_at']}}
+        )
+        Participation.sync_paid(session, after)
+
+        before = cls._snapshot(session)
+        cls._set_paid(before['participants'][index], paid - amount)
+        cls._apply_change(before, session)
+        return True
 
     @classmethod
-    def update_participant_received(cls, session_id, player_name):
+    def update_participant_received(cls, session_id, player_name, source='admin'):
         """Đánh dấu đã trả lại tiền cho người chơi"""
+        from app.models.closed_month import ClosedMonth
+        from app.models.payment import Payment
+
         if isinstance(session_id, str):
             session_id = ObjectId(session_id)
 
         session = cls.find_by_id(session_id)
         if not session:
             return False
+        ClosedMonth.ensure_open(session.get('date'))
 
-        updated = False
+        old_session = cls._snapshot(session)
+        updated = None
         for p in session['participants']:
             if p.get('player_name', '').lower() == player_name.lower() and p.get('amount_to_receive', 0) > 0:
                 p['amount_returned'] = p.get('amount_to_receive', 0)
                 p['amount_to_receive'] = 0
                 p['returned_at'] = datetime.utcnow()
                 p['note'] = (p.get('note', '') + ' - Đã trả lại').strip(' - ')
-                updated = True
+                updated = p
                 break
 
         if updated:
-            cls.get_collection().update_one(
-                {'_id': session_id},
-                {'$set': {
-                    'participants': session['participants'],
-                    'updated_at': datetime.utcnow()
-                }}
-            )
-        return updated
+            Payment.record_changes(old_session, session, source)
+            cls._set_participant(session, updated, datetime.utcnow())
+            cls._apply_change(old_session, session)
+        return updated is not None
 
     @classmethod
     def get_all_to_receive_with_details(cls):
         """Lấy chi tiết tiền cần trả lại từng người"""
-        sessions = cls.find_all(limit=500)
+        sessions = cls.find_open(limit=500, projection=DETAIL_PROJECTION)
 
         receive_details = {}
 
@@ -631,7 +1012,7 @@ class Session:
         start_date = datetime(year, month, 1)
         end_date = start_date + relativedelta(months=1)
 
-        sessions = cls.find_by_date_range(start_date, end_date)
+        sessions = cls.find_by_date_range(start_date, end_date, projection=DETAIL_PROJECTION)
 
         receive_details = {}
 
@@ -668,13 +1049,92 @@ class Session:
 
         return receive_details
 
+    # ==========================================
+    # Archive
+    # ==========================================
+
+    @staticmethod
+    def is_settled(session):
+        """Session đã xong và mọi người đã trả đủ / đã được trả lại tiền"""
+        if session.get('status') != 'completed':
+            return False
+        return all(
+            p.get('amount_paid', 0) >= p.get('amount_due', 0) and p.get('amount_to_receive', 0) <= 0
+            for p in session.get('participants', [])
+        )
+
+    @classmethod
+    def archive_settled(cls, older_than_months=6, now=None, batch_size=500, dry_run=False):
+        """Chuyển các session đã thanh toán xong, cũ hơn N tháng (tính theo tháng) sang sessions_archive.
+
+        Rollup của các tháng bị ảnh hưởng giữ lại tóm tắt phần đã lưu trữ (MonthlyRollup.freeze).
+        Trả về {'archived': số session, 'months': ['YYYY-MM', ...]}
+        """
+        from dateutil.relativedelta import relativedelta
+        from app.models.participation import Participation
+        from app.models.rollup import MonthlyRollup
+        from app.models.settings import Settings, SESSIONS_VERSION_KEY
+
+        now = now or datetime.now()
+        cutoff = datetime(now.year, now.month, 1) - relativedelta(months=older_than_months)
+        query = {
+            'date': {'$lt': cutoff},
+            'status': 'completed',
+            'participants': {'$not': {'$elemMatch': {'amount_to_receive': {'$gt': 0}}}}
+        }
+
+        archived = 0
+        months = set()
+        last_id = None
+        while True:
+            batch_query = {**query, '_id': {'$gt': last_id}} if last_id else query
+            batch = list(cls.get_collection().find(batch_query).sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+            last_id = batch[-1]['_id']
 
+            settled = [session for session in batch if cls.is_settled(session)]
+            if not settled:
+                continue
+            archived += len(settled)
+            months.update((session['date'].year, session['date'].month) for session in settled)
+            if dry_run:
+                continue
+
+            # Ghi vào archive trước (upsert, chạy lại không bị trùng) rồi mới xoá khỏi collection chính
+            cls.get_archive_collection().bulk_write(
+                [ReplaceOne({'_id': session['_id']}, session, upsert=True) for session in settled],
+                ordered=False
+            )
+            cls.get_collection().delete_many({'_id': {'$in': [session['_id'] for session in settled]}})
+            Participation.mark_archived(session['_id'] for session in settled)
+
+        if archived and not dry_run:
+            for year, month in sorted(months):
+                MonthlyRollup.freeze(year, month)
+            Settings.increment(SESSIONS_VERSION_KEY)
+
+        return {
+            'archived': archived,
+            'months': [MonthlyRollup.month_key(year, month) for year, month in sorted(months)]
+        }
 
     def save(self):
+        from app.models.closed_month import ClosedMonth
+        from app.models.participation import Participation
+        from app.models.payment import Payment, PAYMENT_PROJECTION
+        from app.models.rollup import ROLLUP_PROJECTION
+
+        old = self.get_collection().find_one({'_id': self._id}, {**ROLLUP_PROJECTION, **PAYMENT_PROJECTION})
+        ClosedMonth.ensure_open(old and old.get('date'), self.date)
         self.updated_at = datetime.now()
+        doc = self.to_dict()
         self.get_collection().update_one(
             {'_id': self._id},
-            {'$set': self.to_dict()},
+            {'$set': doc},
             upsert=True
         )
+        Participation.sync(doc)
+        Payment.record_changes(old, doc, 'session', created_by=self.created_by)
+        self._apply_change(old, doc)
         return self
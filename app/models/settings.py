@@ -1,6 +1,11 @@
 from datetime import datetime
+from pymongo import ReturnDocument
 from app import get_db
 
+# Bộ đếm version dữ liệu, tăng mỗi khi sessions / players thay đổi (dùng để invalidate cache)
+SESSIONS_VERSION_KEY = 'sessions_data_version'
+PLAYERS_VERSION_KEY = 'players_data_version'
+
 
 class Settings:
     collection_name = 'settings'
@@ -33,6 +38,29 @@ class Settings:
             upsert=True
         )
 
+    @classmethod
+    def increment(cls, key, amount=1):
+        """Tăng một setting kiểu số (atomic), trả về giá trị mới"""
+        doc = cls.get_collection().find_one_and_update(
+            {'key': key},
+            {'$inc': {'value': amount}, '$set': {'updated_at': datetime.now()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc['value']
+
+    @classmethod
+    def get_data_version(cls):
+        """(sessions_version, players_version) trong một query"""
+        versions = {
+            doc['key']: doc.get('value', 0)
+            for doc in cls.get_collection().find(
+                {'key': {'$in': [SESSIONS_VERSION_KEY, PLAYERS_VERSION_KEY]}},
+                {'key': 1, 'value': 1}
+            )
+        }
+        return versions.get(SESSIONS_VERSION_KEY, 0), versions.get(PLAYERS_VERSION_KEY, 0)
+
     @classmethod
     def get_all(cls):
         """Lấy tất cả settings"""
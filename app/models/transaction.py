@@ -69,6 +69,18 @@ class Transaction:
         """Find all transactions"""
         return list(cls.get_collection().find().sort('created_at', -1).limit(limit))
 
+    @classmethod
+    def iter_by_date_range(cls, start_date=None, end_date=None, projection=None, batch_size=500):
+        """Cursor các giao dịch theo transaction_date tăng dần (không load hết vào memory)"""
+        query = {}
+        if start_date or end_date:
+            query['transaction_date'] = {}
+            if start_date:
+                query['transaction_date']['$gte'] = start_date
+            if end_date:
+                query['transaction_date']['$lt'] = end_date
+        return cls.get_collection().find(query, projection).sort('transaction_date', 1).batch_size(batch_size)
+
     @classmethod
     def create(cls, data):
         """Create a new transaction"""
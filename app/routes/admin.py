@@ -1,13 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session as flask_session
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, session as flask_session,
+                   Response, stream_with_context, send_file, abort)
 from datetime import datetime
+import tempfile
 from dateutil.relativedelta import relativedelta
 from bson import ObjectId
 from functools import wraps
 
-from app.models.session import Session
+from app.models.session import Session, BALANCE_PROJECTION, DETAIL_PROJECTION
+from app.models.closed_month import ClosedMonth, MonthClosedError
 from app.models.player import Player
+from app.models.rollup import MonthlyRollup
 from app.models.user import User
 from app.models.settings import Settings
+from app.services.export import EXPORT_DATASETS, parse_date_range, iter_rows, iter_csv, write_xlsx
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -27,6 +32,12 @@ def login_required(f):
     return decorated_function
 
 
+@admin_bp.errorhandler(MonthClosedError)
+def month_closed(e):
+    flash(str(e), 'error')
+    return redirect(request.referrer or url_for('admin.sessions'))
+
+
 @admin_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """Admin login"""
@@ -135,11 +146,9 @@ def sessions():
 
     # Smart default
     if year is None or month is None:
-        current_start = datetime(now.year, now.month, 1)
-        current_end = current_start + relativedelta(months=1)
-        current_sessions = Session.find_by_date_range(current_start, current_end)
+        current_rollup = MonthlyRollup.get(now.year, now.month)
 
-        if current_sessions:
+        if current_rollup['sessions_count'] > 0:
             year = now.year
             month = now.month
         else:
@@ -150,7 +159,7 @@ def sessions():
     start_date = datetime(year, month, 1)
     end_date = start_date + relativedelta(months=1)
 
-    sessions_list = Session.find_by_date_range(start_date, end_date)
+    sessions_list = Session.find_by_date_range(start_date, end_date, include_archive=True)
     summary = Session.get_monthly_summary(year, month)
     available_months = Session.get_available_months()
 
@@ -162,6 +171,30 @@ def sessions():
                            available_months=available_months)
 
 
+@admin_bp.route('/months/<int:year>/<int:month>/close', methods=['POST'])
+@login_required
+def month_close(year, month):
+    """Chốt sổ tháng (chỉ khi mọi buổi đã hoàn thành và đã thanh toán / trả lại đủ)"""
+    snapshot, problems = ClosedMonth.close(year, month, closed_by=flask_session.get('admin_username'))
+    if snapshot:
+        flash(f'Đã chốt sổ tháng {month}/{year}', 'success')
+    else:
+        flash(f'Chưa thể chốt tháng {month}/{year}: ' + '; '.join(problems[:5])
+              + (f' (và {len(problems) - 5} vấn đề khác)' if len(problems) > 5 else ''), 'error')
+    return redirect(url_for('admin.sessions', year=year, month=month))
+
+
+@admin_bp.route('/months/<int:year>/<int:month>/reopen', methods=['POST'])
+@login_required
+def month_reopen(year, month):
+    """Mở lại tháng đã chốt để sửa"""
+    if ClosedMonth.reopen(year, month):
+        flash(f'Đã mở lại tháng {month}/{year}', 'success')
+    else:
+        flash(f'Tháng {month}/{year} chưa chốt', 'error')
+    return redirect(url_for('admin.sessions', year=year, month=month))
+
+
 @admin_bp.route('/sessions/new', methods=['GET', 'POST'])
 @login_required
 def session_new():
@@ -176,11 +209,39 @@ def session_new():
         start_time = request.form.get('start_time', '')
         end_time = request.form.get('end_time', '')
 
+        court_payer_id = request.form.get('court_payer_id', str(court_payer['_id']) if court_payer else '')
+        shuttlecock_payer_id = request.form.get('shuttlecock_payer_id',
+                                                str(shuttlecock_payer['_id']) if shuttlecock_payer else '')
+        participant_ids = request.form.getlist('participants')
+
+        if not participant_ids:
+            flash('Vui lòng chọn ít nhất 1 người chơi', 'error')
+            return render_template('admin/session_form.html',
+                                   players=players,
+                                   court_payer=court_payer,
+                                   shuttlecock_payer=shuttlecock_payer,
+                                   defaults=defaults,
+                                   session_data=None,
+                                   is_edit=False)
+
+        # Load tất cả người chơi + người trả sân/cầu trong 1 query
+        players_by_id = Player.find_by_ids(participant_ids + [court_payer_id, shuttlecock_payer_id])
+        missing_ids = [pid for pid in participant_ids + [court_payer_id, shuttlecock_payer_id]
+                       if pid and pid not in players_by_id]
+        if missing_ids:
+            flash('Không tìm thấy người chơi: ' + ', '.join(missing_ids), 'error')
+            return render_template('admin/session_form.html',
+                                   players=players,
+                                   court_payer=court_payer,
+                                   shuttlecock_payer=shuttlecock_payer,
+                                   defaults=defaults,
+                                   session_data=None,
+                                   is_edit=False)
+
         # Court info
         price_per_hour = int(request.form['price_per_hour'])
         total_hours = float(request.form['total_hours'])
-        court_payer_id = request.form.get('court_payer_id', str(court_payer['_id']) if court_payer else '')
-        court_payer_doc = Player.find_by_id(court_payer_id) if court_payer_id else None
+        court_payer_doc = players_by_id.get(court_payer_id) if court_payer_id else None
         total_court_price = int(price_per_hour * total_hours)
 
         court = {
@@ -198,9 +259,7 @@ def session_new():
         # Shuttlecock info
         shuttlecock_qty = int(request.form['shuttlecock_quantity'])
         shuttlecock_price = int(request.form['price_per_shuttlecock'])
-        shuttlecock_payer_id = request.form.get('shuttlecock_payer_id',
-                                                str(shuttlecock_payer['_id']) if shuttlecock_payer else '')
-        shuttlecock_payer_doc = Player.find_by_id(shuttlecock_payer_id) if shuttlecock_payer_id else None
+        shuttlecock_payer_doc = players_by_id.get(shuttlecock_payer_id) if shuttlecock_payer_id else None
         total_shuttlecock_price = shuttlecock_qty * shuttlecock_price
 
         shuttlecock = {
@@ -215,17 +274,6 @@ def session_new():
 
         # Calculate totals
         total_cost = total_court_price + total_shuttlecock_price
-        participant_ids = request.form.getlist('participants')
-
-        if not participant_ids:
-            flash('Vui lòng chọn ít nhất 1 người chơi', 'error')
-            return render_template('admin/session_form.html',
-                                   players=players,
-                                   court_payer=court_payer,
-                                   shuttlecock_payer=shuttlecock_payer,
-                                   defaults=defaults,
-                                   session_data=None,
-                                   is_edit=False)
 
         # Calculate amount per person
         num_participants = len(participant_ids)
@@ -234,7 +282,7 @@ def session_new():
         # Build participants list with pre-paid amounts
         participants = []
         for pid in participant_ids:
-            player = Player.find_by_id(pid)
+            player = players_by_id[pid]
             player_name = player['name']
 
             # Calculate pre-paid amount (người trả sân/cầu đã trả trước)
@@ -309,11 +357,26 @@ def session_edit(session_id):
         start_time = request.form.get('start_time', '')
         end_time = request.form.get('end_time', '')
 
+        court_payer_id = request.form.get('court_payer_id')
+        shuttlecock_payer_id = request.form.get('shuttlecock_payer_id')
+        participant_ids = request.form.getlist('participants')
+
+        if not participant_ids:
+            flash('Vui lòng chọn ít nhất 1 người chơi', 'error')
+            return redirect(url_for('admin.session_edit', session_id=session_id))
+
+        # Load tất cả người chơi + người trả sân/cầu trong 1 query
+        players_by_id = Player.find_by_ids(participant_ids + [court_payer_id, shuttlecock_payer_id])
+        missing_ids = [pid for pid in participant_ids + [court_payer_id, shuttlecock_payer_id]
+                       if pid and pid not in players_by_id]
+        if missing_ids:
+            flash('Không tìm thấy người chơi: ' + ', '.join(missing_ids), 'error')
+            return redirect(url_for('admin.session_edit', session_id=session_id))
+
         # Court info
         price_per_hour = int(request.form['price_per_hour'])
         total_hours = float(request.form['total_hours'])
-        court_payer_id = request.form.get('court_payer_id')
-        court_payer_doc = Player.find_by_id(court_payer_id)
+        court_payer_doc = players_by_id.get(court_payer_id) if court_payer_id else None
         total_court_price = int(price_per_hour * total_hours)
 
         court = {
@@ -323,16 +386,15 @@ def session_edit(session_id):
             'total_hours': total_hours,
             'total_court_price': total_court_price,
             'paid_by': {
-                'player_id': ObjectId(court_payer_id),
-                'player_name': court_payer_doc['name']
+                'player_id': ObjectId(court_payer_id) if court_payer_id else None,
+                'player_name': court_payer_doc['name'] if court_payer_doc else ''
             }
         }
 
         # Shuttlecock info
         shuttlecock_qty = int(request.form['shuttlecock_quantity'])
         shuttlecock_price = int(request.form['price_per_shuttlecock'])
-        shuttlecock_payer_id = request.form.get('shuttlecock_payer_id')
-        shuttlecock_payer_doc = Player.find_by_id(shuttlecock_payer_id)
+        shuttlecock_payer_doc = players_by_id.get(shuttlecock_payer_id) if shuttlecock_payer_id else None
         total_shuttlecock_price = shuttlecock_qty * shuttlecock_price
 
         shuttlecock = {
@@ -340,14 +402,13 @@ def session_edit(session_id):
             'price_per_shuttlecock': shuttlecock_price,
             'total_shuttlecock_price': total_shuttlecock_price,
             'paid_by': {
-                'player_id': ObjectId(shuttlecock_payer_id),
-                'player_name': shuttlecock_payer_doc['name']
+                'player_id': ObjectId(shuttlecock_payer_id) if shuttlecock_payer_id else None,
+                'player_name': shuttlecock_payer_doc['name'] if shuttlecock_payer_doc else ''
             }
         }
 
         # Calculate totals
         total_cost = total_court_price + total_shuttlecock_price
-        participant_ids = request.form.getlist('participants')
         num_participants = len(participant_ids)
         amount_per_person = round(total_cost / num_participants)
 
@@ -357,15 +418,15 @@ def session_edit(session_id):
         # Build participants list
         participants = []
         for pid in participant_ids:
-            player = Player.find_by_id(pid)
+            player = players_by_id[pid]
             player_name = player['name']
             existing = existing_payments.get(pid, {})
 
             # Calculate pre-paid amount
             pre_paid = 0
-            if str(player['_id']) == court_payer_id:
+            if court_payer_id and str(player['_id']) == court_payer_id:
                 pre_paid += total_court_price
-            if str(player['_id']) == shuttlecock_payer_id:
+            if shuttlecock_payer_id and str(player['_id']) == shuttlecock_payer_id:
                 pre_paid += total_shuttlecock_price
 
             # Keep manually updated payment if exists, otherwise use pre-paid
@@ -416,7 +477,7 @@ def session_edit(session_id):
 @login_required
 def session_detail(session_id):
     """Chi tiết buổi chơi"""
-    session_doc = Session.find_by_id(session_id)
+    session_doc = Session.find_by_id(session_id, include_archive=True)
     if not session_doc:
         flash('Không tìm thấy buổi chơi', 'error')
         return redirect(url_for('admin.sessions'))
@@ -500,7 +561,7 @@ def mark_all_paid():
     """Đánh dấu một người đã trả hết tất cả tiền chưa thanh toán"""
     player_name = request.form['player_name']
 
-    all_sessions = Session.find_all(limit=500)
+    all_sessions = Session.find_open(limit=500, projection=DETAIL_PROJECTION)
 
     count = 0
     for session_doc in all_sessions:
@@ -524,7 +585,7 @@ def mark_received():
     """Đánh dấu đã trả lại tiền cho một người"""
     player_name = request.form['player_name']
 
-    all_sessions = Session.find_all(limit=500)
+    all_sessions = Session.find_open(limit=500, projection=BALANCE_PROJECTION)
 
     count = 0
     total_returned = 0
@@ -565,7 +626,8 @@ def player_new():
         'email': request.form.get('email'),
         'is_default_court_payer': request.form.get('is_default_court_payer') == 'on',
         'is_default_shuttlecock_payer': request.form.get('is_default_shuttlecock_payer') == 'on',
-        'is_admin': request.form.get('is_admin') == 'on'
+        'is_admin': request.form.get('is_admin') == 'on',
+        'aliases': Player.parse_aliases(request.form.get('aliases'))
     })
     flash('Đã thêm người chơi mới', 'success')
     return redirect(url_for('admin.players'))
@@ -581,7 +643,8 @@ def player_edit(player_id):
         'email': request.form.get('email'),
         'is_default_court_payer': request.form.get('is_default_court_payer') == 'on',
         'is_default_shuttlecock_payer': request.form.get('is_default_shuttlecock_payer') == 'on',
-        'is_admin': request.form.get('is_admin') == 'on'
+        'is_admin': request.form.get('is_admin') == 'on',
+        'aliases': Player.parse_aliases(request.form.get('aliases'))
     })
     flash('Đã cập nhật thông tin người chơi', 'success')
     return redirect(url_for('admin.players'))
@@ -611,17 +674,73 @@ def player_stats(player_id):
     start_date = datetime(year, month, 1)
     end_date = start_date + relativedelta(months=1)
 
-    sessions_list = Session.find_by_player(player['name'], start_date, end_date)
-    debt_info = Session.get_player_debt(player['name'], start_date, end_date)
+    try:
+        statement = Session.get_player_statement(player_id, start_date, end_date, limit=100,
+                                                 cursor=request.args.get('cursor'), include_archive=True,
+                                                 player_name=player['name'])
+    except ValueError:
+        return redirect(url_for('admin.player_stats', player_id=player_id, year=year, month=month))
 
     return render_template('admin/player_stats.html',
                            player=player,
-                           sessions=sessions_list,
-                           debt_info=debt_info,
+                           entries=statement['entries'],
+                           debt_info=statement['summary'],
+                           next_cursor=statement['next_cursor'],
                            selected_year=year,
                            selected_month=month)
 
 
+# ==========================================
+# Export
+# ==========================================
+
+@admin_bp.route('/export/<dataset>.<fmt>')
+@login_required
+def export(dataset, fmt):
+    """Xuất sessions/participants/transactions ra CSV (stream) hoặc XLSX.
+    Query params: from, to (YYYY-MM-DD), flatten=1 (sessions → mỗi người chơi một dòng)
+    """
+    if dataset not in EXPORT_DATASETS or fmt not in ('csv', 'xlsx'):
+        abort(404)
+
+    date_from = request.args.get('from', '')
+    date_to = request.args.get('to', '')
+    try:
+        start_date, end_date = parse_date_range(date_from, date_to)
+    except ValueError:
+        flash('Ngày không hợp lệ (định dạng YYYY-MM-DD)', 'error')
+        return redirect(url_for('admin.sessions'))
+
+    if dataset == 'sessions' and request.args.get('flatten') == '1':
+        dataset = 'participants'
+
+    filename = '_'.join(part for part in (dataset, date_from, date_to) if part) + f'.{fmt}'
+    rows = iter_rows(dataset, start_date, end_date)
+
+    if fmt == 'csv':
+        return Response(
+            stream_with_context(iter_csv(rows)),
+            mimetype='text/csv; charset=utf-8',
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+
+    # openpyxl write_only ghi từng dòng ra file tạm, không giữ toàn bộ dữ liệu trong memory
+    tmp = tempfile.TemporaryFile()
+    try:
+        write_xlsx(rows, tmp)
+    except RuntimeError as e:
+        tmp.close()
+        flash(str(e), 'error')
+        return redirect(url_for('admin.sessions'))
+    tmp.seek(0)
+    return send_file(
+        tmp,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=filename
+    )
+
+
 # ==========================================
 # Settings Management
 # ==========================================
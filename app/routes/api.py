@@ -3,6 +3,7 @@ from bson import ObjectId
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
+from app.models.closed_month import MonthClosedError
 from app.models.player import Player
 from app.models.session import Session
 from app.models.transaction import Transaction
@@ -10,6 +11,11 @@ from app.models.transaction import Transaction
 api_bp = Blueprint('api', __name__)
 
 
+@api_bp.errorhandler(MonthClosedError)
+def month_closed(e):
+    return jsonify({'error': str(e), 'month': e.month_key}), 409
+
+
 def serialize_doc(doc):
     """Convert MongoDB document to JSON-serializable dict"""
     if doc is None:
@@ -51,6 +57,33 @@ def get_player(player_id):
     return jsonify(serialize_doc(player))
 
 
+@api_bp.route('/players/<player_id>/statement', methods=['GET'])
+def get_player_statement(player_id):
+    """Sao kê người chơi: các buổi (mới nhất trước) + số dư lũy kế.
+    Query params: start_date, end_date (ISO), limit (tối đa 200), cursor (next_cursor của trang trước),
+    include_archive=1 (gồm cả các buổi đã lưu trữ)
+    """
+    player = Player.find_by_id(player_id) if ObjectId.is_valid(player_id) else None
+    if not player:
+        return jsonify({'error': 'Player not found'}), 404
+
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+        statement = Session.get_player_statement(player_id, start, end, limit=limit,
+                                                 cursor=request.args.get('cursor'),
+                                                 include_archive=request.args.get('include_archive') == '1',
+                                                 player_name=player['name'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(serialize_doc(statement))
+
+
 @api_bp.route('/players', methods=['POST'])
 def create_player():
     data = request.json
@@ -80,16 +113,17 @@ def get_sessions():
     start_date = request. args.get('start_date')
     end_date = request.args.get('end_date')
     player = request. args.get('player')
+    include_archive = request.args.get('include_archive') == '1'
 
     if start_date and end_date:
         start = datetime.fromisoformat(start_date)
         end = datetime.fromisoformat(end_date)
         if player:
-            sessions = Session.find_by_player(player, start, end)
+            sessions = Session.find_by_player(player, start, end, include_archive=include_archive)
         else:
-            sessions = Session. find_by_date_range(start, end)
+            sessions = Session. find_by_date_range(start, end, include_archive=include_archive)
     elif player:
-        sessions = Session.find_by_player(player)
+        sessions = Session.find_by_player(player, include_archive=include_archive)
     else:
         sessions = Session.find_all()
 
@@ -98,7 +132,7 @@ def get_sessions():
 
 @api_bp.route('/sessions/<session_id>', methods=['GET'])
 def get_session(session_id):
-    session = Session.find_by_id(session_id)
+    session = Session.find_by_id(session_id, include_archive=True)
     if not session:
         return jsonify({'error': 'Session not found'}), 404
     return jsonify(serialize_doc(session))
@@ -110,7 +144,7 @@ def update_payment(session_id):
     player_name = data['player_name']
     amount_paid = data['amount_paid']
 
-    success = Session.update_participant_payment(session_id, player_name, amount_paid)
+    success = Session.update_participant_payment(session_id, player_name, amount_paid, source='api')
     if not success:
         return jsonify({'error': 'Session not found'}), 404
 
@@ -144,10 +178,22 @@ def get_player_stats(player_name):
     if start_date and end_date:
         start = datetime.fromisoformat(start_date)
         end = datetime.fromisoformat(end_date)
-        stats = Session.get_player_debt(player_name, start, end)
     else:
-        stats = Session.get_player_debt(player_name)
+        start = end = None
+
+    # Nhiều người: /stats/player/Ly,Mạnh,Tuấn → một lần aggregate
+    names = [name.strip() for name in player_name.split(',') if name.strip()]
+    debts = Session.get_debts_for_players(names, start, end,
+                                          include_archive=request.args.get('include_archive') == '1')
+
+    if len(names) > 1:
+        return jsonify({
+            'players': [serialize_doc(debts[name]) if debts[name] else {'_id': name, 'total_owed': 0}
+                        for name in names],
+            'total_owed': sum(debts[name]['total_owed'] for name in names if debts[name])
+        })
 
+    stats = debts.get(names[0]) if names else None
     if not stats:
         return jsonify({'message': 'No data found', 'total_owed': 0}), 200
 
@@ -1,5 +1,7 @@
-from flask import Blueprint, request, jsonify, render_template
-from app.services.ai_service import chat
+import json
+
+from flask import Blueprint, Response, request, jsonify, render_template, stream_with_context
+from app.services.ai_service import chat, chat_stream
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -24,4 +26,27 @@ def ask():
     return jsonify({
         'question': user_message,
         'answer': response
-    })
\ No newline at end of file
+    })
+
+
+@chat_bp.route('/ask/stream', methods=['POST'])
+def ask_stream():
+    """Giống /ask nhưng trả về Server-Sent Events:
+    draft (câu trả lời tính sẵn) → token... (OpenAI) hoặc final → done
+    """
+    data = request.json or {}
+    user_message = data.get('message', '')
+
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+
+    def generate():
+        for event, text in chat_stream(user_message):
+            yield f"event: {event}\ndata: {json.dumps({'text': text}, ensure_ascii=False)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,18 @@
+from flask import Blueprint, current_app, jsonify
+
+from app.services.health import readiness
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/healthz')
+def healthz():
+    """Liveness: process còn phục vụ request được (không I/O)"""
+    return jsonify({'status': 'ok'})
+
+
+@health_bp.route('/readyz')
+def readyz():
+    """Readiness: ping Mongo (cache), pool, trạng thái migration lúc khởi động"""
+    ready, details = readiness(current_app)
+    return jsonify(details), 200 if ready else 503
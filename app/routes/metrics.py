@@ -0,0 +1,19 @@
+from flask import Blueprint, Response, request, current_app, abort
+
+from app.services.metrics import PROMETHEUS_AVAILABLE, render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint (bảo vệ bằng METRICS_TOKEN nếu được cấu hình)"""
+    if not current_app.config.get('METRICS_ENABLED', True) or not PROMETHEUS_AVAILABLE:
+        abort(404)
+
+    token = current_app.config.get('METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization', '') != f'Bearer {token}':
+        abort(401)
+
+    body, content_type = render_metrics()
+    return Response(body, mimetype=None, content_type=content_type)
@@ -0,0 +1,77 @@
+from flask import Blueprint, request, current_app, abort, redirect, send_file, url_for
+
+from app.services import vietqr
+
+qr_bp = Blueprint('qr', __name__)
+
+# Ảnh theo hash nội dung không bao giờ đổi → cache 1 năm
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _render(amount, description, fmt):
+    """Render (hoặc lấy từ cache) ảnh QR, trả về hash. None nếu không tạo được payload
+    (ngân hàng không có trong BANK_BINS) — khi đó dùng ảnh img.vietqr.io"""
+    config = current_app.config
+    try:
+        payload = vietqr.payload_from_config(config, amount, description)
+    except ValueError as e:
+        print(f"[QR] {e}, falling back to img.vietqr.io")
+        return None
+    return vietqr.ensure_rendered(payload, config['QR_CACHE_DIR'], fmt, config['QR_SCALE'],
+                                  config.get('QR_CACHE_MAX_FILES'))
+
+
+def qr_link_url(amount, description='', fmt='png'):
+    """URL /qr/vietqr.<fmt> đã ký cho JS (chỉ render khi người dùng mở QR).
+
+    Template lấy URL này qua filter vietqr_link và truyền nguyên cho showQRModal: trình duyệt không tự
+    ghép số tiền / nội dung, vì route QR chỉ nhận tham số có chữ ký của server.
+    """
+    amount = int(amount or 0)
+    return url_for('qr.vietqr_image', fmt=fmt, amount=amount, addInfo=description,
+                   sig=vietqr.sign(current_app.config['SECRET_KEY'], amount, description))
+
+
+@qr_bp.route('/qr/vietqr.<fmt>')
+def vietqr_image(fmt):
+    """Dùng cho JS: /qr/vietqr.png?amount=...&addInfo=...&sig=... (URL từ qr_link_url)
+    → redirect tới ảnh theo hash.
+
+    Chỉ nhận tham số có chữ ký của server: không dùng được route để render số tiền / nội dung tùy ý
+    """
+    if fmt not in vietqr.FORMATS:
+        abort(404)
+
+    amount = request.args.get('amount', 0, type=int)
+    description = request.args.get('addInfo', '')
+    config = current_app.config
+    if not vietqr.verify_signature(config['SECRET_KEY'], amount, description, request.args.get('sig')):
+        abort(403)
+
+    if not vietqr.SEGNO_AVAILABLE:
+        return redirect(vietqr.external_url(config, amount, description))
+
+    digest = _render(amount, description, fmt)
+    if digest is None:
+        return redirect(vietqr.external_url(config, amount, description))
+    return redirect(url_for('qr.image', digest=digest, fmt=fmt))
+
+
+@qr_bp.route('/qr/<digest>.<fmt>')
+def image(digest, fmt):
+    """Ảnh QR trong cache trên đĩa (content-addressed)"""
+    if fmt not in vietqr.FORMATS or not vietqr.HASH_RE.match(digest):
+        abort(404)
+
+    try:
+        response = send_file(
+            vietqr.cache_path(current_app.config['QR_CACHE_DIR'], digest, fmt),
+            mimetype='image/png' if fmt == 'png' else 'image/svg+xml',
+            max_age=IMMUTABLE_MAX_AGE
+        )
+    except FileNotFoundError:
+        abort(404)
+
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
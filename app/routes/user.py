@@ -4,6 +4,7 @@ from dateutil.relativedelta import relativedelta
 
 from app.models.session import Session
 from app.models.player import Player
+from app.models.rollup import MonthlyRollup
 
 user_bp = Blueprint('user', __name__)
 
@@ -57,11 +58,9 @@ def sessions():
     month = request.args.get('month', type=int)
 
     if year is None or month is None:
-        current_start = datetime(now.year, now.month, 1)
-        current_end = current_start + relativedelta(months=1)
-        current_sessions = Session.find_by_date_range(current_start, current_end)
+        current_rollup = MonthlyRollup.get(now.year, now.month)
 
-        if current_sessions:
+        if current_rollup['sessions_count'] > 0:
             year = now.year
             month = now.month
         else:
@@ -74,10 +73,11 @@ def sessions():
     start_date = datetime(year, month, 1)
     end_date = start_date + relativedelta(months=1)
 
+    # Xem lịch sử theo tháng: gồm cả các buổi đã lưu trữ
     if player:
-        sessions_list = Session.find_by_player(player, start_date, end_date)
+        sessions_list = Session.find_by_player(player, start_date, end_date, include_archive=True)
     else:
-        sessions_list = Session.find_by_date_range(start_date, end_date)
+        sessions_list = Session.find_by_date_range(start_date, end_date, include_archive=True)
 
     summary = Session.get_monthly_summary(year, month)
     players = Player.find_all()
@@ -96,7 +96,7 @@ def sessions():
 @user_bp.route('/sessions/<session_id>')
 def session_detail(session_id):
     """Chi tiết một buổi chơi"""
-    session = Session.find_by_id(session_id)
+    session = Session.find_by_id(session_id, include_archive=True)
     if not session:
         return "Session not found", 404
 
@@ -3,8 +3,11 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 
 from app.models.transaction import Transaction
+from app.models.participation import Participation
 from app.models.session import Session
 from app.models.player import Player
+from app.services.metrics import observe_webhook
+from app.services.name_matcher import get_name_matcher
 
 webhook_bp = Blueprint('webhook', __name__)
 
@@ -145,6 +148,7 @@ def sepay_webhook():
     if sepay_id:
         existing = Transaction.find_by_sepay_id(sepay_id)
         if existing:
+            observe_webhook('duplicate')
             return jsonify({
                 'success': False,
                 'message': 'Duplicate transaction',
@@ -165,6 +169,7 @@ def sepay_webhook():
             'player_name': None,
             'sessions_updated': []
         })
+        observe_webhook('failed')
         return jsonify({
             'success': False,
             'message': 'Not an incoming transfer'
@@ -184,6 +189,7 @@ def sepay_webhook():
             'player_name': None,
             'sessions_updated': []
         })
+        observe_webhook('failed')
         return jsonify({
             'success': False,
             'message': 'Invalid payment content - missing keywords'
@@ -198,6 +204,11 @@ def sepay_webhook():
     else:
         # Fall back to extracting player name from content
         player_name = extract_player_name(content)
+        if player_name:
+            # Khớp tên/tên gọi khác (không dấu, đúng ranh giới từ) với danh sách người chơi
+            matched = get_name_matcher().find_names(player_name)
+            if len(matched) == 1:
+                player_name = matched[0]
 
     if not player_name:
         Transaction.create({
@@ -212,23 +223,19 @@ def sepay_webhook():
             'player_name': None,
             'sessions_updated': []
         })
+        observe_webhook('failed')
         return jsonify({
             'success': False,
             'message': 'Could not extract player from content'
         }), 200
 
-    # Find unpaid sessions for this player
-    debt_details = Session.get_all_debts_with_details()
-    player_debts = None
+    # Find unpaid sessions for this player (index (player_id, is_paid, date) của participations)
+    # Không thấy theo player_id (participant cũ) → tìm theo tên bỏ dấu
+    unpaid = Participation.find_unpaid(player_id=player['_id'] if player else None, player_name=player_name)
+    if unpaid:
+        player_name = unpaid[0]['player_name']  # Use the exact name from database
 
-    # Case-insensitive player name matching
-    for name, details in debt_details.items():
-        if name.lower() == player_name.lower():
-            player_debts = details
-            player_name = name  # Use the exact name from database
-            break
-
-    if not player_debts or not player_debts.get('sessions'):
+    if not unpaid:
         Transaction.create({
             'sepay_id': sepay_id,
             'gateway': gateway,
@@ -241,6 +248,7 @@ def sepay_webhook():
             'player_name': player_name,
             'sessions_updated': []
         })
+        observe_webhook('success', [])
         return jsonify({
             'success': True,
             'message': f'No unpaid sessions found for {player_name}',
@@ -253,29 +261,24 @@ def sepay_webhook():
     sessions_updated = []
     remaining_amount = transfer_amount
 
-    # Sort sessions by date (oldest first)
-    sorted_sessions = sorted(
-        player_debts['sessions'],
-        key=lambda x: x['date']
-    )
-
-    for session_info in sorted_sessions:
+    # find_unpaid đã sắp theo ngày (oldest first)
+    for participation in unpaid:
         if remaining_amount <= 0:
             break
 
-        session_id = session_info['session_id']
-        owed = session_info['owed']
-        current_paid = session_info['amount_paid']
+        session_id = str(participation['session_id'])
+        owed = participation['amount_due'] - participation['amount_paid']
 
         if owed > 0:
             payment_for_session = min(remaining_amount, owed)
-            new_paid = current_paid + payment_for_session
 
-            # Update payment in database
-            success = Session.update_participant_payment(
+            # Ghi khoản thanh toán vào ledger payments và cộng ($inc) vào amount_paid của session
+            success = Session.add_participant_payment(
                 session_id,
                 player_name,
-                new_paid
+                payment_for_session,
+                source='webhook',
+                reference=sepay_id
             )
 
             if success:
@@ -299,6 +302,7 @@ def sepay_webhook():
         'player_name': player_name,
         'sessions_updated': sessions_updated
     })
+    observe_webhook('success', sessions_updated)
 
     return jsonify({
         'success': True,
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Chuyển các session đã thanh toán xong và cũ hơn N tháng sang collection sessions_archive
+Run: python app/scripts/archive_sessions.py [--months 6] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app
+from app.models.session import Session
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lưu trữ session cũ đã thanh toán xong')
+    parser.add_argument('--months', type=int, help='Chỉ lưu trữ session cũ hơn N tháng (mặc định ARCHIVE_AFTER_MONTHS)')
+    parser.add_argument('--dry-run', action='store_true', help='Chỉ đếm, không di chuyển dữ liệu')
+    args = parser.parse_args()
+
+    app = create_app()
+    months = args.months if args.months is not None else app.config['ARCHIVE_AFTER_MONTHS']
+
+    with app.app_context():
+        result = Session.archive_settled(older_than_months=months, dry_run=args.dry_run)
+
+    action = 'Would archive' if args.dry_run else 'Archived'
+    print(f"✅ {action} {result['archived']} sessions older than {months} months")
+    if result['months']:
+        print(f"   Months: {', '.join(result['months'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Dựng lại collection participations từ sessions và sessions_archive
+Run: python app/scripts/backfill_participations.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app
+from app.models.participation import Participation
+
+
+def main():
+    app = create_app()
+    with app.app_context():
+        count = Participation.rebuild_all()
+
+    print(f"✅ Wrote {count} participations")
+
+
+if __name__ == '__main__':
+    main()
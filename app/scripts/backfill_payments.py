@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tạo ledger payments cho dữ liệu có từ trước (entry opening = amount_paid / amount_returned hiện tại)
+và đối soát cache trong sessions với tổng ledger.
+Run: python app/scripts/backfill_payments.py [--dry-run] [--verify]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app
+from app.models.payment import Payment, PAYMENT_PROJECTION
+from app.models.session import Session
+
+SESSION_PROJECTION = {'date': 1, **PAYMENT_PROJECTION}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill / đối soát ledger payments')
+    parser.add_argument('--dry-run', action='store_true', help='Chỉ đếm số entry sẽ ghi')
+    parser.add_argument('--verify', action='store_true', help='Chỉ đối soát, không ghi')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not args.verify:
+            count = Payment.backfill(
+                Session.iter_by_date_range(projection=SESSION_PROJECTION, include_archive=True),
+                dry_run=args.dry_run
+            )
+            action = 'Would write' if args.dry_run else 'Wrote'
+            print(f"✅ {action} {count} opening entries")
+
+        mismatches = Payment.find_mismatches(
+            Session.iter_by_date_range(projection=SESSION_PROJECTION, include_archive=True)
+        )
+
+    for m in mismatches[:20]:
+        print(f"   ⚠️ {m['date']:%d/%m/%Y} {m['player_name']} {m['kind']}: "
+              f"cache {m['cached']:,} != ledger {m['ledger']:,}")
+    if mismatches:
+        print(f"❌ {len(mismatches)} mismatches between sessions and payments")
+        sys.exit(1)
+    print("✅ Sessions match the payments ledger")
+
+
+if __name__ == '__main__':
+    main()
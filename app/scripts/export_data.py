@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Export sessions / participants / transactions ra CSV hoặc XLSX
+Run: python app/scripts/export_data.py participants --from 2025-01-01 --to 2025-12-31 -o out.csv
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app import create_app
+from app.services.export import EXPORT_DATASETS, parse_date_range, iter_rows, iter_csv, write_xlsx
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export dữ liệu Badminton Tracker')
+    parser.add_argument('dataset', choices=EXPORT_DATASETS)
+    parser.add_argument('--from', dest='date_from', help='Ngày bắt đầu (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', help='Ngày kết thúc, tính cả ngày này (YYYY-MM-DD)')
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default='csv')
+    parser.add_argument('-o', '--output', help='File output (mặc định stdout cho CSV)')
+    args = parser.parse_args()
+
+    start_date, end_date = parse_date_range(args.date_from, args.date_to)
+
+    app = create_app()
+    with app.app_context():
+        rows = iter_rows(args.dataset, start_date, end_date)
+
+        if args.format == 'xlsx':
+            if not args.output:
+                parser.error('--output is required for xlsx')
+            with open(args.output, 'wb') as f:
+                write_xlsx(rows, f)
+        elif args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='') as f:
+                for chunk in iter_csv(rows):
+                    f.write(chunk)
+        else:
+            for chunk in iter_csv(rows):
+                sys.stdout.write(chunk)
+
+    if args.output:
+        print(f"✅ Exported {args.dataset} to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
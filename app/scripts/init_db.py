@@ -28,7 +28,7 @@ def init_database():
     # Drop existing collections (để xóa validation cũ)
     # ==========================================
     print("Dropping existing collections...")
-    for collection_name in ['players', 'sessions', 'users', 'settings']:
+    for collection_name in ['players', 'sessions', 'users', 'settings', 'monthly_rollups']:
         if collection_name in db.list_collection_names():
             db. drop_collection(collection_name)
             print(f"   Dropped: {collection_name}")
@@ -58,15 +58,38 @@ def init_database():
     # Sessions collection
     db.sessions.create_index([("date", DESCENDING)])
     db.sessions.create_index([("status", ASCENDING)])
-    db.sessions.create_index([("participants. player_id", ASCENDING)])
     db.sessions.create_index([("participants. player_name", ASCENDING)])
     db.sessions.create_index([("participants. is_paid", ASCENDING)])
     db.sessions.create_index([
         ("date", DESCENDING),
         ("participants.player_name", ASCENDING)
     ])
+    # Quét công nợ chỉ trên các tháng chưa chốt (closed_month không tồn tại), mới nhất trước
+    db.sessions.create_index([("closed_month", ASCENDING), ("date", DESCENDING)])
     print("   ✓ sessions indexes")
 
+    # Sessions archive (session cũ đã thanh toán xong, chỉ đọc khi xem lịch sử)
+    db.sessions_archive.create_index([("date", DESCENDING)])
+    db.sessions_archive.create_index([("participants.player_id", ASCENDING), ("date", DESCENDING)])
+    db.sessions_archive.create_index([("participants.player_name", ASCENDING)])
+    print("   ✓ sessions_archive indexes")
+
+    # Closed months (snapshot của tháng đã chốt, _id = 'YYYY-MM')
+    db.closed_months.create_index([("start_date", ASCENDING), ("end_date", ASCENDING)])
+    print("   ✓ closed_months indexes")
+
+    # Participations (một document cho mỗi người chơi trong một buổi)
+    db.participations.create_index([("player_id", ASCENDING), ("is_paid", ASCENDING), ("date", ASCENDING)])
+    db.participations.create_index([("player_id", ASCENDING), ("date", DESCENDING), ("session_id", DESCENDING)])
+    db.participations.create_index([("player_name_lower", ASCENDING), ("date", DESCENDING)])
+    db.participations.create_index([("player_name_folded", ASCENDING), ("is_paid", ASCENDING), ("date", ASCENDING)])
+    db.participations.create_index([("session_id", ASCENDING)])
+    print("   ✓ participations indexes")
+
+    # Payments ledger (append-only): tổng theo (buổi, người chơi)
+    db.payments.create_index([("session_id", ASCENDING), ("player_key", ASCENDING)])
+    print("   ✓ payments indexes")
+
     # Users collection
     db.users.create_index([("username", ASCENDING)], unique=True, sparse=True)
     db.users.create_index([("email", ASCENDING)], unique=True, sparse=True)
@@ -1,15 +1,73 @@
+import copy
+import hashlib
 import json
-import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 from app.config import Config
-from app.models.session import Session
-from app.models.player import Player
+from app.models.session import Session, SUMMARY_PROJECTION
+from app.models.settings import Settings
+from app.services.cache import TTLCache
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.intent import classify
+from app.services.name_matcher import NameMatcher, get_name_matcher
+from app.services.metrics import (
+    observe_openai, observe_ai_request, observe_cache, observe_intent, observe_breaker_state
+)
 
 # Initialize OpenAI client with error handling
 client = None
 
+# Cache kết quả OpenAI: parse theo (câu hỏi, ngày), trả lời theo (câu hỏi, hash query_result).
+# Bị xoá khi sessions/players data version thay đổi.
+PARSE_CACHE = TTLCache(maxsize=Config.AI_CACHE_SIZE, ttl=Config.AI_CACHE_TTL)
+RESPONSE_CACHE = TTLCache(maxsize=Config.AI_CACHE_SIZE, ttl=Config.AI_CACHE_TTL)
+
+# Giới hạn số lượt gọi OpenAI đồng thời trong một worker + circuit breaker khi proxy chậm/lỗi
+LLM_SEMAPHORE = threading.BoundedSemaphore(Config.OPENAI_MAX_CONCURRENCY)
+OPENAI_BREAKER = CircuitBreaker(
+    failure_threshold=Config.OPENAI_BREAKER_FAILURES,
+    reset_timeout=Config.OPENAI_BREAKER_RESET_SECONDS,
+    on_state_change=lambda state: observe_breaker_state('openai', state)
+)
+observe_breaker_state('openai', OPENAI_BREAKER.state)
+
+
+class LLMUnavailable(Exception):
+    """Không gọi OpenAI (circuit đang mở / hết slot), dùng fallback ngay"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+@contextmanager
+def llm_slot():
+    """Giữ một slot gọi OpenAI: giới hạn đồng thời + circuit breaker.
+    Lỗi trong block được tính là failure; client ngắt stream giữa chừng thì không.
+    """
+    if not LLM_SEMAPHORE.acquire(timeout=Config.OPENAI_QUEUE_TIMEOUT):
+        raise LLMUnavailable('busy')
+    if not OPENAI_BREAKER.allow():
+        LLM_SEMAPHORE.release()
+        raise LLMUnavailable('circuit_open')
+
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        LLM_SEMAPHORE.release()
+        if failed:
+            OPENAI_BREAKER.record_failure()
+        else:
+            OPENAI_BREAKER.record_success()
+
 
 def get_openai_client():
     global client
@@ -21,21 +79,30 @@ def get_openai_client():
         return None
 
     try:
-        from openai import OpenAI
+        import httpx
+        from openai import OpenAI, DefaultHttpxClient
 
         base_url = getattr(Config, 'OPENAI_BASE_URL', None)
 
+        # Connection pool theo số lượt gọi đồng thời của worker, không retry (circuit breaker lo)
+        options = {
+            'api_key': Config.OPENAI_API_KEY,
+            'timeout': httpx.Timeout(Config.OPENAI_TIMEOUT, connect=Config.OPENAI_CONNECT_TIMEOUT),
+            'max_retries': Config.OPENAI_MAX_RETRIES,
+            'http_client': DefaultHttpxClient(limits=httpx.Limits(
+                max_connections=Config.OPENAI_MAX_CONCURRENCY,
+                max_keepalive_connections=Config.OPENAI_MAX_CONCURRENCY
+            ))
+        }
+
         if base_url:
-            client = OpenAI(
-                api_key=Config.OPENAI_API_KEY,
-                base_url=base_url
-            )
+            client = OpenAI(base_url=base_url, **options)
             print("[AI Service] ✅ OpenAI client initialized.")
             print(f"[AI Service] Using model: {Config.OPENAI_MODEL}")
             print(f"[AI Service] Base URL: {base_url}")
             print(f"[AI Service] client: {client}")
         else:
-            client = OpenAI(api_key=Config.OPENAI_API_KEY)
+            client = OpenAI(**options)
 
         print(f"[AI] OpenAI client initialized successfully")
         return client
@@ -105,40 +172,67 @@ Quy tắc:
 """
 
 
-def find_player_names_in_message(message: str) -> list:
-    """Tìm tên người chơi trong message"""
-    message_lower = message.lower()
-    found_players = []
-
+def classify_local(user_message: str) -> dict:
+    """Phân loại câu hỏi bằng bộ intent cục bộ (không gọi OpenAI)"""
     try:
-        players = Player.find_all()
-        for player in players:
-            player_name = player.get('name', '')
-            if player_name.lower() in message_lower:
-                found_players.append(player_name)
+        matcher = get_name_matcher()
     except Exception as e:
-        print(f"[AI] Error finding players: {e}")
+        print(f"[AI] Error loading players: {e}")
+        matcher = NameMatcher([])
+    return classify(user_message, matcher)
 
-    return found_players
+
+def _query_params(intent: dict) -> dict:
+    return {key: intent[key] for key in ('query_type', 'player_names', 'year', 'month', 'day')}
+
+
+def normalize_message(message: str) -> str:
+    """Chuẩn hoá câu hỏi làm cache key: chữ thường, gộp khoảng trắng, bỏ dấu câu ở cuối"""
+    return ' '.join(message.lower().split()).rstrip('?!. ')
+
+
+def sync_caches():
+    """Xoá cache AI nếu dữ liệu sessions/players đã thay đổi kể từ lần trước"""
+    try:
+        version = Settings.get_data_version()
+    except Exception as e:
+        print(f"[AI] Cannot read data version: {e}")
+        version = None
+    PARSE_CACHE.sync_version(version)
+    RESPONSE_CACHE.sync_version(version)
 
 
 def parse_user_query(user_message: str) -> dict:
-    """Phân tích câu hỏi của người dùng bằng AI hoặc fallback"""
+    """Phân tích câu hỏi: bộ intent cục bộ trước, chỉ gọi AI khi confidence thấp"""
+    local = classify_local(user_message)
+    if local['confidence'] >= Config.INTENT_CONFIDENCE_THRESHOLD:
+        observe_intent('local')
+        print(f"[AI] Parsed locally (confidence {local['confidence']}): {_query_params(local)}")
+        return _query_params(local)
+
     openai_client = get_openai_client()
 
     if openai_client:
+        observe_intent('escalated')
         current_date = datetime.now().strftime("%Y-%m-%d")
+        cache_key = (normalize_message(user_message), current_date)
+        cached = PARSE_CACHE.get(cache_key)
+        observe_cache('parse', cached is not None)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        started_at = time.perf_counter()
         try:
-            response = openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL or 'gpt-4o-mini',
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT.format(current_date=current_date)},
-                    {"role": "user", "content": user_message}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0,
-                timeout=15.0
-            )
+            with llm_slot():
+                response = openai_client.chat.completions.create(
+                    model=Config.OPENAI_MODEL or 'gpt-4o-mini',
+                    messages=[
+                        {"role": "system", "content": SYSTEM_PROMPT.format(current_date=current_date)},
+                        {"role": "user", "content": user_message}
+                    ],
+                    response_format={"type": "json_object"},
+                    temperature=0
+                )
             result = json.loads(response.choices[0].message.content)
             print(f"[AI] Parsed with OpenAI: {result}")
 
@@ -147,71 +241,35 @@ def parse_user_query(user_message: str) -> dict:
             if result.get('player_name'):  # backward compatibility
                 player_names = [result['player_name']]
 
-            return {
+            observe_openai('parse', started_at, 'success')
+            observe_ai_request('parse')
+            parsed = {
                 'query_type': result.get('query_type', 'all_debts'),
                 'player_names': player_names,
                 'year': result.get('year'),
                 'month': result.get('month'),
                 'day': result.get('day')
             }
+            PARSE_CACHE.set(cache_key, copy.deepcopy(parsed))
+            return parsed
+        except LLMUnavailable as e:
+            observe_ai_request('parse', e.reason)
+            print(f"[AI] OpenAI skipped ({e.reason}), using fallback")
         except Exception as e:
+            observe_openai('parse', started_at, 'error')
+            observe_ai_request('parse', 'error')
             print(f"[AI] OpenAI parse error: {e}, using fallback")
+    else:
+        observe_ai_request('parse', 'no_client')
 
-    return parse_query_fallback(user_message)
-
+    return parse_query_fallback(user_message, local)
 
-def parse_query_fallback(user_message: str) -> dict:
-    """Fallback parser khi không có OpenAI"""
-    message = user_message.lower()
-    now = datetime.now()
 
-    result = {
-        'query_type': 'all_debts',
-        'player_names': [],
-        'year': None,
-        'month': None,
-        'day': None
-    }
-
-    # Detect all player names in message
-    result['player_names'] = find_player_names_in_message(message)
-
-    # Detect month
-    month_match = re.search(r'tháng\s*(\d{1,2})', message)
-    if month_match:
-        result['month'] = int(month_match.group(1))
-        result['year'] = now.year
-
-    # Detect year
-    year_match = re.search(r'năm\s*(\d{4})|/(\d{4})', message)
-    if year_match:
-        result['year'] = int(year_match.group(1) or year_match.group(2))
-
-    # Detect day
-    day_match = re.search(r'ngày\s*(\d{1,2})', message)
-    if day_match:
-        result['day'] = int(day_match.group(1))
-        result['query_type'] = 'session_detail'
-        if result['month'] is None:
-            result['month'] = now.month
-        if result['year'] is None:
-            result['year'] = now.year
-
-    # Detect query type
-    if result['player_names']:
-        if any(word in message for word in ['nợ', 'thiếu', 'còn', 'owes', 'owe', 'tổng']):
-            result['query_type'] = 'player_debt'
-        elif any(word in message for word in ['buổi', 'chơi', 'tham gia', 'session']):
-            result['query_type'] = 'player_sessions'
-    elif 'ai' in message and any(word in message for word in ['nợ', 'thiếu']):
-        result['query_type'] = 'all_debts'
-    elif any(word in message for word in ['tổng', 'chi phí', 'thống kê', 'summary']):
-        result['query_type'] = 'monthly_stats'
-        if result['month'] is None:
-            result['month'] = now.month
-            result['year'] = now.year
-
-    print(f"[AI] Parsed with fallback: {result}")
+def parse_query_fallback(user_message: str, local: dict = None) -> dict:
+    """Fallback parser khi không có OpenAI: dùng kết quả của bộ intent cục bộ"""
+    local = local or classify_local(user_message)
+    result = _query_params(local)
+    print(f"[AI] Parsed with fallback (confidence {local['confidence']}): {result}")
     return result
 
 
@@ -243,12 +301,13 @@ def execute_query(query_params: dict) -> dict:
     try:
         if query_type == 'player_debt':
             if player_names:
-                # Query debt for multiple players
+                # Query debt for multiple players (một lần aggregate cho tất cả)
                 players_data = []
                 total_owed_all = 0
+                debts = Session.get_debts_for_players(player_names, start_date, end_date)
 
                 for player_name in player_names:
-                    debt_info = Session.get_player_debt(player_name, start_date, end_date)
+                    debt_info = debts.get(player_name)
                     if debt_info:
                         players_data.append({
                             'player_name': player_name,
@@ -277,7 +336,7 @@ def execute_query(query_params: dict) -> dict:
         elif query_type == 'player_sessions':
             if player_names:
                 player_name = player_names[0]  # Only first player for sessions
-                sessions = Session.find_by_player(player_name, start_date, end_date)
+                sessions = Session.find_by_player(player_name, start_date, end_date, include_archive=True)
                 result['data'] = {
                     'player_name': player_name,
                     'sessions': []
@@ -305,7 +364,7 @@ def execute_query(query_params: dict) -> dict:
             if day and month and year:
                 session_date = datetime(year, month, day)
                 next_day = session_date + relativedelta(days=1)
-                sessions = Session.find_by_date_range(session_date, next_day)
+                sessions = Session.find_by_date_range(session_date, next_day, include_archive=True)
                 if sessions:
                     session = sessions[0]
                     if player_names:
@@ -342,7 +401,7 @@ def execute_query(query_params: dict) -> dict:
                     'debts': summary.get('debts', [])
                 }
             else:
-                all_sessions = Session.find_all(limit=500)
+                all_sessions = Session.find_all(limit=500, projection=SUMMARY_PROJECTION)
                 total_cost = sum(s.get('total_cost', 0) for s in all_sessions)
                 total_owed_info = Session.get_total_owed_all_time()
                 result['data'] = {
@@ -361,31 +420,227 @@ def execute_query(query_params: dict) -> dict:
     return result
 
 
+# Số phần tử tối đa của mỗi danh sách gửi cho LLM (phần còn lại tóm tắt thành "…và N … khác")
+COMPACT_LIST_LIMIT = 15
+
+
+def _cap(items, label, limit=COMPACT_LIST_LIMIT):
+    items = list(items)
+    if len(items) <= limit:
+        return items
+    return items[:limit] + [f"…và {len(items) - limit} {label} khác"]
+
+
+def _compact_participant(p):
+    if not p:
+        return None
+    item = {
+        'due': safe_int(p.get('amount_due')),
+        'paid': safe_int(p.get('amount_paid')),
+        'owed': max(0, safe_int(p.get('amount_due')) - safe_int(p.get('amount_paid')))
+    }
+    if p.get('amount_to_receive'):
+        item['to_receive'] = safe_int(p['amount_to_receive'])
+    return item
+
+
+def _compact_debts(debts):
+    return _cap(
+        ({'name': d.get('_id'), 'owed': safe_int(d.get('total_owed')), 'sessions': d.get('sessions_count', 0)}
+         for d in debts or []),
+        'người'
+    )
+
+
+def _compact_data(query_type, data):
+    if query_type == 'player_debt':
+        return {
+            'players': [
+                {
+                    'name': p['player_name'], 'due': p['total_due'], 'paid': p['total_paid'],
+                    'owed': p['total_owed'], 'sessions': p['sessions_count'],
+                    **({'no_data': True} if p.get('no_data') else {})
+                }
+                for p in data.get('players', [])
+            ],
+            'total_owed_all': data.get('total_owed_all', 0)
+        }
+
+    if query_type == 'player_sessions':
+        sessions = [
+            {'date': s['date'], **(_compact_participant(s.get('participant')) or {})}
+            for s in data.get('sessions', [])
+        ]
+        return {
+            'player_name': data.get('player_name'),
+            'sessions_count': len(sessions),
+            'total_due': sum(s.get('due', 0) for s in sessions),
+            'total_paid': sum(s.get('paid', 0) for s in sessions),
+            'total_owed': sum(s.get('owed', 0) for s in sessions),
+            'sessions': _cap(sessions, 'buổi')
+        }
+
+    if query_type == 'all_debts':
+        return {'debts': _compact_debts(data)}
+
+    if query_type == 'session_detail':
+        if 'participant' in data:
+            return {
+                'date': data.get('date'),
+                'player_name': data.get('player_name'),
+                'total_cost': data.get('total_cost'),
+                'participant': _compact_participant(data.get('participant'))
+            }
+        court = data.get('court', {})
+        shuttlecock = data.get('shuttlecock', {})
+        return {
+            'date': data.get('date'),
+            'total_cost': data.get('total_cost'),
+            'participants_count': data.get('participants_count'),
+            'court': {
+                'name': court.get('name'),
+                'hours': court.get('total_hours'),
+                'price': court.get('total_court_price'),
+                'paid_by': (court.get('paid_by') or {}).get('player_name')
+            },
+            'shuttlecock': {
+                'quantity': shuttlecock.get('quantity'),
+                'price': shuttlecock.get('total_shuttlecock_price'),
+                'paid_by': (shuttlecock.get('paid_by') or {}).get('player_name')
+            }
+        }
+
+    if query_type == 'monthly_stats':
+        return {**{k: v for k, v in data.items() if k != 'debts'}, 'debts': _compact_debts(data.get('debts'))}
+
+    return data
+
+
+def compact_query_result(query_result: dict) -> str:
+    """JSON gọn của query_result cho bước trả lời: chỉ giữ field cần thiết,
+    cắt bớt danh sách dài, không indent
+    """
+    compact = {
+        'query_type': query_result.get('query_type'),
+        'period': query_result.get('period')
+    }
+    if query_result.get('player_names'):
+        compact['player_names'] = query_result['player_names']
+    if query_result.get('error'):
+        compact['error'] = query_result['error']
+
+    data = query_result.get('data')
+    compact['data'] = _compact_data(compact['query_type'], data) if data else None
+
+    return json.dumps(compact, default=str, ensure_ascii=False, separators=(',', ':'))
+
+
+def _response_messages(user_message: str, query_result: dict) -> list:
+    return [
+        {"role": "system", "content": RESPONSE_PROMPT},
+        {"role": "user", "content": f"""Câu hỏi: {user_message}
+
+Kết quả từ database:
+{compact_query_result(query_result)}"""}
+    ]
+
+
+def _response_cache_key(user_message: str, query_result: dict) -> tuple:
+    result_hash = hashlib.sha1(
+        json.dumps(query_result, default=str, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    return normalize_message(user_message), result_hash
+
+
 def generate_response(user_message: str, query_result: dict) -> str:
     """Tạo câu trả lời từ kết quả query"""
     openai_client = get_openai_client()
 
     if openai_client:
-        try:
-            response = openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL or 'gpt-4o-mini',
-                messages=[
-                    {"role": "system", "content": RESPONSE_PROMPT},
-                    {"role": "user", "content": f"""Câu hỏi: {user_message}
+        cache_key = _response_cache_key(user_message, query_result)
+        cached = RESPONSE_CACHE.get(cache_key)
+        observe_cache('respond', cached is not None)
+        if cached is not None:
+            return cached
 
-Kết quả từ database:
-{json.dumps(query_result, default=str, ensure_ascii=False, indent=2)}"""}
-                ],
-                temperature=0.7,
-            timeout = 15.0
-            )
-            return response.choices[0].message.content
+        started_at = time.perf_counter()
+        try:
+            with llm_slot():
+                response = openai_client.chat.completions.create(
+                    model=Config.OPENAI_MODEL or 'gpt-4o-mini',
+                    messages=_response_messages(user_message, query_result),
+                    temperature=0.7
+                )
+            observe_openai('respond', started_at, 'success')
+            observe_ai_request('respond')
+            answer = response.choices[0].message.content
+            RESPONSE_CACHE.set(cache_key, answer)
+            return answer
+        except LLMUnavailable as e:
+            observe_ai_request('respond', e.reason)
+            print(f"[AI] OpenAI skipped ({e.reason}), using fallback")
         except Exception as e:
+            observe_openai('respond', started_at, 'error')
+            observe_ai_request('respond', 'error')
             print(f"[AI] OpenAI response error: {e}, using fallback")
+    else:
+        observe_ai_request('respond', 'no_client')
 
     return generate_response_fallback(query_result)
 
 
+def stream_response(user_message: str, query_result: dict):
+    """Stream câu trả lời của OpenAI.
+    Yield ('token', text) cho từng đoạn, hoặc một ('final', text) nếu lấy từ cache.
+    Không yield gì nếu không có OpenAI / bị lỗi trước token đầu tiên; lỗi giữa chừng được raise.
+    """
+    openai_client = get_openai_client()
+    if not openai_client:
+        observe_ai_request('respond', 'no_client')
+        return
+
+    cache_key = _response_cache_key(user_message, query_result)
+    cached = RESPONSE_CACHE.get(cache_key)
+    observe_cache('respond', cached is not None)
+    if cached is not None:
+        yield 'final', cached
+        return
+
+    started_at = time.perf_counter()
+    chunks = []
+    try:
+        with llm_slot():
+            stream = openai_client.chat.completions.create(
+                model=Config.OPENAI_MODEL or 'gpt-4o-mini',
+                messages=_response_messages(user_message, query_result),
+                temperature=0.7,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    chunks.append(delta)
+                    yield 'token', delta
+    except LLMUnavailable as e:
+        observe_ai_request('respond', e.reason)
+        print(f"[AI] OpenAI skipped ({e.reason}), keeping fallback answer")
+        return
+    except Exception as e:
+        observe_openai('respond', started_at, 'error')
+        observe_ai_request('respond', 'error')
+        print(f"[AI] OpenAI stream error: {e}, keeping fallback answer")
+        if chunks:
+            raise
+        return
+
+    observe_openai('respond', started_at, 'success')
+    observe_ai_request('respond')
+    if chunks:
+        RESPONSE_CACHE.set(cache_key, ''.join(chunks))
+
+
 def generate_response_fallback(query_result: dict) -> str:
     """Fallback response khi không có OpenAI"""
     query_type = query_result.get('query_type')
@@ -527,6 +782,8 @@ def generate_response_fallback(query_result: dict) -> str:
 def chat(user_message: str) -> str:
     """Main function để xử lý chat"""
     try:
+        sync_caches()
+
         # Step 1: Parse user query
         query_params = parse_user_query(user_message)
 
@@ -542,4 +799,28 @@ def chat(user_message: str) -> str:
         print(f"[AI] Chat error: {e}")
         import traceback
         traceback.print_exc()
-        return "Xin lỗi, có lỗi xảy ra.  Vui lòng thử lại."
\ No newline at end of file
+        return "Xin lỗi, có lỗi xảy ra.  Vui lòng thử lại."
+
+
+def chat_stream(user_message: str):
+    """Giống chat() nhưng yield (event, text):
+    'draft' (câu trả lời fallback, gửi ngay sau khi query xong), rồi 'token'/'final' từ OpenAI,
+    'error' nếu OpenAI lỗi giữa chừng (client giữ lại draft).
+    """
+    try:
+        sync_caches()
+        query_params = parse_user_query(user_message)
+        query_result = execute_query(query_params)
+    except Exception as e:
+        print(f"[AI] Chat error: {e}")
+        yield 'draft', "Xin lỗi, có lỗi xảy ra.  Vui lòng thử lại."
+        return
+
+    draft = generate_response_fallback(query_result)
+    yield 'draft', draft
+
+    try:
+        for event, text in stream_response(user_message, query_result):
+            yield event, text
+    except Exception:
+        yield 'error', draft
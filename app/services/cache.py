@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache LRU có TTL trong bộ nhớ của process (mỗi gunicorn worker một bản).
+
+    Gắn với một data version: khi version đổi (sync_version) toàn bộ cache bị xoá.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sync_version(self, version):
+        """Xoá cache nếu data version đã thay đổi"""
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,59 @@
+import threading
+import time
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+
+class CircuitBreaker:
+    """Circuit breaker đơn giản (mỗi process một bản).
+
+    - closed: cho phép gọi; sau `failure_threshold` lỗi liên tiếp → open
+    - open: từ chối mọi lượt gọi trong `reset_timeout` giây
+    - half_open: cho phép đúng một lượt thử; thành công → closed, lỗi → open lại
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=60, on_state_change=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_state_change = on_state_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_state_change:
+            self.on_state_change(state)
+
+    def allow(self):
+        """True nếu được phép gọi dịch vụ"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
@@ -0,0 +1,174 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+from app.models.session import Session
+from app.models.transaction import Transaction
+
+SESSION_EXPORT_PROJECTION = {
+    'date': 1,
+    'start_time': 1,
+    'end_time': 1,
+    'status': 1,
+    'note': 1,
+    'total_cost': 1,
+    'court.name': 1,
+    'court.total_court_price': 1,
+    'court.paid_by.player_name': 1,
+    'shuttlecock.quantity': 1,
+    'shuttlecock.total_shuttlecock_price': 1,
+    'shuttlecock.paid_by.player_name': 1,
+    'participants.player_id': 1,
+    'participants.player_name': 1,
+    'participants.amount_due': 1,
+    'participants.amount_paid': 1,
+    'participants.amount_pre_paid': 1,
+    'participants.amount_to_receive': 1,
+    'participants.is_paid': 1,
+    'participants.paid_at': 1,
+    'participants.note': 1
+}
+
+TRANSACTION_EXPORT_PROJECTION = {
+    'sepay_id': 1,
+    'transaction_date': 1,
+    'gateway': 1,
+    'account_number': 1,
+    'reference_code': 1,
+    'content': 1,
+    'transfer_amount': 1,
+    'player_name': 1,
+    'status': 1,
+    'sessions_updated': 1,
+    'created_at': 1
+}
+
+SESSION_COLUMNS = [
+    'session_id', 'date', 'start_time', 'end_time', 'court_name', 'total_court_price',
+    'court_paid_by', 'shuttlecock_quantity', 'total_shuttlecock_price', 'shuttlecock_paid_by',
+    'total_cost', 'participants_count', 'total_paid', 'total_owed', 'status', 'note'
+]
+
+PARTICIPANT_COLUMNS = [
+    'session_id', 'date', 'player_id', 'player_name', 'amount_due', 'amount_paid',
+    'amount_pre_paid', 'amount_to_receive', 'is_paid', 'paid_at', 'note'
+]
+
+TRANSACTION_COLUMNS = [
+    'sepay_id', 'transaction_date', 'gateway', 'account_number', 'reference_code', 'content',
+    'transfer_amount', 'player_name', 'status', 'sessions_updated_count', 'created_at'
+]
+
+EXPORT_DATASETS = ('sessions', 'participants', 'transactions')
+
+# Ô bắt đầu bằng các ký tự này bị Excel / LibreOffice hiểu là công thức (CSV/formula injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_date_range(date_from=None, date_to=None):
+    """Parse 'YYYY-MM-DD' from/to (to là ngày cuối, tính cả ngày đó) thành [start, end)"""
+    start_date = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+    end_date = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None
+    return start_date, end_date
+
+
+def _format_value(value):
+    """Chuyển giá trị Mongo sang dạng hiển thị trong file export"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return value
+    value = str(value)
+    # Nội dung chuyển khoản / ghi chú do người ngoài nhập: thêm ' để không bị chạy như công thức
+    return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+
+
+def iter_session_rows(start_date=None, end_date=None):
+    """Mỗi session một dòng (header ở dòng đầu)"""
+    yield SESSION_COLUMNS
+    cursor = Session.iter_by_date_range(start_date, end_date, projection=SESSION_EXPORT_PROJECTION,
+                                        include_archive=True)
+    for s in cursor:
+        court = s.get('court', {})
+        shuttlecock = s.get('shuttlecock', {})
+        participants = s.get('participants', [])
+        total_paid = sum(p.get('amount_paid', 0) for p in participants)
+        total_owed = sum(
+            max(0, p.get('amount_due', 0) - p.get('amount_paid', 0))
+            for p in participants if p.get('amount_to_receive', 0) == 0
+        )
+        yield [_format_value(v) for v in (
+            s['_id'], s.get('date'), s.get('start_time'), s.get('end_time'),
+            court.get('name'), court.get('total_court_price', 0),
+            court.get('paid_by', {}).get('player_name'),
+            shuttlecock.get('quantity', 0), shuttlecock.get('total_shuttlecock_price', 0),
+            shuttlecock.get('paid_by', {}).get('player_name'),
+            s.get('total_cost', 0), len(participants), total_paid, total_owed,
+            s.get('status'), s.get('note')
+        )]
+
+
+def iter_participant_rows(start_date=None, end_date=None):
+    """Mỗi người chơi trong mỗi session một dòng"""
+    yield PARTICIPANT_COLUMNS
+    cursor = Session.iter_by_date_range(start_date, end_date, projection=SESSION_EXPORT_PROJECTION,
+                                        include_archive=True)
+    for s in cursor:
+        for p in s.get('participants', []):
+            yield [_format_value(v) for v in (
+                s['_id'], s.get('date'), p.get('player_id'), p.get('player_name'),
+                p.get('amount_due', 0), p.get('amount_paid', 0), p.get('amount_pre_paid', 0),
+                p.get('amount_to_receive', 0), p.get('is_paid', False), p.get('paid_at'), p.get('note')
+            )]
+
+
+def iter_transaction_rows(start_date=None, end_date=None):
+    """Mỗi giao dịch Sepay một dòng"""
+    yield TRANSACTION_COLUMNS
+    cursor = Transaction.iter_by_date_range(start_date, end_date, projection=TRANSACTION_EXPORT_PROJECTION)
+    for t in cursor:
+        yield [_format_value(v) for v in (
+            t.get('sepay_id'), t.get('transaction_date'), t.get('gateway'), t.get('account_number'),
+            t.get('reference_code'), t.get('content'), t.get('transfer_amount', 0), t.get('player_name'),
+            t.get('status'), len(t.get('sessions_updated') or []), t.get('created_at')
+        )]
+
+
+def iter_rows(dataset, start_date=None, end_date=None):
+    if dataset == 'sessions':
+        return iter_session_rows(start_date, end_date)
+    if dataset == 'participants':
+        return iter_participant_rows(start_date, end_date)
+    if dataset == 'transactions':
+        return iter_transaction_rows(start_date, end_date)
+    raise ValueError(f"Unknown export dataset: {dataset}")
+
+
+def iter_csv(rows):
+    """Chuyển từng dòng thành chuỗi CSV (có BOM để Excel đọc đúng tiếng Việt)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    yield '\ufeff'
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+
+
+def write_xlsx(rows, fileobj):
+    """Ghi các dòng ra file xlsx ở chế độ write_only (cần openpyxl)"""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("XLSX export requires openpyxl (pip install openpyxl)")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    workbook.save(fileobj)
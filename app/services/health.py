@@ -0,0 +1,120 @@
+"""
+Trạng thái cho /healthz và /readyz.
+
+Ping Mongo được cache HEALTH_PING_TTL giây trong mỗi process để health check của container /
+load balancer không tạo thêm tải lên database. Pool được theo dõi bằng một ConnectionPoolListener
+duy nhất (POOL_STATS): đếm trong memory cho /readyz và cập nhật gauge /metrics
+nếu có prometheus_client.
+"""
+
+import threading
+import time
+
+from pymongo import monitoring
+from pymongo.common import MAX_POOL_SIZE
+
+from app.services.metrics import observe_pool
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Số connection đang mở / đang check out và max pool size của process hiện tại
+    (đọc bởi cả /readyz và /metrics)"""
+
+    def __init__(self):
+        self._max_sizes = {}
+        self.max_size = 0
+        self.open = 0
+        self.checked_out = 0
+        self.checkout_failed = 0
+        self._lock = threading.Lock()
+
+    def _add(self, field, delta, reason=None):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + delta)
+        observe_pool(field, delta, reason)
+
+    def pool_created(self, event):
+        max_pool_size = event.options.get('maxPoolSize', MAX_POOL_SIZE)
+        self._max_sizes[event.address] = max_pool_size
+        self._add('max_size', max_pool_size)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        self._add('max_size', -self._max_sizes.pop(event.address, 0))
+
+    def connection_created(self, event):
+        self._add('open', 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._add('open', -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._add('checkout_failed', 1, str(event.reason))
+
+    def connection_checked_out(self, event):
+        self._add('checked_out', 1)
+
+    def connection_checked_in(self, event):
+        self._add('checked_out', -1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'max_size': self.max_size,
+                'saturation': round(self.checked_out / self.max_size, 3) if self.max_size else 0.0,
+                'checkout_failed': self.checkout_failed
+            }
+
+
+POOL_STATS = PoolStats()
+
+_ping = {'checked_at': None, 'result': None}
+_ping_lock = threading.Lock()
+
+
+def mongo_ping(ttl):
+    """Kết quả ping Mongo gần nhất, chỉ ping lại khi cũ hơn ttl giây"""
+    from app import get_db
+
+    with _ping_lock:
+        now = time.monotonic()
+        if _ping['checked_at'] is not None and now - _ping['checked_at'] < ttl:
+            return {**_ping['result'], 'age_s': round(now - _ping['checked_at'], 1)}
+
+        started = time.perf_counter()
+        try:
+            get_db().client.admin.command('ping')
+            result = {'ok': True, 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as e:
+            print(f"[Health] Mongo ping failed: {e}")
+            result = {'ok': False, 'error': str(e)}
+
+        _ping.update(checked_at=now, result=result)
+        return {**result, 'age_s': 0.0}
+
+
+def readiness(app):
+    """(ready, chi tiết) cho /readyz"""
+    mongo = mongo_ping(app.config.get('HEALTH_PING_TTL', 10))
+    startup = app.extensions.get('startup', {'completed': False})
+    ready = mongo['ok'] and startup.get('completed', False)
+
+    return ready, {
+        'status': 'ready' if ready else 'not_ready',
+        'mongo': mongo,
+        'pool': POOL_STATS.snapshot(),
+        'migrations': startup
+    }
@@ -0,0 +1,114 @@
+import json
+import time
+
+import bson
+from flask import g, request, has_request_context
+from pymongo import monitoring
+
+
+class RequestCommandListener(monitoring.CommandListener):
+    """Đếm số command, số document, bytes và thời gian Mongo trong từng request (lưu vào flask.g)"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        stats = _current_stats()
+        if stats is None:
+            return
+
+        reply = event.reply or {}
+        cursor = reply.get('cursor') or {}
+        batch = cursor.get('firstBatch') or cursor.get('nextBatch') or []
+
+        stats['commands'] += 1
+        stats['duration_ms'] += event.duration_micros / 1000
+        stats['documents'] += len(batch)
+        stats['bytes'] += len(bson.encode(reply))
+        stats['by_command'][event.command_name] = stats['by_command'].get(event.command_name, 0) + 1
+
+    def failed(self, event):
+        stats = _current_stats()
+        if stats is None:
+            return
+
+        stats['commands'] += 1
+        stats['failed'] += 1
+        stats['duration_ms'] += event.duration_micros / 1000
+        stats['by_command'][event.command_name] = stats['by_command'].get(event.command_name, 0) + 1
+
+
+def _current_stats():
+    if not has_request_context():
+        return None
+    return g.get('mongo_stats')
+
+
+def _new_stats():
+    return {
+        'commands': 0,
+        'failed': 0,
+        'documents': 0,
+        'bytes': 0,
+        'duration_ms': 0.0,
+        'by_command': {}
+    }
+
+
+def server_timing_header(stats, total_ms):
+    """Giá trị header Server-Timing: thời gian Mongo, phần còn lại của app và tổng"""
+    desc = f"{stats['commands']} cmds, {stats['documents']} docs, {stats['bytes'] / 1024:.1f}KB"
+    return ', '.join([
+        f'mongo;dur={stats["duration_ms"]:.1f};desc="{desc}"',
+        f'app;dur={max(0.0, total_ms - stats["duration_ms"]):.1f}',
+        f'total;dur={total_ms:.1f}'
+    ])
+
+
+def init_instrumentation(app):
+    """Đăng ký before/after_request hooks.
+    Trả về danh sách event listeners để truyền vào MongoClient (rỗng nếu không bật).
+    """
+    server_timing = app.config.get('PERF_SERVER_TIMING', False)
+    log_enabled = app.config.get('PERF_LOG', False)
+    log_min_ms = app.config.get('PERF_LOG_MIN_MS', 0)
+
+    if not server_timing and not log_enabled:
+        return []
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started_at = time.perf_counter()
+        g.mongo_stats = _new_stats()
+
+    @app.after_request
+    def report_request_timing(response):
+        started_at = g.get('request_started_at')
+        stats = g.get('mongo_stats')
+        if started_at is None or stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - started_at) * 1000
+
+        if server_timing:
+            response.headers['Server-Timing'] = server_timing_header(stats, total_ms)
+
+        if log_enabled and total_ms >= log_min_ms:
+            print(json.dumps({
+                'event': 'request_perf',
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'mongo_ms': round(stats['duration_ms'], 2),
+                'mongo_commands': stats['commands'],
+                'mongo_failed': stats['failed'],
+                'mongo_documents': stats['documents'],
+                'mongo_bytes': stats['bytes'],
+                'mongo_by_command': stats['by_command']
+            }, ensure_ascii=False), flush=True)
+
+        return response
+
+    return [RequestCommandListener()]
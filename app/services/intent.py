@@ -0,0 +1,160 @@
+"""
+Bộ phân loại intent cục bộ cho chat: keyword/regex compile sẵn + nhận diện tên người chơi.
+Trả về query params giống parse_user_query kèm confidence (0..1);
+ai_service chỉ gọi OpenAI khi confidence thấp hơn ngưỡng.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from app.services.name_matcher import NameMatcher, fold
+
+# Các tín hiệu intent / thời gian trên text đã bỏ dấu (thứ tự = ưu tiên khi trùng vị trí)
+TOKEN_PATTERNS = [
+    ('this_month', r'thang (?:nay|hien tai)'),
+    ('last_month', r'thang (?:truoc|roi)'),
+    ('month', r'thang\s*(?P<month_num>\d{1,2})(?:\s*[/-]\s*(?P<month_year>\d{4}))?'),
+    ('this_year', r'nam nay'),
+    ('last_year', r'nam (?:ngoai|truoc)'),
+    ('year', r'nam\s*(?P<year_num>\d{4})'),
+    ('today', r'hom nay'),
+    ('yesterday', r'hom qua'),
+    ('day', r'ngay\s*(?P<day_num>\d{1,2})(?:\s*/\s*(?P<day_month>\d{1,2}))?(?:\s*/\s*(?P<day_year>\d{4}))?'),
+    ('date', r'(?P<date_day>\d{1,2})\s*/\s*(?P<date_month>\d{1,2})(?:\s*/\s*(?P<date_year>\d{4}))?'),
+    ('debt', r'no|thieu|chua (?:thanh toan|tra|dong|chuyen)(?: tien)?|con (?:lai|bao nhieu)'
+             r'|da (?:tra|thanh toan|dong)(?: du| het)?|tra du|tra het|owes?|debts?'),
+    ('stats', r'thong ke|chi phi|tong chi|tong ket|tien san|tien cau|summary|stats?'),
+    ('sessions', r'buoi(?: choi)?|tham gia|di choi|choi|lich su|sessions?'),
+    ('who', r'ai|nhung ai|nguoi nao|nhung nguoi|danh sach'),
+    ('total', r'tong|cong'),
+]
+
+TOKEN_RE = re.compile('|'.join(
+    rf'(?P<{name}>\b(?:{pattern})\b)' for name, pattern in TOKEN_PATTERNS
+))
+
+# Từ không mang thông tin, không làm giảm confidence
+STOPWORDS = frozenset('''
+    a ah anh ba ban bao bay bi biet bn bo ca cac can cau cho chi chua co con cua cung da dang de
+    den di du duoc e em gi gio giup ha hay het hien hoi k khong ko la lam long luong ma may minh
+    moi muon na nao nay nguoi nhe nhieu nhi nhung nua o oi qua ra roi sao so tat tai thanh the thi
+    thoi tiet tien toan toi tra trong va vay ve voi vui xem xin
+'''.split())
+
+# Mỗi token không giải thích được (có thể là tên lạ / ý định lạ) trừ confidence
+UNKNOWN_TOKEN_PENALTY = 0.25
+
+
+def _unknown_tokens(folded_message, spans):
+    unknown = []
+    for match in re.finditer(r'\w+', folded_message):
+        start, end = match.span()
+        if any(s <= start and end <= e for s, e in spans):
+            continue
+        token = match.group(0)
+        if token.isdigit() or token in STOPWORDS:
+            continue
+        unknown.append(token)
+    return unknown
+
+
+def classify(message, matcher, now=None):
+    """Phân loại câu hỏi. Trả về dict query params + confidence, signals, unknown_tokens.
+
+    matcher: NameMatcher (hoặc list tên người chơi)
+    """
+    if not isinstance(matcher, NameMatcher):
+        matcher = NameMatcher.from_names(matcher)
+    now = now or datetime.now()
+    text = fold(message)
+
+    names, spans = [], []
+    for name, start, end in matcher.find(text):
+        spans.append((start, end))
+        if name not in names:
+            names.append(name)
+    signals = set()
+    year = month = day = None
+
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        signals.add(kind)
+        spans.append(match.span())
+        groups = match.groupdict()
+
+        if kind == 'this_month':
+            year, month = now.year, now.month
+        elif kind == 'last_month':
+            previous = now - relativedelta(months=1)
+            year, month = previous.year, previous.month
+        elif kind == 'month':
+            month = int(groups['month_num'])
+            year = int(groups['month_year']) if groups['month_year'] else (year or now.year)
+        elif kind == 'this_year':
+            year = now.year
+        elif kind == 'last_year':
+            year = now.year - 1
+        elif kind == 'year':
+            year = int(groups['year_num'])
+        elif kind in ('today', 'yesterday'):
+            date = now if kind == 'today' else now - timedelta(days=1)
+            year, month, day = date.year, date.month, date.day
+        elif kind in ('day', 'date'):
+            day_str, month_str, year_str = (
+                (groups['day_num'], groups['day_month'], groups['day_year']) if kind == 'day'
+                else (groups['date_day'], groups['date_month'], groups['date_year'])
+            )
+            day = int(day_str)
+            if month_str:
+                month = int(month_str)
+            if year_str:
+                year = int(year_str)
+
+    if day is not None:
+        month = month or now.month
+        year = year or now.year
+    if month is not None and not 1 <= month <= 12:
+        month = None
+
+    query_type, confidence = _decide(signals, bool(names), day is not None)
+
+    if query_type == 'monthly_stats' and month is None:
+        year, month = now.year, now.month
+
+    unknown = _unknown_tokens(text, spans)
+    confidence = max(0.0, confidence - UNKNOWN_TOKEN_PENALTY * len(unknown))
+
+    return {
+        'query_type': query_type,
+        'player_names': names,
+        'year': year,
+        'month': month,
+        'day': day,
+        'confidence': round(confidence, 2),
+        'signals': sorted(signals),
+        'unknown_tokens': unknown
+    }
+
+
+def _decide(signals, has_names, has_day):
+    """(query_type, confidence gốc) từ các tín hiệu"""
+    debt = 'debt' in signals
+    if has_names:
+        if debt or 'total' in signals:
+            return 'player_debt', 0.95
+        if 'sessions' in signals:
+            return 'player_sessions', 0.9
+        return 'player_debt', 0.5
+    if has_day:
+        return 'session_detail', 0.9 if not debt else 0.8
+    if debt:
+        return 'all_debts', 0.95 if 'who' in signals else 0.85
+    if 'stats' in signals:
+        return 'monthly_stats', 0.9
+    if 'sessions' in signals and 'who' not in signals:
+        return 'monthly_stats', 0.7
+    if 'total' in signals:
+        return 'monthly_stats', 0.6
+    return 'all_debts', 0.2
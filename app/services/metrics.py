@@ -0,0 +1,192 @@
+import os
+import time
+
+from flask import g, request
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Biến môi trường prometheus_client dùng để gộp metrics giữa các gunicorn worker
+MULTIPROC_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OPENAI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0, 15.0, 30.0)
+ALLOCATION_SESSIONS_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+ALLOCATION_AMOUNT_BUCKETS = (10000, 25000, 50000, 100000, 200000, 500000, 1000000, 2000000)
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'Thời gian xử lý request theo route',
+        ['endpoint', 'method'], buckets=REQUEST_BUCKETS
+    )
+    REQUEST_COUNT = Counter(
+        'http_requests_total', 'Số request theo route và status code',
+        ['endpoint', 'method', 'status']
+    )
+    WEBHOOK_OUTCOMES = Counter(
+        'webhook_transactions_total', 'Kết quả xử lý webhook Sepay',
+        ['status']
+    )
+    ALLOCATION_SESSIONS = Histogram(
+        'webhook_allocation_sessions', 'Số buổi chơi được gạch nợ từ một giao dịch',
+        buckets=ALLOCATION_SESSIONS_BUCKETS
+    )
+    ALLOCATION_AMOUNT = Histogram(
+        'webhook_allocation_amount_vnd', 'Số tiền đã phân bổ vào các buổi chơi từ một giao dịch',
+        buckets=ALLOCATION_AMOUNT_BUCKETS
+    )
+    OPENAI_LATENCY = Histogram(
+        'openai_request_duration_seconds', 'Thời gian gọi OpenAI',
+        ['step', 'outcome'], buckets=OPENAI_BUCKETS
+    )
+    AI_REQUESTS = Counter(
+        'ai_requests_total', 'Số lần parse/trả lời câu hỏi chat',
+        ['step']
+    )
+    AI_FALLBACKS = Counter(
+        'ai_fallback_total', 'Số lần phải dùng fallback thay cho OpenAI',
+        ['step', 'reason']
+    )
+    AI_INTENT = Counter(
+        'ai_intent_total', 'Câu hỏi được phân loại cục bộ (local) hoặc phải gọi OpenAI (escalated)',
+        ['result']
+    )
+    AI_CACHE = Counter(
+        'ai_cache_requests_total', 'Cache hit/miss của parse và trả lời chat',
+        ['cache', 'result']
+    )
+    CIRCUIT_STATE = Gauge(
+        'circuit_breaker_state', 'Trạng thái circuit breaker (0 = closed, 1 = half_open, 2 = open)',
+        ['name'], multiprocess_mode='livemax'
+    )
+    CIRCUIT_OPENED = Counter(
+        'circuit_breaker_opened_total', 'Số lần circuit breaker chuyển sang open',
+        ['name']
+    )
+    MONGO_POOL_CONNECTIONS = Gauge(
+        'mongo_pool_connections', 'Số connection Mongo đang mở / đang được dùng',
+        ['state'], multiprocess_mode='livesum'
+    )
+    MONGO_POOL_MAX_SIZE = Gauge(
+        'mongo_pool_max_size', 'maxPoolSize của mỗi worker',
+        multiprocess_mode='livesum'
+    )
+    MONGO_POOL_CHECKOUT_FAILED = Counter(
+        'mongo_pool_checkout_failed_total', 'Số lần lấy connection từ pool thất bại',
+        ['reason']
+    )
+
+
+def observe_webhook(status, sessions_updated=None):
+    """Ghi kết quả webhook (success/failed/duplicate) và kích thước phân bổ nếu có"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    WEBHOOK_OUTCOMES.labels(status=status).inc()
+    if sessions_updated is not None:
+        ALLOCATION_SESSIONS.observe(len(sessions_updated))
+        ALLOCATION_AMOUNT.observe(sum(s.get('amount_paid', 0) for s in sessions_updated))
+
+
+def observe_openai(step, started_at, outcome):
+    """Ghi thời gian một lần gọi OpenAI (step: parse/respond, outcome: success/error)"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    OPENAI_LATENCY.labels(step=step, outcome=outcome).observe(time.perf_counter() - started_at)
+
+
+def observe_ai_request(step, fallback_reason=None):
+    """Đếm một lần parse/trả lời; fallback_reason khác None nghĩa là đã dùng fallback"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    AI_REQUESTS.labels(step=step).inc()
+    if fallback_reason:
+        AI_FALLBACKS.labels(step=step, reason=fallback_reason).inc()
+
+
+def observe_intent(result):
+    """Đếm kết quả bộ phân loại intent cục bộ (local/escalated)"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    AI_INTENT.labels(result=result).inc()
+
+
+def observe_cache(cache, hit):
+    """Đếm cache hit/miss của AI chat (cache: parse/respond)"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    AI_CACHE.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+CIRCUIT_STATE_VALUES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+def observe_breaker_state(name, state):
+    """Cập nhật gauge trạng thái circuit breaker"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    CIRCUIT_STATE.labels(name=name).set(CIRCUIT_STATE_VALUES[state])
+    if state == 'open':
+        CIRCUIT_OPENED.labels(name=name).inc()
+
+
+def observe_pool(field, delta, reason=None):
+    """Cập nhật gauge pool Mongo. Gọi từ health.PoolStats — listener pool duy nhất,
+    /readyz đọc snapshot của chính listener đó.
+
+    field: 'open' / 'checked_out' / 'max_size' / 'checkout_failed'
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return
+    if field == 'max_size':
+        MONGO_POOL_MAX_SIZE.inc(delta)
+    elif field == 'checkout_failed':
+        MONGO_POOL_CHECKOUT_FAILED.labels(reason=reason).inc(delta)
+    else:
+        MONGO_POOL_CONNECTIONS.labels(state=field).inc(delta)
+
+
+def render_metrics():
+    """Trả về (body, content_type) cho /metrics, gộp các worker nếu bật multiprocess"""
+    if os.environ.get(MULTIPROC_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_metrics(app):
+    """Đăng ký hooks đo latency theo route.
+    Pool Mongo được đếm bởi health.POOL_STATS (luôn đăng ký), không cần listener riêng ở đây.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    if not PROMETHEUS_AVAILABLE:
+        print("[Metrics] prometheus_client not installed, /metrics disabled")
+        return
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_started_at = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started_at = g.get('metrics_started_at')
+        if started_at is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_LATENCY.labels(endpoint=endpoint, method=request.method).observe(
+            time.perf_counter() - started_at
+        )
+        REQUEST_COUNT.labels(
+            endpoint=endpoint, method=request.method, status=str(response.status_code)
+        ).inc()
+        return response
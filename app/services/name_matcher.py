@@ -0,0 +1,114 @@
+"""
+Tìm tên người chơi (và tên gọi khác) trong một đoạn text bằng automaton Aho-Corasick
+trên tên đã bỏ dấu, có kiểm tra ranh giới từ ("An" không khớp trong "Thanh").
+Automaton được cache và chỉ build lại khi players data version thay đổi.
+"""
+
+import threading
+import unicodedata
+from collections import deque
+
+
+def fold(text):
+    """Chữ thường, bỏ dấu tiếng Việt (đ → d), gộp khoảng trắng"""
+    text = unicodedata.normalize('NFD', text.lower())
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    return ' '.join(text.replace('đ', 'd').split())
+
+
+def _is_boundary(text, index):
+    return index < 0 or index >= len(text) or not text[index].isalnum()
+
+
+class NameMatcher:
+    """Aho-Corasick automaton: key (tên/alias đã fold) → tên chuẩn của người chơi"""
+
+    def __init__(self, entries):
+        """entries: iterable (tên chuẩn, [tên gọi khác])"""
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for name, aliases in entries:
+            for key in {fold(k) for k in [name, *(aliases or [])] if k and fold(k)}:
+                self._add(key, name)
+        self._build_fail_links()
+
+    @classmethod
+    def from_names(cls, names):
+        return cls((name, []) for name in names)
+
+    def _add(self, key, name):
+        node = 0
+        for char in key:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = next_node
+        self._output[node].append((len(key), name))
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, folded_text):
+        """Các match (tên chuẩn, start, end) trên text đã fold, ưu tiên match dài nhất, không chồng lấn"""
+        candidates = []
+        node = 0
+        for i, char in enumerate(folded_text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, name in self._output[node]:
+                start = i - length + 1
+                if _is_boundary(folded_text, start - 1) and _is_boundary(folded_text, i + 1):
+                    candidates.append((start, i + 1, name))
+
+        # Leftmost-longest, bỏ các match chồng lấn
+        candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        matches, last_end = [], -1
+        for start, end, name in candidates:
+            if start >= last_end:
+                matches.append((name, start, end))
+                last_end = end
+        return matches
+
+    def find_names(self, text):
+        """Tên chuẩn (không trùng, theo thứ tự xuất hiện) có trong text chưa fold"""
+        names = []
+        for name, _, _ in self.find(fold(text)):
+            if name not in names:
+                names.append(name)
+        return names
+
+
+_cache = {'version': None, 'matcher': None}
+_cache_lock = threading.Lock()
+
+
+def get_name_matcher():
+    """Matcher cho các người chơi đang active, build lại khi players data version đổi"""
+    from app.models.player import Player
+    from app.models.settings import Settings, PLAYERS_VERSION_KEY
+
+    version = Settings.get(PLAYERS_VERSION_KEY, 0)
+    with _cache_lock:
+        if _cache['matcher'] is None or _cache['version'] != version:
+            players = Player.find_all(projection={'name': 1, 'aliases': 1})
+            _cache['matcher'] = NameMatcher(
+                (p['name'], p.get('aliases') or []) for p in players if p.get('name')
+            )
+            _cache['version'] = version
+        return _cache['matcher']
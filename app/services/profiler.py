@@ -0,0 +1,129 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import g, request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _frame_label(frame):
+    """Tên frame dạng 'app/models/session.py:get_all_debts'"""
+    filename = frame.f_code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    else:
+        filename = '/'.join(filename.split(os.sep)[-2:])
+    return f"{filename}:{frame.f_code.co_name}"
+
+
+def collapse_stack(frame):
+    """Chuyển stack (từ frame lá) thành chuỗi collapsed 'root;...;leaf'"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Một thread nền lấy mẫu stack của các request đang được profile mỗi `interval` giây.
+    Mỗi process (gunicorn worker) có một sampler riêng, khởi động lazy sau khi fork.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_running(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._targets = {}
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def start(self, thread_id):
+        with self._lock:
+            self._ensure_running()
+            self._targets[thread_id] = Counter()
+
+    def stop(self, thread_id):
+        """Ngừng lấy mẫu thread, trả về Counter {collapsed_stack: số mẫu}"""
+        with self._lock:
+            return self._targets.pop(thread_id, None) or Counter()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._targets:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse_stack(frame)] += 1
+
+
+def write_collapsed(directory, endpoint, duration_ms, samples):
+    """Ghi file collapsed-stack (đọc được bằng flamegraph.pl / speedscope), tên file gắn route"""
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{endpoint}.{datetime.now():%Y%m%d-%H%M%S}.{int(duration_ms)}ms.{os.getpid()}.folded"
+    path = os.path.join(directory, filename)
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def init_profiler(app):
+    """Đăng ký hooks profile request (tắt mặc định).
+    - PROFILE_SAMPLE_RATE: tỉ lệ request được ghi lại (0..1)
+    - PROFILE_SLOW_MS: ghi lại mọi request chậm hơn ngưỡng này (0 = tắt)
+    Khi bật PROFILE_SLOW_MS mọi request đều được lấy mẫu, chỉ request chậm mới được ghi file.
+    """
+    sample_rate = app.config.get('PROFILE_SAMPLE_RATE', 0.0)
+    slow_ms = app.config.get('PROFILE_SLOW_MS', 0)
+    directory = app.config.get('PROFILE_DIR', '/tmp/badminton-profiles')
+
+    if sample_rate <= 0 and slow_ms <= 0:
+        return
+
+    sampler = StackSampler(app.config.get('PROFILE_INTERVAL_MS', 5) / 1000)
+    print(f"[Profiler] enabled: sample_rate={sample_rate}, slow_ms={slow_ms}, dir={directory}")
+
+    @app.before_request
+    def start_profiling():
+        sampled = random.random() < sample_rate
+        if not sampled and slow_ms <= 0:
+            return
+        g.profile_sampled = sampled
+        g.profile_started_at = time.perf_counter()
+        sampler.start(threading.get_ident())
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        started_at = g.pop('profile_started_at', None)
+        if started_at is None:
+            return
+
+        samples = sampler.stop(threading.get_ident())
+        duration_ms = (time.perf_counter() - started_at) * 1000
+        if not g.pop('profile_sampled', False) and duration_ms < slow_ms:
+            return
+        if not samples:
+            return
+
+        try:
+            path = write_collapsed(directory, request.endpoint or 'unmatched', duration_ms, samples)
+            print(f"[Profiler] {request.method} {request.path} {duration_ms:.0f}ms -> {path}")
+        except OSError as e:
+            print(f"[Profiler] ❌ Cannot write profile: {e}")
@@ -0,0 +1,41 @@
+"""
+Định tuyến đọc Mongo theo loại request (tắt mặc định, MONGO_SECONDARY_READS=1 để bật).
+
+- Trang công khai (user), GET /api/*, chat: đọc từ secondary (secondaryPreferred, giới hạn
+  maxStalenessSeconds) → giảm tải đọc cho primary khi chạy replica set.
+- Admin, webhook và mọi request của người đã đăng nhập admin: đọc từ primary, nên admin luôn
+  thấy ngay dữ liệu mình vừa sửa (read-your-writes).
+
+Chỉ ảnh hưởng lệnh đọc: lệnh ghi luôn đi tới primary. Các hàm tính lại dữ liệu dẫn xuất
+(MonthlyRollup.recompute / freeze, ClosedMonth.verify / close) luôn đọc qua get_primary_db().
+"""
+
+from flask import g, request, session as flask_session
+from pymongo.read_preferences import SecondaryPreferred
+
+SECONDARY_BLUEPRINTS = {'user', 'chat'}
+SECONDARY_GET_BLUEPRINTS = {'api'}
+
+
+def secondary_read_preference(max_staleness_seconds):
+    return SecondaryPreferred(max_staleness=max_staleness_seconds)
+
+
+def reads_from_secondary():
+    """True nếu request hiện tại được phép đọc từ secondary"""
+    if flask_session.get('admin_logged_in'):
+        return False
+    if request.blueprint in SECONDARY_BLUEPRINTS:
+        return True
+    return request.blueprint in SECONDARY_GET_BLUEPRINTS and request.method == 'GET'
+
+
+def init_read_routing(app):
+    if not app.config.get('MONGO_SECONDARY_READS', False):
+        return
+
+    @app.before_request
+    def _route_reads():
+        g.mongo_secondary_reads = reads_from_secondary()
+
+    print(f"[Mongo] Secondary reads enabled (maxStalenessSeconds={app.config['MONGO_MAX_STALENESS_SECONDS']})")
@@ -0,0 +1,189 @@
+"""
+Tạo mã VietQR (chuẩn EMVCo / NAPAS 247) ngay trên server thay vì nhúng ảnh từ img.vietqr.io.
+
+Ảnh được render bằng segno (tùy chọn) và lưu vào cache trên đĩa theo hash của payload:
+cùng số tiền + nội dung → cùng file, có thể trả về với Cache-Control rất dài.
+Chỉ render số tiền + nội dung do server ký (sign), cache giới hạn số file (prune_cache).
+"""
+
+import hashlib
+import hmac
+import io
+import os
+import re
+import tempfile
+import unicodedata
+
+try:
+    import segno
+    SEGNO_AVAILABLE = True
+except ImportError:
+    segno = None
+    SEGNO_AVAILABLE = False
+
+FORMATS = ('png', 'svg')
+HASH_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Mã BIN (NAPAS) của các ngân hàng hay dùng, theo mã ngân hàng của VietQR
+BANK_BINS = {
+    'VCB': '970436',
+    'TCB': '970407',
+    'MB': '970422',
+    'ACB': '970416',
+    'VPB': '970432',
+    'TPB': '970423',
+    'BIDV': '970418',
+    'ICB': '970415',
+    'VBA': '970405',
+    'STB': '970403',
+    'VIB': '970441',
+    'SHB': '970443',
+    'HDB': '970437',
+    'OCB': '970448',
+    'MSB': '970426',
+    'EIB': '970431',
+}
+
+VIETQR_GUID = 'A000000727'
+SERVICE_ACCOUNT_TRANSFER = 'QRIBFTTA'
+CURRENCY_VND = '704'
+
+
+def _tlv(tag, value):
+    return f'{tag}{len(value):02d}{value}'
+
+
+def crc16_ccitt(data: str) -> str:
+    """CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), 4 ký tự hex in hoa"""
+    crc = 0xFFFF
+    for byte in data.encode('utf-8'):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return f'{crc:04X}'
+
+
+def ascii_description(text: str, max_length=70) -> str:
+    """Nội dung chuyển khoản: bỏ dấu, chỉ giữ ký tự ASCII in được (app ngân hàng hay từ chối ký tự lạ)"""
+    text = unicodedata.normalize('NFD', str(text).replace('đ', 'd').replace('Đ', 'D'))
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    text = re.sub(r'[^\x20-\x7e]', ' ', text)
+    return ' '.join(text.split())[:max_length]
+
+
+def build_payload(bank_bin: str, account_number: str, amount=None, description='') -> str:
+    """Chuỗi EMVCo của mã VietQR chuyển khoản tới tài khoản"""
+    merchant_account = (
+        _tlv('00', VIETQR_GUID)
+        + _tlv('01', _tlv('00', bank_bin) + _tlv('01', account_number))
+        + _tlv('02', SERVICE_ACCOUNT_TRANSFER)
+    )
+
+    amount = int(amount or 0)
+    payload = (
+        _tlv('00', '01')
+        + _tlv('01', '12' if amount > 0 else '11')  # 12: QR động (có số tiền), 11: QR tĩnh
+        + _tlv('38', merchant_account)
+        + _tlv('53', CURRENCY_VND)
+    )
+    if amount > 0:
+        payload += _tlv('54', str(amount))
+    payload += _tlv('58', 'VN')
+
+    description = ascii_description(description)
+    if description:
+        payload += _tlv('62', _tlv('08', description))
+
+    payload += '6304'
+    return payload + crc16_ccitt(payload)
+
+
+def payload_from_config(config, amount=None, description='') -> str:
+    bank_bin = config.get('VIETQR_BANK_BIN') or BANK_BINS.get(config.get('VIETQR_BANK_ID', 'TPB').upper())
+    if not bank_bin:
+        raise ValueError(f"Unknown VietQR bank: {config.get('VIETQR_BANK_ID')} (set VIETQR_BANK_BIN)")
+    return build_payload(bank_bin, config.get('VIETQR_ACCOUNT_NUMBER', ''), amount, description)
+
+
+def sign(secret: str, amount, description='') -> str:
+    """Chữ ký HMAC của (số tiền, nội dung) để route render chỉ nhận tham số do server tạo"""
+    message = f'{int(amount or 0)}|{ascii_description(description)}'
+    return hmac.new(str(secret).encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()[:32]
+
+
+def verify_signature(secret: str, amount, description, signature) -> bool:
+    return hmac.compare_digest(sign(secret, amount, description), str(signature or ''))
+
+
+def payload_hash(payload: str) -> str:
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def cache_path(cache_dir, digest, fmt):
+    return os.path.join(cache_dir, f'{digest}.{fmt}')
+
+
+def render(payload: str, fmt='png', scale=8) -> bytes:
+    """Render QR (error level M, có quiet zone) thành bytes PNG/SVG"""
+    if not SEGNO_AVAILABLE:
+        raise RuntimeError('segno chưa được cài đặt (pip install segno)')
+    qr = segno.make(payload, error='m', micro=False)
+    buffer = io.BytesIO()
+    qr.save(buffer, kind=fmt, scale=scale, border=4)
+    return buffer.getvalue()
+
+
+def prune_cache(cache_dir, max_files):
+    """Xoá các ảnh cũ nhất (theo mtime) khi cache vượt quá max_files. Trả về số file đã xoá"""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.rsplit('.', 1)[-1] in FORMATS:
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    excess = len(entries) - max_files
+    if excess <= 0:
+        return 0
+    removed = 0
+    for _, path in sorted(entries)[:excess]:
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass  # worker khác đã xoá
+    return removed
+
+
+def ensure_rendered(payload: str, cache_dir, fmt='png', scale=8, max_files=None) -> str:
+    """Render vào cache nếu chưa có, trả về hash của payload.
+    max_files: giới hạn số ảnh trong cache (dọn ảnh cũ nhất sau mỗi lần render mới)
+    """
+    digest = payload_hash(payload)
+    path = cache_path(cache_dir, digest, fmt)
+    if os.path.exists(path):
+        return digest
+
+    os.makedirs(cache_dir, exist_ok=True)
+    data = render(payload, fmt, scale)
+    # Ghi file tạm rồi rename để worker khác không đọc phải file ghi dở
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    if max_files:
+        prune_cache(cache_dir, max_files)
+    return digest
+
+
+def external_url(config, amount, description=''):
+    """URL ảnh của img.vietqr.io (dùng khi không có segno)"""
+    from urllib.parse import quote
+
+    return (
+        f"https://img.vietqr.io/image/{config.get('VIETQR_BANK_ID', 'TPB')}-"
+        f"{config.get('VIETQR_ACCOUNT_NUMBER', '')}-{config.get('VIETQR_TEMPLATE', 'compact2')}.png"
+        f"?amount={int(amount or 0)}&addInfo={quote(str(description))}"
+        f"&accountName={quote(config.get('VIETQR_ACCOUNT_NAME', ''))}"
+    )
@@ -0,0 +1,192 @@
+"""
+Sinh lịch sử dữ liệu giống thực tế để benchmark:
+N người chơi, M buổi chơi trải đều trong Y năm, có người trả trước sân/cầu
+và các kiểu thanh toán khác nhau (trả ngay, trả chậm, trả một phần, không trả).
+"""
+
+import random
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+FIRST_NAMES = [
+    'Tuấn', 'Mạnh', 'Ly', 'An', 'Bình', 'Châu', 'Dũng', 'Giang', 'Hà', 'Hải',
+    'Hòa', 'Hùng', 'Khánh', 'Lan', 'Linh', 'Long', 'Minh', 'Nam', 'Nga', 'Phong',
+    'Phúc', 'Quân', 'Quang', 'Sơn', 'Thảo', 'Thắng', 'Trang', 'Trung', 'Việt', 'Yến'
+]
+
+# Kiểu thanh toán: (tên, trọng số)
+PAYMENT_PATTERNS = [
+    ('prompt', 0.5),    # trả ngay sau buổi chơi
+    ('late', 0.25),     # trả các buổi cũ, còn nợ các buổi gần đây
+    ('partial', 0.15),  # hay trả thiếu
+    ('never', 0.10),    # không trả
+]
+
+COURT_PRICE_PER_HOUR = 139000
+SHUTTLECOCK_PRICE = 25000
+
+
+def _player_name(index):
+    name = FIRST_NAMES[index % len(FIRST_NAMES)]
+    if index >= len(FIRST_NAMES):
+        name = f"{name} {index // len(FIRST_NAMES) + 1}"
+    return name
+
+
+def generate_players(count, rng):
+    players = []
+    for i in range(count):
+        pattern = rng.choices(
+            [p for p, _ in PAYMENT_PATTERNS],
+            weights=[w for _, w in PAYMENT_PATTERNS]
+        )[0]
+        players.append({
+            '_id': ObjectId(),
+            'name': _player_name(i),
+            'phone': '',
+            'email': '',
+            'is_active': True,
+            'is_default_court_payer': i == 0,
+            'is_default_shuttlecock_payer': i == 1,
+            'is_admin': i == 0,
+            'short_code': f"P{i + 1:03d}",
+            # Trọng số đi chơi: vài người chơi thường xuyên, còn lại thỉnh thoảng
+            'attendance': rng.choice([0.9, 0.7, 0.5, 0.3, 0.15]),
+            'payment_pattern': pattern,
+            'created_at': datetime.now(),
+            'updated_at': datetime.now()
+        })
+    return players
+
+
+def _paid_amount(pattern, amount_due, age_days, rng):
+    """Số tiền người chơi đã trả tuỳ theo kiểu thanh toán và tuổi của buổi chơi"""
+    if pattern == 'prompt':
+        return amount_due if age_days > 2 or rng.random() < 0.5 else 0
+    if pattern == 'late':
+        return amount_due if age_days > 45 else 0
+    if pattern == 'partial':
+        if age_days > 30:
+            return amount_due if rng.random() < 0.7 else amount_due // 2
+        return 0
+    return 0
+
+
+def build_session(date, attendees, court_payer, shuttlecock_payer, now, rng):
+    """Tạo session document giống admin.session_new"""
+    total_hours = rng.choice([2, 2, 2, 3])
+    total_court_price = COURT_PRICE_PER_HOUR * total_hours
+    shuttlecock_qty = rng.randint(3, 8)
+    total_shuttlecock_price = shuttlecock_qty * SHUTTLECOCK_PRICE
+    total_cost = total_court_price + total_shuttlecock_price
+    amount_per_person = round(total_cost / len(attendees))
+    age_days = (now - date).days
+
+    participants = []
+    for player in attendees:
+        pre_paid = 0
+        note = ''
+        if player['_id'] == court_payer['_id']:
+            pre_paid += total_court_price
+            note = 'Trả tiền sân'
+        if player['_id'] == shuttlecock_payer['_id']:
+            pre_paid += total_shuttlecock_price
+            note = note or 'Trả tiền cầu'
+
+        if pre_paid:
+            amount_paid = min(pre_paid, amount_per_person)
+        else:
+            amount_paid = _paid_amount(player['payment_pattern'], amount_per_person, age_days, rng)
+
+        is_paid = amount_paid >= amount_per_person
+        participants.append({
+            'player_id': player['_id'],
+            'player_name': player['name'],
+            'amount_due': amount_per_person,
+            'amount_paid': amount_paid,
+            'amount_pre_paid': pre_paid,
+            'amount_to_receive': max(0, pre_paid - amount_per_person),
+            'is_paid': is_paid,
+            'paid_at': date + timedelta(days=rng.randint(0, 10)) if is_paid else None,
+            'note': note
+        })
+
+    return {
+        '_id': ObjectId(),
+        'date': date,
+        'start_time': '14:40',
+        'end_time': '16:45',
+        'court': {
+            'name': 'Waystation NQA',
+            'location': '',
+            'price_per_hour': COURT_PRICE_PER_HOUR,
+            'total_hours': total_hours,
+            'total_court_price': total_court_price,
+            'paid_by': {'player_id': court_payer['_id'], 'player_name': court_payer['name']}
+        },
+        'shuttlecock': {
+            'quantity': shuttlecock_qty,
+            'price_per_shuttlecock': SHUTTLECOCK_PRICE,
+            'total_shuttlecock_price': total_shuttlecock_price,
+            'paid_by': {'player_id': shuttlecock_payer['_id'], 'player_name': shuttlecock_payer['name']}
+        },
+        'total_cost': total_cost,
+        'participants': participants,
+        'status': 'completed',
+        'note': '',
+        'created_by': None,
+        'created_at': date,
+        'updated_at': date
+    }
+
+
+def generate_sessions(players, count, years, rng, now=None):
+    now = now or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = now - timedelta(days=365 * years)
+    step = (now - start) / max(count, 1)
+    court_payer, shuttlecock_payer = players[0], players[1]
+
+    sessions = []
+    for i in range(count):
+        date = (start + step * i).replace(hour=0, minute=0, second=0, microsecond=0)
+        attendees = [p for p in players if rng.random() < p['attendance']]
+        for payer in (court_payer, shuttlecock_payer):
+            if payer not in attendees and rng.random() < 0.9:
+                attendees.append(payer)
+        if len(attendees) < 2:
+            attendees = rng.sample(players, 2)
+        sessions.append(build_session(date, attendees, court_payer, shuttlecock_payer, now, rng))
+    return sessions
+
+
+def generate_history(db, players=20, sessions=300, years=3, seed=42):
+    """Xoá và sinh lại players/sessions trong db, dựng lại các collection dẫn xuất
+    (monthly_rollups, participations, payments) từ sessions mới. Trả về (players, sessions).
+
+    Cần app context (các hàm dựng lại dùng get_db()).
+    """
+    from app.models.participation import Participation
+    from app.models.payment import Payment
+    from app.models.rollup import MonthlyRollup
+
+    rng = random.Random(seed)
+
+    player_docs = generate_players(players, rng)
+    session_docs = generate_sessions(player_docs, sessions, years, rng)
+
+    for name in ('players', 'sessions', 'sessions_archive', 'transactions', 'monthly_rollups',
+                 'participations', 'payments', 'closed_months'):
+        db[name].delete_many({})
+
+    db.players.insert_many([
+        {k: v for k, v in p.items() if k not in ('attendance', 'payment_pattern')}
+        for p in player_docs
+    ])
+    if session_docs:
+        db.sessions.insert_many(session_docs)
+
+    MonthlyRollup.rebuild_all()
+    Participation.rebuild_all()
+    Payment.backfill(session_docs)
+
+    return player_docs, session_docs
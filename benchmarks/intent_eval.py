@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Đánh giá bộ phân loại intent cục bộ (app/services/intent.py) trên tập câu hỏi tiếng Việt có nhãn.
+
+Run: python -m benchmarks.intent_eval [--threshold 0.75] [-v] [-o intent_eval.json]
+
+Câu có expected = null là câu bộ cục bộ không hỗ trợ, đúng khi được chuyển lên OpenAI.
+Báo cáo: độ chính xác của các câu trả lời cục bộ và tỉ lệ lượt gọi OpenAI (parse) tránh được.
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent import classify
+from app.services.name_matcher import NameMatcher
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'intent_queries.json')
+FIELDS = ('query_type', 'player_names', 'year', 'month', 'day')
+
+
+def is_correct(result, expected):
+    return all(
+        sorted(result[f]) == sorted(expected[f]) if f == 'player_names' else result[f] == expected[f]
+        for f in FIELDS
+    )
+
+
+def evaluate(dataset, threshold):
+    now = datetime.strptime(dataset['now'], '%Y-%m-%d')
+    matcher = NameMatcher.from_names(dataset['players'])
+
+    rows = []
+    for item in dataset['queries']:
+        result = classify(item['message'], matcher, now=now)
+        expected = item['expected']
+        local = result['confidence'] >= threshold
+        rows.append({
+            'message': item['message'],
+            'local': local,
+            'supported': expected is not None,
+            'correct': expected is not None and is_correct(result, expected),
+            'confidence': result['confidence'],
+            'result': {f: result[f] for f in FIELDS},
+            'expected': expected
+        })
+
+    total = len(rows)
+    local_rows = [r for r in rows if r['local']]
+    supported = [r for r in rows if r['supported']]
+    unsupported = [r for r in rows if not r['supported']]
+
+    return {
+        'threshold': threshold,
+        'total': total,
+        'answered_locally': len(local_rows),
+        'llm_calls_avoided': round(len(local_rows) / total, 3) if total else 0,
+        'local_accuracy': round(sum(r['correct'] for r in local_rows) / len(local_rows), 3) if local_rows else None,
+        'supported_coverage': round(sum(r['local'] for r in supported) / len(supported), 3) if supported else None,
+        'unsupported_escalated': round(sum(not r['local'] for r in unsupported) / len(unsupported), 3) if unsupported else None,
+        'accuracy_without_llm': round(sum(r['correct'] for r in supported) / len(supported), 3) if supported else None,
+    }, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đánh giá bộ phân loại intent cục bộ')
+    parser.add_argument('--dataset', default=DEFAULT_DATASET)
+    parser.add_argument('--threshold', type=float, default=0.75)
+    parser.add_argument('-v', '--verbose', action='store_true', help='In các câu phân loại sai / bị chuyển lên LLM')
+    parser.add_argument('-o', '--output', help='Ghi báo cáo JSON')
+    args = parser.parse_args()
+
+    with open(args.dataset, encoding='utf-8') as f:
+        dataset = json.load(f)
+
+    summary, rows = evaluate(dataset, args.threshold)
+
+    if args.verbose:
+        for r in rows:
+            if r['local'] and not r['correct']:
+                print(f"❌ WRONG     {r['confidence']:.2f}  {r['message']}\n     got {r['result']}\n     want {r['expected']}")
+            elif not r['local'] and r['supported']:
+                print(f"↗️  ESCALATED {r['confidence']:.2f}  {r['message']}")
+        print()
+
+    for key, value in summary.items():
+        print(f"{key:<24} {value}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'rows': rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
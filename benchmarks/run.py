@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Benchmark các hàm Session, các trang dashboard và webhook trên dữ liệu giả lập.
+
+Run (mongod local):  python -m benchmarks.run --uri mongodb://localhost:27017 -o bench.json
+Run (mongomock):     python -m benchmarks.run --backend mongomock -o bench.json  (cần pip install -r requirements-dev.txt)
+
+Kết quả ghi ra JSON để so sánh giữa các lần release.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generator import generate_history
+
+
+def timed(fn, repeat, warmup=1):
+    """Chạy fn (warmup + repeat lần), trả về thống kê thời gian (ms)"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'max_ms': round(samples[-1], 3)
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def create_bench_app(args):
+    os.environ['MONGODB_URI'] = args.uri
+    os.environ['MONGODB_DB'] = args.db
+    # Chat dùng fallback parser để chỉ đo phần query Mongo
+    os.environ['OPENAI_API_KEY'] = ''
+    os.environ['SEPAY_API_KEY'] = ''
+
+    if args.backend == 'mongomock':
+        import mongomock
+        patcher = mock.patch('app.MongoClient', mongomock.MongoClient)
+        patcher.start()
+
+    from app import create_app
+    return create_app()
+
+
+def session_benchmarks(players, now):
+    from app.models.session import Session
+    from dateutil.relativedelta import relativedelta
+
+    month_start = datetime(now.year, now.month, 1)
+    month_end = month_start + relativedelta(months=1)
+    name = players[2]['name']
+
+    return {
+        'Session.find_all': lambda: Session.find_all(limit=50),
+        'Session.find_by_date_range': lambda: Session.find_by_date_range(month_start, month_end),
+        'Session.find_by_player': lambda: Session.find_by_player(name, month_start, month_end),
+        'Session.get_player_debt': lambda: Session.get_player_debt(name),
+        'Session.get_player_net_balances': lambda: Session.get_player_net_balances(),
+        'Session.get_all_debts_all_time': lambda: Session.get_all_debts_all_time(),
+        'Session.get_all_to_receive_all_time': lambda: Session.get_all_to_receive_all_time(),
+        'Session.get_all_debts_with_details': lambda: Session.get_all_debts_with_details(),
+        'Session.get_all_to_receive_with_details': lambda: Session.get_all_to_receive_with_details(),
+        'Session.get_debts_with_details_by_month': lambda: Session.get_debts_with_details_by_month(now.year, now.month),
+        'Session.get_months_with_debts': lambda: Session.get_months_with_debts(),
+        'Session.get_monthly_summary': lambda: Session.get_monthly_summary(now.year, now.month),
+        'Session.get_available_months': lambda: Session.get_available_months(),
+    }
+
+
+def route_benchmarks(client):
+    def get(url):
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, f"{url} -> {response.status_code}"
+        return run
+
+    def ask(message):
+        def run():
+            response = client.post('/chat/ask', json={'message': message})
+            assert response.status_code == 200
+        return run
+
+    return {
+        'GET /': get('/'),
+        'GET /sessions': get('/sessions'),
+        'GET /debts': get('/debts'),
+        'GET /debts?type=receive': get('/debts?type=receive'),
+        'GET /admin/': get('/admin/'),
+        'GET /admin/sessions': get('/admin/sessions'),
+        'GET /admin/quick-payment': get('/admin/quick-payment'),
+        'GET /api/stats/monthly': get('/api/stats/monthly'),
+        'GET /api/stats/debts': get('/api/stats/debts'),
+        'POST /chat/ask': ask('Ai còn nợ?'),
+    }
+
+
+def webhook_benchmark(client, players):
+    """Mỗi lần gọi là một giao dịch mới của người chơi kế tiếp (dữ liệu bị thay đổi)"""
+    state = {'sepay_id': 10_000_000, 'index': 0}
+
+    def run():
+        player = players[state['index'] % len(players)]
+        state['index'] += 1
+        state['sepay_id'] += 1
+        response = client.post('/webhook/sepay', json={
+            'id': state['sepay_id'],
+            'gateway': 'TPBank',
+            'transactionDate': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'accountNumber': '03365790401',
+            'content': f"{player['name']} thanh toan cau long {player['short_code']}",
+            'transferType': 'in',
+            'transferAmount': 100000,
+            'referenceCode': f"FT{state['sepay_id']}"
+        })
+        assert response.status_code == 200
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Badminton Tracker')
+    parser.add_argument('--backend', choices=('mongod', 'mongomock'), default='mongod')
+    parser.add_argument('--uri', default='mongodb://localhost:27017')
+    parser.add_argument('--db', default='badminton_tracker_bench')
+    parser.add_argument('--players', type=int, default=20)
+    parser.add_argument('--sessions', type=int, default=300)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--only', help='Chỉ chạy benchmark có tên chứa chuỗi này')
+    parser.add_argument('-o', '--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    app = create_bench_app(args)
+
+    with app.app_context():
+        from app import get_db
+
+        print(f"Generating {args.players} players / {args.sessions} sessions over {args.years} years...")
+        players, _ = generate_history(get_db(), args.players, args.sessions, args.years, args.seed)
+
+        client = app.test_client()
+        with client.session_transaction() as flask_session:
+            flask_session['admin_logged_in'] = True
+
+        benchmarks = {}
+        benchmarks.update(session_benchmarks(players, datetime.now()))
+        benchmarks.update(route_benchmarks(client))
+        # Webhook chạy cuối vì làm thay đổi dữ liệu
+        benchmarks['POST /webhook/sepay'] = webhook_benchmark(client, players)
+
+        results = {}
+        for name, fn in benchmarks.items():
+            if args.only and args.only not in name:
+                continue
+            results[name] = timed(fn, args.repeat)
+            print(f"{name:<45} median {results[name]['median_ms']:>9.2f} ms   p95 {results[name]['p95_ms']:>9.2f} ms")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'backend': args.backend,
+            'players': args.players,
+            'sessions': args.sessions,
+            'years': args.years,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'python': platform.python_version()
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
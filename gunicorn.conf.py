@@ -1,3 +1,4 @@
+import glob
 import os
 import multiprocessing
 
@@ -7,6 +8,9 @@ backlog = 2048
 
 # Worker processes
 workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Load app (imports, templates, startup work) một lần ở master rồi fork, worker dùng chung
+# bộ nhớ copy-on-write. An toàn vì Mongo client được tạo lại trong mỗi worker (get_db).
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
 worker_class = 'sync'
 worker_connections = 1000
 timeout = 120
@@ -31,4 +35,31 @@ tmp_upload_dir = None
 
 # SSL (if needed)
 # keyfile = None
-# certfile = None
\ No newline at end of file
+# certfile = None
+
+# Prometheus multiprocess: mỗi worker ghi metrics vào thư mục chung, /metrics gộp lại.
+# Phải set trước khi worker import prometheus_client.
+prometheus_multiproc_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', '/tmp/badminton-tracker-metrics'
+)
+
+
+def on_starting(server):
+    # Xoá metrics của lần chạy trước
+    os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(prometheus_multiproc_dir, '*.db')):
+        os.remove(path)
+
+    # Với preload_app, master đã connect Mongo khi chạy create_app: đóng lại trước khi fork
+    # để worker không thừa hưởng socket / monitor của client đó
+    if server.cfg.preload_app:
+        from app import close_db
+        close_db()
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
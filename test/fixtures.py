@@ -0,0 +1,77 @@
+"""Fixtures dùng chung cho các test: session / participant mẫu và database mongomock"""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+
+def make_session(participants, status='completed', date=None, _id='s1'):
+    """Session tối thiểu: tổng 400k (sân 300k + cầu 100k)"""
+    return {
+        '_id': _id,
+        'date': date or datetime(2025, 11, 10),
+        'status': status,
+        'total_cost': 400000,
+        'court': {'name': 'Sân A', 'total_court_price': 300000},
+        'shuttlecock': {'total_shuttlecock_price': 100000},
+        'participants': participants
+    }
+
+
+def make_participant(player_id, name, due=0, paid=0, to_receive=0, returned=None):
+    """Participant; player_id None = dữ liệu cũ chỉ có tên"""
+    participant = {
+        'player_id': player_id,
+        'player_name': name,
+        'amount_due': due,
+        'amount_paid': paid,
+        'amount_to_receive': to_receive,
+        'is_paid': paid >= due
+    }
+    if returned is not None:
+        participant['amount_returned'] = returned
+    return participant
+
+
+@unittest.skipIf(mongomock is None, 'mongomock chưa được cài (pip install -r requirements-dev.txt)')
+class MongoTestCase(unittest.TestCase):
+    """Test chạy trên database mongomock riêng cho mỗi test: get_db() trả về self.db"""
+
+    def setUp(self):
+        self.db = mongomock.MongoClient().db
+        patcher = mock.patch.multiple('app', db=self.db, _mongo_settings={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@unittest.skipIf(mongomock is None, 'mongomock chưa được cài (pip install -r requirements-dev.txt)')
+class MongoAppTestCase(unittest.TestCase):
+    """Flask app đầy đủ (create_app, blueprints, startup) trên database mongomock riêng cho mỗi test"""
+
+    def setUp(self):
+        client = mongomock.MongoClient()
+        patcher = mock.patch.multiple(
+            'app', MongoClient=lambda *args, **kwargs: client, _mongo_settings={},
+            mongo_client=None, db=None, secondary_db=None, _mongo_pid=None
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        from app import create_app, get_db
+        with mock.patch('builtins.print'):
+            self.app = create_app()
+        self.app.config['TESTING'] = True
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        self.db = get_db()
+        self.client = self.app.test_client()
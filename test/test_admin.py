@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Test các route admin trên database"""
+
+import unittest
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+from app.models.session import Session
+
+from fixtures import MongoAppTestCase, make_session, make_participant
+
+
+class TestSessionEdit(MongoAppTestCase):
+    """POST /admin/sessions/<id>/edit: người trả sân / cầu có thể để trống như khi tạo buổi"""
+
+    def setUp(self):
+        super().setUp()
+        self.tuan, self.manh = ObjectId(), ObjectId()
+        self.db.players.insert_many([
+            {'_id': self.tuan, 'name': 'Tuấn', 'short_code': 'P001', 'is_active': True},
+            {'_id': self.manh, 'name': 'Mạnh', 'short_code': 'P002', 'is_active': True},
+        ])
+        self.session_id = ObjectId()
+        Session.get_collection().insert_one(make_session([
+            make_participant(self.tuan, 'Tuấn', 200000),
+            make_participant(self.manh, 'Mạnh', 200000),
+        ], date=datetime(2025, 11, 10), _id=self.session_id))
+        with self.client.session_transaction() as flask_session:
+            flask_session['admin_logged_in'] = True
+
+    def test_edit_without_shuttlecock_payer(self):
+        response = self.client.post(f'/admin/sessions/{self.session_id}/edit', data={
+            'date': '2025-11-10',
+            'court_payer_id': str(self.tuan),
+            'shuttlecock_payer_id': '',
+            'participants': [str(self.tuan), str(self.manh)],
+            'price_per_hour': '150000',
+            'total_hours': '2',
+            'shuttlecock_quantity': '4',
+            'price_per_shuttlecock': '25000',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(f'/admin/sessions/{self.session_id}', response.headers['Location'])
+        self.assertNotIn('edit', response.headers['Location'])
+        session = Session.find_by_id(self.session_id)
+        self.assertEqual(session['shuttlecock']['paid_by'], {'player_id': None, 'player_name': ''})
+        self.assertEqual(session['court']['paid_by']['player_name'], 'Tuấn')
+        self.assertEqual(session['total_cost'], 400000)
+        self.assertEqual([p['amount_pre_paid'] for p in session['participants']], [300000, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
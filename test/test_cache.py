@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Test TTLCache (LRU + TTL + data version) dùng cho AI chat"""
+
+import unittest
+import os
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('missing'))
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')  # 'a' mới được dùng, 'b' bị loại
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl_expiry(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        with mock.patch('app.services.cache.time.monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch('app.services.cache.time.monotonic', return_value=105):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('app.services.cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_version_change_clears(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.sync_version((1, 1))
+        cache.set('a', 1)
+        cache.sync_version((1, 1))
+        self.assertEqual(cache.get('a'), 1)
+        cache.sync_version((2, 1))
+        self.assertIsNone(cache.get('a'))
+
+    def test_disabled(self):
+        cache = TTLCache(maxsize=0, ttl=60)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
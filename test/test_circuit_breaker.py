@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Test CircuitBreaker dùng cho OpenAI client"""
+
+import unittest
+import os
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.states = []
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, on_state_change=self.states.append)
+
+    def test_opens_after_consecutive_failures(self):
+        with mock.patch('app.services.circuit_breaker.time.monotonic', return_value=100):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, CLOSED)
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, OPEN)
+            self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.states, [OPEN])
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_allows_single_trial(self):
+        with mock.patch('app.services.circuit_breaker.time.monotonic', return_value=100):
+            self.breaker.record_failure()
+            self.breaker.record_failure()
+        with mock.patch('app.services.circuit_breaker.time.monotonic', return_value=131):
+            self.assertTrue(self.breaker.allow())
+            self.assertEqual(self.breaker.state, HALF_OPEN)
+            self.assertFalse(self.breaker.allow())
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.states, [OPEN, HALF_OPEN, CLOSED])
+
+    def test_half_open_failure_reopens(self):
+        with mock.patch('app.services.circuit_breaker.time.monotonic', return_value=100):
+            self.breaker.record_failure()
+            self.breaker.record_failure()
+        with mock.patch('app.services.circuit_breaker.time.monotonic', return_value=131):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state, OPEN)
+            self.assertFalse(self.breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Test chốt sổ tháng (ClosedMonth) trên database"""
+
+import unittest
+import os
+import sys
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+from app.models.closed_month import ClosedMonth, MonthClosedError
+from app.models.rollup import MonthlyRollup
+from app.models.session import Session
+
+from fixtures import MongoTestCase, make_session, make_participant
+
+
+class TestCloseMonth(MongoTestCase):
+    """Chỉ chốt được tháng đã đối soát xong; sau khi chốt không sửa được và công nợ không đổi"""
+
+    def setUp(self):
+        super().setUp()
+        self.november = make_session([
+            make_participant('p1', 'Tuấn', 100000, paid=100000),
+            make_participant('p2', 'Mạnh', 100000, paid=60000),
+        ], _id=ObjectId())
+        self.december = make_session([make_participant('p2', 'Mạnh', 80000)], date=datetime(2025, 12, 3),
+                                     _id=ObjectId())
+        Session.get_collection().insert_many([self.november, self.december])
+        MonthlyRollup.rebuild_all()
+
+    def test_unsettled_month_is_not_closed(self):
+        snapshot, problems = ClosedMonth.close(2025, 11)
+
+        self.assertIsNone(snapshot)
+        self.assertEqual(len(problems), 1)
+        self.assertIsNone(ClosedMonth.get_collection().find_one({'_id': '2025-11'}))
+        self.assertEqual(Session.get_collection().count_documents({'closed_month': {'$exists': True}}), 0)
+
+    def test_close_settled_month(self):
+        Session.update_participant_payment(self.november['_id'], 'Mạnh', 100000)
+        balances = Session.get_player_net_balances()
+
+        snapshot, problems = ClosedMonth.close(2025, 11, closed_by='admin')
+
+        self.assertEqual(problems, [])
+        self.assertEqual(snapshot['sessions_count'], 1)
+        self.assertEqual(Session.find_by_id(self.november['_id'])['closed_month'], '2025-11')
+        self.assertNotIn('closed_month', Session.find_by_id(self.december['_id']))
+        self.assertEqual(Session.get_player_net_balances(), balances)
+        self.assertEqual(ClosedMonth.close(2025, 11)[1], ['Tháng 2025-11 đã chốt'])
+        with self.assertRaises(MonthClosedError):
+            Session.update_participant_payment(self.november['_id'], 'Mạnh', 0)
+
+    def test_edit_during_close_aborts(self):
+        Session.update_participant_payment(self.november['_id'], 'Mạnh', 100000)
+        # Lần kiểm tra thứ hai (sau khi đánh dấu sessions) thấy thao tác sửa chen vào giữa
+        results = iter([[], ['Buổi 10/11/2025: Mạnh còn thiếu 40000']])
+        with mock.patch.object(ClosedMonth, 'verify', lambda *args, **kwargs: next(results)):
+            snapshot, problems = ClosedMonth.close(2025, 11)
+
+        self.assertIsNone(snapshot)
+        self.assertEqual(len(problems), 1)
+        self.assertIsNone(ClosedMonth.get_collection().find_one({'_id': '2025-11'}))
+        self.assertNotIn('closed_month', Session.find_by_id(self.november['_id']))
+
+    def test_reopen(self):
+        Session.update_participant_payment(self.november['_id'], 'Mạnh', 100000)
+        ClosedMonth.close(2025, 11)
+
+        self.assertTrue(ClosedMonth.reopen(2025, 11))
+        self.assertFalse(ClosedMonth.reopen(2025, 11))
+        self.assertTrue(Session.update_participant_payment(self.november['_id'], 'Mạnh', 90000))
+
+
+if __name__ == '__main__':
+    unittest.main()
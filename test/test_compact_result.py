@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Test payload gọn của query_result gửi cho bước trả lời"""
+
+import unittest
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.ai_service import compact_query_result, COMPACT_LIST_LIMIT
+
+
+class TestCompactQueryResult(unittest.TestCase):
+
+    def test_player_sessions_trimmed_and_capped(self):
+        sessions = [
+            {
+                'date': f'{i % 28 + 1:02d}/10/2025',
+                'court_name': 'Sân A',
+                'total_cost': 400000,
+                'participant': {
+                    'player_id': 'abc', 'player_name': 'Ly', 'amount_due': 40000,
+                    'amount_paid': 30000, 'paid_at': datetime(2025, 10, 1)
+                }
+            }
+            for i in range(COMPACT_LIST_LIMIT + 5)
+        ]
+        result = {
+            'query_type': 'player_sessions', 'period': 'tháng 10/2025', 'player_names': ['Ly'],
+            'data': {'player_name': 'Ly', 'sessions': sessions}
+        }
+        payload = compact_query_result(result)
+        data = json.loads(payload)['data']
+
+        self.assertNotIn('\n', payload)
+        self.assertNotIn('player_id', payload)
+        self.assertEqual(data['sessions_count'], COMPACT_LIST_LIMIT + 5)
+        self.assertEqual(data['total_owed'], 10000 * (COMPACT_LIST_LIMIT + 5))
+        self.assertEqual(len(data['sessions']), COMPACT_LIST_LIMIT + 1)
+        self.assertEqual(data['sessions'][-1], '…và 5 buổi khác')
+
+    def test_all_debts(self):
+        result = {
+            'query_type': 'all_debts', 'period': 'tất cả thời gian',
+            'data': [{'_id': 'Mạnh', 'total_owed': 50000, 'sessions_count': 2}]
+        }
+        data = json.loads(compact_query_result(result))['data']
+        self.assertEqual(data['debts'], [{'name': 'Mạnh', 'owed': 50000, 'sessions': 2}])
+
+    def test_empty_data(self):
+        result = {'query_type': 'monthly_stats', 'period': 'tháng 1/2025', 'data': None}
+        self.assertIsNone(json.loads(compact_query_result(result))['data'])
+
+
+if __name__ == '__main__':
+    unittest.main()
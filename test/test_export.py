@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Test export CSV / XLSX (app.services.export)"""
+
+import unittest
+import io
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.transaction import Transaction
+from app.services.export import iter_csv, iter_transaction_rows, write_xlsx
+
+from fixtures import MongoTestCase
+
+
+class TestExportFormulaInjection(MongoTestCase):
+    """Nội dung chuyển khoản có dạng công thức được xuất ra như chữ thường"""
+
+    def setUp(self):
+        super().setUp()
+        Transaction.get_collection().insert_one({
+            'sepay_id': 1,
+            'transaction_date': datetime(2025, 11, 10, 20, 0),
+            'gateway': 'MBBank',
+            'content': '=HYPERLINK("http://evil.example","Bấm vào đây")',
+            'transfer_amount': -50000,
+            'player_name': '@Tuấn',
+            'status': 'processed'
+        })
+
+    def test_csv_escapes_formula_cells(self):
+        row = list(iter_transaction_rows())[1]
+
+        self.assertEqual(row[5], '\'=HYPERLINK("http://evil.example","Bấm vào đây")')
+        self.assertEqual(row[7], "'@Tuấn")
+        self.assertEqual(row[6], -50000)
+        self.assertIn('"\'=HYPERLINK(', ''.join(iter_csv(iter_transaction_rows())))
+
+    def test_xlsx_has_no_formula_cells(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            self.skipTest('openpyxl chưa được cài')
+
+        fileobj = io.BytesIO()
+        write_xlsx(iter_transaction_rows(), fileobj)
+        fileobj.seek(0)
+        cells = [cell for row in load_workbook(fileobj).active.iter_rows() for cell in row]
+
+        self.assertFalse([cell.coordinate for cell in cells if cell.data_type == 'f'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Test bộ phân loại intent cục bộ"""
+
+import unittest
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.intent import classify, fold
+
+PLAYERS = ['Tuấn', 'Mạnh', 'Ly', 'An']
+NOW = datetime(2025, 11, 15)
+
+
+class TestIntent(unittest.TestCase):
+
+    def test_fold(self):
+        self.assertEqual(fold('Đỗ Mạnh'), 'do manh')
+
+    def test_all_debts(self):
+        result = classify('Ai còn nợ?', PLAYERS, now=NOW)
+        self.assertEqual(result['query_type'], 'all_debts')
+        self.assertIsNone(result['month'])
+        self.assertGreaterEqual(result['confidence'], 0.9)
+
+    def test_player_debt_without_accents(self):
+        result = classify('ly va manh con no bao nhieu', PLAYERS, now=NOW)
+        self.assertEqual(result['query_type'], 'player_debt')
+        self.assertEqual(result['player_names'], ['Ly', 'Mạnh'])
+
+    def test_name_word_boundary(self):
+        # "An" không được khớp trong "thanh toán"
+        result = classify('Ai chưa thanh toán?', PLAYERS, now=NOW)
+        self.assertEqual(result['player_names'], [])
+
+    def test_relative_month(self):
+        result = classify('Tháng trước ai còn nợ', PLAYERS, now=NOW)
+        self.assertEqual((result['year'], result['month']), (2025, 10))
+
+    def test_session_detail_date(self):
+        result = classify('Chi tiết buổi ngày 20/11', PLAYERS, now=NOW)
+        self.assertEqual(result['query_type'], 'session_detail')
+        self.assertEqual((result['year'], result['month'], result['day']), (2025, 11, 20))
+
+    def test_monthly_stats_defaults_to_current_month(self):
+        result = classify('Thống kê', PLAYERS, now=NOW)
+        self.assertEqual(result['query_type'], 'monthly_stats')
+        self.assertEqual((result['year'], result['month']), (2025, 11))
+
+    def test_unknown_name_has_low_confidence(self):
+        result = classify('Hùng còn nợ bao nhiêu?', PLAYERS, now=NOW)
+        self.assertLess(result['confidence'], 0.75)
+        self.assertIn('hung', result['unknown_tokens'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Test NameMatcher (Aho-Corasick trên tên đã bỏ dấu)"""
+
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.name_matcher import NameMatcher, fold
+
+
+class TestNameMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = NameMatcher([
+            ('Tuấn', []),
+            ('Mạnh', ['Manh Beo']),
+            ('Ly', []),
+            ('An', []),
+            ('Nguyễn An', []),
+            ('Đức', ['Duc Anh']),
+        ])
+
+    def test_fold(self):
+        self.assertEqual(fold('  Đỗ   Mạnh '), 'do manh')
+
+    def test_accent_insensitive(self):
+        self.assertEqual(self.matcher.find_names('tuan va manh con no'), ['Tuấn', 'Mạnh'])
+
+    def test_word_boundary(self):
+        self.assertEqual(self.matcher.find_names('Thanh toán cầu lông'), [])
+        self.assertEqual(self.matcher.find_names('An thanh toan'), ['An'])
+
+    def test_longest_match_wins(self):
+        self.assertEqual(self.matcher.find_names('Nguyễn An chuyển tiền'), ['Nguyễn An'])
+        self.assertEqual(self.matcher.find_names('duc anh tt cau long'), ['Đức'])
+
+    def test_alias(self):
+        self.assertEqual(self.matcher.find_names('MANH BEO THANH TOAN'), ['Mạnh'])
+
+    def test_positions(self):
+        self.assertEqual(self.matcher.find('ly, an'), [('Ly', 0, 2), ('An', 4, 6)])
+
+    def test_dedup_in_order(self):
+        self.assertEqual(self.matcher.find_names('Ly ly LY Tuấn'), ['Ly', 'Tuấn'])
+
+
+if __name__ == '__main__':
+    unittest.main()
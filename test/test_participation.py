@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Test Participation documents built from sessions"""
+
+import unittest
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.participation import Participation
+
+from fixtures import MongoTestCase, make_session, make_participant
+
+
+class TestParticipationDocs(unittest.TestCase):
+    """Test from_session: một document cho mỗi người chơi, mang theo date/status của buổi"""
+
+    def test_one_document_per_participant(self):
+        session = make_session([
+            {'player_id': 'p1', 'player_name': 'Tuấn', 'amount_due': 100000, 'amount_paid': 100000,
+             'amount_to_receive': 300000},
+            {'player_id': 'p2', 'player_name': 'Mạnh', 'amount_due': 100000, 'amount_paid': 40000},
+        ])
+        docs = Participation.from_session(session)
+
+        self.assertEqual([d['_id'] for d in docs], ['s1:p1', 's1:p2'])
+        self.assertEqual(docs[0]['date'], datetime(2025, 11, 10))
+        self.assertEqual(docs[0]['status'], 'completed')
+        self.assertEqual(docs[0]['court_name'], 'Sân A')
+        self.assertEqual(docs[0]['amount_to_receive'], 300000)
+        self.assertFalse(docs[0]['archived'])
+
+    def test_is_paid_is_derived_from_amounts(self):
+        session = make_session([
+            {'player_id': 'p1', 'player_name': 'Ly', 'amount_due': 100000, 'amount_paid': 40000, 'is_paid': True},
+            {'player_id': 'p2', 'player_name': 'An', 'amount_due': 100000, 'amount_paid': 100000, 'is_paid': False},
+        ])
+        docs = Participation.from_session(session)
+
+        self.assertEqual([d['is_paid'] for d in docs], [False, True])
+
+    def test_legacy_participant_without_id(self):
+        session = make_session([{'player_name': 'Tuấn', 'amount_due': 50000}])
+        doc = Participation.from_session(session, archived=True)[0]
+
+        self.assertEqual(doc['_id'], 's1:tuấn')
+        self.assertEqual(doc['player_name_lower'], 'tuấn')
+        self.assertEqual(doc['amount_paid'], 0)
+        self.assertTrue(doc['archived'])
+
+
+class TestParticipationQueries(MongoTestCase):
+    """Test sync / find_unpaid trên database"""
+
+    def test_sync_replaces_documents_of_session(self):
+        Participation.sync(make_session([make_participant('p1', 'Tuấn', 100000),
+                                         make_participant('p2', 'Mạnh', 100000)]))
+        Participation.sync(make_session([make_participant('p1', 'Tuấn', 100000, paid=100000)]))
+
+        docs = list(Participation.get_collection().find())
+        self.assertEqual([d['_id'] for d in docs], ['s1:p1'])
+        self.assertTrue(docs[0]['is_paid'])
+
+    def test_find_unpaid_oldest_first(self):
+        sessions = [
+            make_session([make_participant('p1', 'Tuấn', 100000)], date=datetime(2025, 11, 20), _id='s1'),
+            make_session([make_participant('p1', 'Tuấn', 100000, paid=40000)], date=datetime(2025, 11, 5),
+                         _id='s2'),
+            make_session([make_participant('p1', 'Tuấn', 100000, paid=100000)], date=datetime(2025, 11, 1),
+                         _id='s3'),
+            make_session([make_participant('p1', 'Tuấn', 100000)], status='pending', _id='s4'),
+            make_session([make_participant('p1', 'Tuấn', 100000, to_receive=300000)], _id='s5'),
+        ]
+        for session in sessions:
+            Participation.sync(session)
+        Participation.sync(make_session([make_participant('p1', 'Tuấn', 100000)], _id='s6'), archived=True)
+
+        unpaid = Participation.find_unpaid(player_id='p1', player_name='Tuấn')
+
+        self.assertEqual([p['session_id'] for p in unpaid], ['s2', 's1'])
+
+    def test_find_unpaid_falls_back_to_folded_name(self):
+        Participation.sync(make_session([make_participant(None, 'Mạnh', 100000)]))
+
+        unpaid = Participation.find_unpaid(player_id='p2', player_name='manh')
+
+        self.assertEqual([p['player_name'] for p in unpaid], ['Mạnh'])
+        self.assertEqual(Participation.find_unpaid(player_id='p2'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Test payments ledger: diff (Payment.changes) và ghi thanh toán trên database"""
+
+import unittest
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest import mock
+
+from bson import ObjectId
+
+from app.models.payment import Payment
+from app.models.rollup import MonthlyRollup
+from app.models.session import Session
+
+from fixtures import MongoTestCase, make_session, make_participant
+
+
+class TestPaymentChanges(unittest.TestCase):
+    """Test các entry cần ghi khi cache trong session thay đổi"""
+
+    def test_create_records_prepaid_amounts_only(self):
+        session = make_session([
+            make_participant('p1', 'Tuấn', paid=100000),
+            make_participant('p2', 'Mạnh'),
+        ])
+        changes = Payment.changes(None, session)
+
+        self.assertEqual([(p['player_name'], kind, before, delta) for p, kind, before, delta in changes],
+                         [('Tuấn', 'payment', 0, 100000)])
+
+    def test_payment_update_records_difference(self):
+        old = make_session([make_participant('p1', 'Ly', paid=40000), make_participant('p2', 'Mạnh')])
+        new = make_session([make_participant('p1', 'Ly', paid=100000), make_participant('p2', 'Mạnh')])
+        changes = Payment.changes(old, new)
+
+        self.assertEqual(len(changes), 1)
+        participant, kind, before, delta = changes[0]
+        self.assertEqual((participant['player_name'], kind, before, delta), ('Ly', 'payment', 40000, 60000))
+
+    def test_refund_is_separate_kind(self):
+        old = make_session([make_participant('p1', 'Tuấn', paid=100000)])
+        new = make_session([make_participant('p1', 'Tuấn', paid=100000, returned=300000)])
+        changes = Payment.changes(old, new)
+
+        self.assertEqual([(kind, delta) for _, kind, _, delta in changes], [('refund', 300000)])
+
+    def test_delete_reverses_all_amounts(self):
+        old = make_session([make_participant('p1', 'Tuấn', paid=100000, returned=300000),
+                            make_participant('p2', 'Mạnh', paid=20000)])
+        changes = Payment.changes(old, None)
+
+        self.assertEqual(sum(delta for _, _, _, delta in changes), -420000)
+
+    def test_removed_participant_is_reversed(self):
+        old = make_session([make_participant('p1', 'Ly', paid=50000), make_participant('p2', 'Mạnh', paid=10000)])
+        new = make_session([make_participant('p1', 'Ly', paid=50000)])
+        changes = Payment.changes(old, new)
+
+        self.assertEqual([(p['player_name'], delta) for p, _, _, delta in changes], [('Mạnh', -10000)])
+
+    def test_legacy_participant_without_id_uses_lowercase_name(self):
+        self.assertEqual(Payment.player_key({'player_name': 'Tuấn'}), 'tuấn')
+        self.assertEqual(Payment.player_key({'player_id': 'p1', 'player_name': 'Tuấn'}), 'p1')
+
+
+class TestPaymentLedger(MongoTestCase):
+    """Test Session.add_participant_payment: entry ledger, cache trong session và delta rollup"""
+
+    def setUp(self):
+        super().setUp()
+        self.session = make_session([
+            make_participant('p1', 'Tuấn', 100000),
+            make_participant(None, 'Mạnh', 100000, paid=30000),
+        ], _id=ObjectId())
+        Session.get_collection().insert_one(self.session)
+        MonthlyRollup.rebuild_all()
+
+    def participant(self, name):
+        session = Session.find_by_id(self.session['_id'])
+        return next(p for p in session['participants'] if p['player_name'] == name)
+
+    def assert_rollup_matches_recompute(self):
+        players = MonthlyRollup.get(2025, 11)['players']
+        self.assertEqual(players, MonthlyRollup.recompute(2025, 11)['players'])
+
+    def test_payment_appends_entry_and_updates_cache(self):
+        Session.add_participant_payment(self.session['_id'], 'tuấn', 100000, reference=1)
+
+        self.assertEqual(self.participant('Tuấn')['amount_paid'], 100000)
+        self.assertTrue(self.participant('Tuấn')['is_paid'])
+        self.assertEqual(Payment.get_all_totals()[(self.session['_id'], 'p1')]['payment'], 100000)
+        self.assertEqual(MonthlyRollup.get(2025, 11)['players']['p1']['total_owed'], 0)
+        self.assert_rollup_matches_recompute()
+
+    def test_legacy_amount_gets_one_opening_entry(self):
+        Session.add_participant_payment(self.session['_id'], 'Mạnh', 20000)
+        Session.add_participant_payment(self.session['_id'], 'Mạnh', 50000)
+        Payment.backfill([Session.find_by_id(self.session['_id'])])
+
+        entries = list(Payment.get_collection().find({'player_key': 'mạnh'}))
+        self.assertEqual(sorted((e['source'], e['amount']) for e in entries),
+                         [('opening', 30000), ('webhook', 20000), ('webhook', 50000)])
+        self.assertEqual(Payment.find_mismatches([Session.find_by_id(self.session['_id'])]), [])
+
+    def test_concurrent_payments_from_stale_snapshot(self):
+        # Hai webhook cùng đọc session trước khi webhook kia ghi
+        stale = Session.find_by_id(self.session['_id'])
+        with mock.patch.object(Session, 'find_by_id', lambda *args, **kwargs: stale):
+            Session.add_participant_payment(self.session['_id'], 'Mạnh', 30000)
+            Session.add_participant_payment(self.session['_id'], 'Mạnh', 40000)
+
+        self.assertEqual(self.participant('Mạnh')['amount_paid'], 100000)
+        self.assertTrue(self.participant('Mạnh')['is_paid'])
+        self.assertEqual(Payment.get_all_totals()[(self.session['_id'], 'mạnh')]['payment'], 100000)
+        self.assertEqual(Payment.get_collection().count_documents({'source': 'opening'}), 1)
+        self.assert_rollup_matches_recompute()
+
+    def test_payment_not_applied_is_not_recorded(self):
+        # Participant đổi vị trí sau khi webhook đọc session: không cộng được thì không ghi ledger
+        stale = Session.find_by_id(self.session['_id'])
+        stale['participants'].reverse()
+        with mock.patch.object(Session, 'find_by_id', lambda *args, **kwargs: stale):
+            self.assertFalse(Session.add_participant_payment(self.session['_id'], 'Mạnh', 30000))
+
+        self.assertEqual(self.participant('Mạnh')['amount_paid'], 30000)
+        self.assertEqual(Payment.get_collection().count_documents({}), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
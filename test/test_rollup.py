@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Test MonthlyRollup delta calculations"""
+
+import unittest
+import os
+import sys
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, g
+
+from app.models.closed_month import ClosedMonth
+from app.models.rollup import MonthlyRollup
+from app.models.session import Session
+
+from fixtures import MongoTestCase, mongomock, make_session, make_participant
+
+
+class TestMonthlyRollupDelta(unittest.TestCase):
+    """Test contribution/diff used for incremental updates"""
+
+    def test_contribution_splits_owed_and_to_receive(self):
+        session = make_session([
+            make_participant('p1', 'Tuấn', 100000, paid=100000, to_receive=300000),
+            make_participant('p2', 'Mạnh', 100000, paid=40000),
+        ])
+        totals = MonthlyRollup.contribution(session)
+
+        self.assertEqual(totals['sessions_count'], 1)
+        self.assertEqual(totals['total_court'], 300000)
+        self.assertEqual(totals['players']['p1']['total_to_receive'], 300000)
+        self.assertEqual(totals['players']['p1']['total_owed'], 0)
+        self.assertEqual(totals['players']['p2']['total_owed'], 60000)
+
+    def test_contribution_ignores_players_of_pending_session(self):
+        session = make_session([make_participant('p1', 'Ly', 100000)], status='pending')
+        totals = MonthlyRollup.contribution(session)
+
+        self.assertEqual(totals['sessions_count'], 1)
+        self.assertEqual(totals['players'], {})
+
+    def test_diff_only_contains_changed_players(self):
+        old = make_session([
+            make_participant('p1', 'Ly', 100000),
+            make_participant('p2', 'Mạnh', 100000),
+        ])
+        new = make_session([
+            make_participant('p1', 'Ly', 100000, paid=100000),
+            make_participant('p2', 'Mạnh', 100000),
+        ])
+        delta = MonthlyRollup.diff(old, new)
+
+        self.assertEqual(delta['sessions_count'], 0)
+        self.assertEqual(list(delta['players']), ['p1'])
+        self.assertEqual(delta['players']['p1']['total_owed'], -100000)
+
+    def test_diff_of_removed_session_is_negative(self):
+        old = make_session([make_participant('p1', 'Ly', 100000)])
+        delta = MonthlyRollup.diff(old, None)
+
+        self.assertEqual(delta['sessions_count'], -1)
+        self.assertEqual(delta['total_cost'], -400000)
+        self.assertEqual(delta['players']['p1']['sessions_count'], -1)
+
+    def test_build_equals_sum_of_contributions(self):
+        sessions = [
+            make_session([make_participant('p1', 'Ly', 100000)]),
+            make_session([make_participant('p1', 'Ly', 50000, paid=20000)]),
+        ]
+        doc = MonthlyRollup.build(2025, 11, sessions)
+
+        self.assertEqual(doc['_id'], '2025-11')
+        self.assertEqual(doc['sessions_count'], 2)
+        self.assertEqual(doc['players']['p1']['total_owed'], 130000)
+
+        balances = MonthlyRollup.get_balances(doc)
+        self.assertEqual(balances['Ly']['net_balance'], -130000)
+
+    def test_legacy_key_is_safe_field_name(self):
+        keys = [MonthlyRollup.participant_key(make_participant(None, name, 100000))
+                for name in ('A. Tuấn', '$Ly', 'a. tuấn', '50% Mạnh')]
+
+        self.assertEqual(keys, ['name:a%2E tuấn', 'name:%24ly', 'name:a%2E tuấn', 'name:50%25 mạnh'])
+        self.assertTrue(all('.' not in key and not key.startswith('$') for key in keys))
+
+
+class TestDerivedStateReadsPrimary(MongoTestCase):
+    """Request đọc từ secondary: recompute / verify vẫn đọc sessions từ primary"""
+
+    def setUp(self):
+        super().setUp()
+        Session.get_collection().insert_one(make_session([make_participant('p1', 'Tuấn', 100000, paid=100000)]))
+
+        # Secondary còn chậm: chưa thấy Tuấn đã trả tiền
+        stale = mongomock.MongoClient().db
+        stale.sessions.insert_one(make_session([make_participant('p1', 'Tuấn', 100000)]))
+        patcher = mock.patch('app.secondary_db', stale)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        context = Flask(__name__).test_request_context()
+        context.push()
+        self.addCleanup(context.pop)
+        g.mongo_secondary_reads = True
+
+    def test_recompute_on_secondary_request_reads_primary(self):
+        self.assertEqual(MonthlyRollup.get(2025, 11)['players']['p1']['total_owed'], 0)
+
+    def test_verify_reads_primary(self):
+        self.assertEqual(ClosedMonth.verify(2025, 11), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Test sao kê người chơi (Session.get_player_statement) trên participations"""
+
+import unittest
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId
+
+from app.models.participation import Participation
+from app.models.session import Session
+
+from fixtures import MongoTestCase, make_session, make_participant
+
+PLAYER_ID = ObjectId()
+
+
+def make_day(day, due, paid=0, to_receive=0):
+    """Một buổi ngày `day`/11/2025 chỉ có người chơi PLAYER_ID"""
+    return make_session([make_participant(PLAYER_ID, 'Tuấn', due, paid, to_receive)],
+                        date=datetime(2025, 11, day), _id=ObjectId())
+
+
+class TestPlayerStatement(MongoTestCase):
+    """Số dư lũy kế theo ngày, phân trang bằng cursor (mới nhất trước)"""
+
+    def setUp(self):
+        super().setUp()
+        self.sessions = [
+            make_day(3, 100000),
+            make_day(5, 100000, paid=100000),
+            make_day(5, 80000, paid=30000),
+            make_day(12, 100000, paid=100000, to_receive=200000),
+            make_day(20, 60000),
+        ]
+        for session in self.sessions:
+            Participation.sync(session)
+
+    def test_balance_is_cumulative_from_oldest(self):
+        statement = Session.get_player_statement(PLAYER_ID)
+
+        self.assertEqual([e['balance'] for e in statement['entries']],
+                         [10000, -50000, 150000, 100000, 100000])
+        self.assertEqual(statement['summary']['balance'], 10000)
+        self.assertEqual(statement['summary']['sessions_count'], 5)
+        self.assertEqual(statement['summary']['total_owed'], 10000)
+        self.assertIsNone(statement['next_cursor'])
+
+    def test_pages_continue_running_balance(self):
+        first = Session.get_player_statement(PLAYER_ID, limit=2)
+        second = Session.get_player_statement(PLAYER_ID, limit=2, cursor=first['next_cursor'])
+        third = Session.get_player_statement(PLAYER_ID, limit=2, cursor=second['next_cursor'])
+
+        entries = first['entries'] + second['entries'] + third['entries']
+        self.assertEqual([e['balance'] for e in entries], [10000, -50000, 150000, 100000, 100000])
+        self.assertEqual(len({e['_id'] for e in entries}), 5)
+        self.assertIsNone(third['next_cursor'])
+        self.assertEqual(second['summary'], first['summary'])
+
+    def test_date_range_starts_balance_at_zero(self):
+        statement = Session.get_player_statement(PLAYER_ID, start_date=datetime(2025, 11, 5),
+                                                 end_date=datetime(2025, 11, 15))
+
+        self.assertEqual([e['balance'] for e in statement['entries']], [-150000, 50000, 0])
+
+    def test_legacy_participants_matched_by_name(self):
+        # Buổi cũ chỉ lưu tên; người khác trùng tên nhưng có player_id thì không tính
+        Participation.sync(make_session([make_participant(None, 'tuấn', 40000)],
+                                        date=datetime(2025, 11, 1), _id=ObjectId()))
+        Participation.sync(make_session([make_participant(ObjectId(), 'Tuấn', 90000)],
+                                        date=datetime(2025, 11, 2), _id=ObjectId()))
+
+        statement = Session.get_player_statement(PLAYER_ID, player_name='Tuấn')
+
+        self.assertEqual([e['balance'] for e in statement['entries']],
+                         [50000, -10000, 190000, 140000, 140000, 40000])
+        self.assertEqual(statement['summary']['sessions_count'], 6)
+        self.assertEqual(Session.get_player_statement(PLAYER_ID)['summary']['sessions_count'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
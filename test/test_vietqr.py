@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Test tạo payload VietQR (EMVCo) cục bộ"""
+
+import unittest
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import vietqr
+
+
+class TestVietQR(unittest.TestCase):
+
+    def test_crc16(self):
+        # Giá trị kiểm tra chuẩn của CRC-16/CCITT-FALSE
+        self.assertEqual(vietqr.crc16_ccitt('123456789'), '29B1')
+
+    def test_payload_fields(self):
+        payload = vietqr.build_payload('970423', '03365790401', 75000, 'Mạnh thanh toán cầu lông P001')
+
+        self.assertTrue(payload.startswith('000201010212'))
+        self.assertIn('0010A000000727', payload)
+        self.assertIn('01250006970423011103365790401', payload)
+        self.assertIn('0208QRIBFTTA', payload)
+        self.assertIn('5303704', payload)
+        self.assertIn('540575000', payload)
+        self.assertIn('5802VN', payload)
+        self.assertIn('0829Manh thanh toan cau long P001', payload)
+        self.assertEqual(payload[-8:-4], '6304')
+        self.assertEqual(payload[-4:], vietqr.crc16_ccitt(payload[:-4]))
+
+    def test_static_payload_without_amount(self):
+        payload = vietqr.build_payload('970423', '03365790401')
+        self.assertTrue(payload.startswith('000201010211'))
+        self.assertNotIn('5405', payload)
+
+    def test_unknown_bank(self):
+        with self.assertRaises(ValueError):
+            vietqr.payload_from_config({'VIETQR_BANK_ID': 'XYZ', 'VIETQR_ACCOUNT_NUMBER': '1'})
+
+    @unittest.skipUnless(vietqr.SEGNO_AVAILABLE, 'segno not installed')
+    def test_disk_cache(self):
+        payload = vietqr.build_payload('970423', '03365790401', 50000, 'test')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            digest = vietqr.ensure_rendered(payload, cache_dir)
+            path = vietqr.cache_path(cache_dir, digest, 'png')
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(8), b'\x89PNG\r\n\x1a\n')
+
+            mtime = os.path.getmtime(path)
+            self.assertEqual(vietqr.ensure_rendered(payload, cache_dir), digest)
+            self.assertEqual(os.path.getmtime(path), mtime)
+
+    def test_signature_binds_amount_and_description(self):
+        sig = vietqr.sign('secret', 75000, 'Mạnh thanh toán cầu lông P001')
+
+        self.assertTrue(vietqr.verify_signature('secret', 75000, 'Manh thanh toan cau long P001', sig))
+        self.assertFalse(vietqr.verify_signature('secret', 750000, 'Mạnh thanh toán cầu lông P001', sig))
+        self.assertFalse(vietqr.verify_signature('other', 75000, 'Mạnh thanh toán cầu lông P001', sig))
+        self.assertFalse(vietqr.verify_signature('secret', 75000, 'Mạnh thanh toán cầu lông P001', None))
+
+    def test_prune_cache_removes_oldest(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for i in range(4):
+                path = vietqr.cache_path(cache_dir, f'{i:032x}', 'png')
+                with open(path, 'wb') as f:
+                    f.write(b'x')
+                os.utime(path, (1000 + i, 1000 + i))
+
+            self.assertEqual(vietqr.prune_cache(cache_dir, 2), 2)
+            self.assertEqual(sorted(os.listdir(cache_dir)), [f'{2:032x}.png', f'{3:032x}.png'])
+
+
+if __name__ == '__main__':
+    unittest.main()
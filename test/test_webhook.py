@@ -15,6 +15,9 @@ os.environ['SEPAY_API_KEY'] = 'test-api-key'
 # Add the app directory to the path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from datetime import datetime
+from bson import ObjectId
+
 from app.routes.webhook import (
     extract_player_name,
     extract_player_short_code,
@@ -22,6 +25,8 @@ from app.routes.webhook import (
     PAYMENT_KEYWORDS
 )
 
+from fixtures import MongoAppTestCase, make_session, make_participant
+
 
 class TestWebhookFunctions(unittest.TestCase):
     """Test webhook helper functions"""
@@ -173,5 +178,78 @@ class TestTransactionModel(unittest.TestCase):
         self.assertTrue(hasattr(Transaction, 'create'))
 
 
+class TestSepayWebhookAllocation(MongoAppTestCase):
+    """Test POST /webhook/sepay trên database: gạch nợ các buổi cũ nhất trước"""
+
+    def setUp(self):
+        super().setUp()
+        from app.models.participation import Participation
+        from app.models.rollup import MonthlyRollup
+
+        self.player_id = ObjectId()
+        self.db.players.insert_one({'_id': self.player_id, 'name': 'Mạnh', 'short_code': 'P002', 'is_active': True})
+        self.sessions = [
+            make_session([make_participant(self.player_id, 'Mạnh', 60000)], date=datetime(2025, 11, 3),
+                         _id=ObjectId()),
+            make_session([make_participant(self.player_id, 'Mạnh', 80000, paid=30000)],
+                         date=datetime(2025, 11, 1), _id=ObjectId()),
+            make_session([make_participant(self.player_id, 'Mạnh', 70000)], date=datetime(2025, 11, 8),
+                         _id=ObjectId()),
+        ]
+        self.db.sessions.insert_many(self.sessions)
+        Participation.rebuild_all()
+        MonthlyRollup.rebuild_all()
+
+    def post(self, transaction_id, amount, content='Manh thanh toan cau long P002'):
+        return self.client.post('/webhook/sepay', json={
+            'id': transaction_id,
+            'gateway': 'TPBank',
+            'transactionDate': '2025-11-20 10:00:00',
+            'accountNumber': '03365790401',
+            'content': content,
+            'transferType': 'in',
+            'transferAmount': amount,
+            'referenceCode': f'FT{transaction_id}'
+        }, headers={'X-API-Key': self.app.config.get('SEPAY_API_KEY', '')})
+
+    def amount_paid(self, session):
+        return self.db.sessions.find_one({'_id': session['_id']})['participants'][0]['amount_paid']
+
+    def test_allocates_oldest_sessions_first(self):
+        from app.models.payment import Payment
+        from app.models.rollup import MonthlyRollup
+
+        response = self.post(1, 100000)
+
+        self.assertEqual(response.get_json()['sessions_updated'], 2)
+        self.assertEqual([self.amount_paid(s) for s in self.sessions], [50000, 80000, 0])
+        self.assertEqual(self.db.participations.count_documents({'is_paid': False}), 2)
+        self.assertEqual(sum(e['amount'] for e in Payment.get_collection().find({'source': 'webhook'})),
+                         100000)
+        self.assertEqual(MonthlyRollup.get(2025, 11)['players'],
+                         MonthlyRollup.recompute(2025, 11)['players'])
+
+    def test_duplicate_transaction_is_ignored(self):
+        self.post(1, 50000)
+        response = self.post(1, 50000)
+
+        self.assertEqual(response.get_json()['message'], 'Duplicate transaction')
+        self.assertEqual([self.amount_paid(s) for s in self.sessions], [0, 80000, 0])
+
+    def test_legacy_participant_matched_by_name(self):
+        from app.models.participation import Participation
+
+        legacy = make_session([make_participant(None, 'Mạnh', 40000)], date=datetime(2025, 10, 1),
+                              _id=ObjectId())
+        self.db.sessions.delete_many({})
+        self.db.sessions.insert_one(legacy)
+        Participation.rebuild_all()
+
+        response = self.post(2, 40000)
+
+        self.assertEqual(response.get_json()['sessions_updated'], 1)
+        self.assertEqual(self.amount_paid(legacy), 40000)
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)